@@ -0,0 +1,100 @@
+"""
+Time to first byte of an in-memory QUIC handshake, with and without a
+KeySharePool, using the test certificates.
+
+    python benchmarks/handshake.py [--rounds N]
+
+The time is measured from QuicConnection.connect() on the client until the
+client has received the first byte of a stream opened by the server. The
+pool is given time to refill between connections, as it would between
+connection attempts on a real client or server.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import time
+
+from qh3.quic import events
+from qh3.quic.configuration import QuicConfiguration
+from qh3.quic.connection import QuicConnection
+from qh3.tls import KeySharePool
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "tests")
+CLIENT_ADDR = ("1.2.3.4", 1234)
+SERVER_ADDR = ("2.3.4.5", 4433)
+
+
+def transfer(sender: QuicConnection, receiver: QuicConnection) -> None:
+    from_addr = CLIENT_ADDR if sender._is_client else SERVER_ADDR
+    for data, _ in sender.datagrams_to_send(now=time.time()):
+        receiver.receive_datagram(data, from_addr, now=time.time())
+
+
+def time_to_first_byte(
+    client_configuration: QuicConfiguration, server_configuration: QuicConfiguration
+) -> float:
+    start = time.perf_counter()
+    client = QuicConnection(configuration=client_configuration)
+    server = QuicConnection(
+        configuration=server_configuration,
+        original_destination_connection_id=client.original_destination_connection_id,
+    )
+    client.connect(SERVER_ADDR, now=time.time())
+
+    sent = False
+    while True:
+        transfer(client, server)
+        event = server.next_event()
+        while event is not None:
+            if isinstance(event, events.HandshakeCompleted) and not sent:
+                server.send_stream_data(
+                    server.get_next_available_stream_id(), b"x", end_stream=True
+                )
+                sent = True
+            event = server.next_event()
+        transfer(server, client)
+        event = client.next_event()
+        while event is not None:
+            if isinstance(event, events.StreamDataReceived) and event.data:
+                return time.perf_counter() - start
+            event = client.next_event()
+
+
+def bench(rounds: int, pool: KeySharePool | None) -> float:
+    client_configuration = QuicConfiguration(
+        is_client=True, key_share_pool=pool, probe_datagram_size=False
+    )
+    client_configuration.load_verify_locations(
+        cafile=os.path.join(TESTS_DIR, "pycacert.pem")
+    )
+    server_configuration = QuicConfiguration(is_client=False, key_share_pool=pool)
+    server_configuration.load_cert_chain(
+        os.path.join(TESTS_DIR, "ssl_cert.pem"),
+        os.path.join(TESTS_DIR, "ssl_key.pem"),
+    )
+
+    samples = []
+    for _ in range(rounds):
+        time.sleep(0.02)
+        samples.append(time_to_first_byte(client_configuration, server_configuration))
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"without key share pool: {bench(args.rounds, None) * 1e3:8.2f} ms")
+    pool = KeySharePool()
+    try:
+        print(f"with key share pool:    {bench(args.rounds, pool) * 1e3:8.2f} ms")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Microbenchmark of the TLS messages handled on every server handshake:
+parsing the ClientHello, then encoding ServerHello, EncryptedExtensions
+and Certificate.
+
+    python benchmarks/tls_codec.py [--rounds N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import timeit
+
+from qh3 import tls
+from qh3._hazmat import Buffer
+from qh3.quic.configuration import QuicConfiguration
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "tests")
+
+
+def client_hello() -> bytes:
+    client = tls.Context(is_client=True, alpn_protocols=["h3"], server_name="example")
+    client.handshake_extensions = [
+        (tls.ExtensionType.QUIC_TRANSPORT_PARAMETERS, bytes(64))
+    ]
+    buffers = {
+        tls.Epoch.INITIAL: Buffer(capacity=4096),
+        tls.Epoch.HANDSHAKE: Buffer(capacity=4096),
+        tls.Epoch.ONE_RTT: Buffer(capacity=4096),
+    }
+    client.handle_message(b"", buffers)
+    return buffers[tls.Epoch.INITIAL].data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    configuration = QuicConfiguration(is_client=False)
+    configuration.load_cert_chain(
+        os.path.join(TESTS_DIR, "ssl_cert_with_chain.pem"),
+        os.path.join(TESTS_DIR, "ssl_key.pem"),
+    )
+    certificate = tls.Certificate(
+        request_context=b"",
+        certificates=[
+            (cert.public_bytes(), b"")
+            for cert in [configuration.certificate] + configuration.certificate_chain
+        ],
+    )
+    data = client_hello()
+
+    def handshake() -> None:
+        hello = tls.pull_client_hello(Buffer(data=data))
+        buf = Buffer(capacity=8192)
+        tls.push_server_hello(
+            buf,
+            tls.ServerHello(
+                random=bytes(32),
+                legacy_session_id=hello.legacy_session_id,
+                cipher_suite=tls.CipherSuite.AES_128_GCM_SHA256,
+                compression_method=0,
+                key_share=(tls.Group.X25519, bytes(32)),
+                supported_version=tls.TLS_VERSION_1_3,
+            ),
+        )
+        tls.push_encrypted_extensions(
+            buf,
+            tls.EncryptedExtensions(
+                alpn_protocol="h3",
+                other_extensions=[
+                    (tls.ExtensionType.QUIC_TRANSPORT_PARAMETERS, bytes(64))
+                ],
+            ),
+        )
+        tls.push_certificate(buf, certificate)
+
+    best = min(timeit.repeat(handshake, number=1000, repeat=args.rounds)) / 1000
+    print(f"ClientHello parse + server flight encode: {best * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
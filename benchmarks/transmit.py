@@ -0,0 +1,120 @@
+"""
+Microbenchmark of QuicConnection.datagrams_to_send() on an established
+connection, using the test certificates.
+
+    python benchmarks/transmit.py [--rounds N]
+
+Two cases are measured:
+
+- idle: nothing is pending, the call only walks the packet spaces.
+- bulk: 20 datagrams worth of stream data are queued before every call,
+  the cost is reported per datagram sent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+import timeit
+
+from qh3.quic.configuration import QuicConfiguration
+from qh3.quic.connection import QuicConnection
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "tests")
+CLIENT_ADDR = ("1.2.3.4", 1234)
+SERVER_ADDR = ("2.3.4.5", 4433)
+
+
+class NoPacer:
+    def next_send_time(self, now: float) -> None:
+        return None
+
+    def update_after_send(self, now: float) -> None:
+        pass
+
+    def update_rate(self, congestion_window: int, smoothed_rtt: float) -> None:
+        pass
+
+
+def transfer(sender: QuicConnection, receiver: QuicConnection) -> None:
+    from_addr = CLIENT_ADDR if sender._is_client else SERVER_ADDR
+    for data, _ in sender.datagrams_to_send(now=time.time()):
+        receiver.receive_datagram(data, from_addr, now=time.time())
+
+
+def create_connections() -> tuple[QuicConnection, QuicConnection]:
+    client_configuration = QuicConfiguration(is_client=True, probe_datagram_size=False)
+    client_configuration.load_verify_locations(
+        cafile=os.path.join(TESTS_DIR, "pycacert.pem")
+    )
+    client = QuicConnection(configuration=client_configuration)
+
+    server_configuration = QuicConfiguration(
+        is_client=False, max_data=1 << 40, max_stream_data=1 << 40
+    )
+    server_configuration.load_cert_chain(
+        os.path.join(TESTS_DIR, "ssl_cert.pem"),
+        os.path.join(TESTS_DIR, "ssl_key.pem"),
+    )
+    server = QuicConnection(
+        configuration=server_configuration,
+        original_destination_connection_id=client.original_destination_connection_id,
+    )
+
+    # no pacing, the benchmark drives time itself
+    for connection in (client, server):
+        connection._loss._pacer = NoPacer()
+
+    client.connect(SERVER_ADDR, now=time.time())
+    for _ in range(3):
+        transfer(client, server)
+        transfer(server, client)
+    return client, server
+
+
+def bench_idle(rounds: int) -> float:
+    client, server = create_connections()
+    now = time.time()
+    return (
+        min(
+            timeit.repeat(
+                lambda: client.datagrams_to_send(now=now), number=1000, repeat=rounds
+            )
+        )
+        / 1000
+    )
+
+
+def bench_bulk(rounds: int) -> float:
+    client, server = create_connections()
+    stream_id = client.get_next_available_stream_id()
+    payload = bytes(20 * 1200)
+
+    elapsed = 0.0
+    sent = 0
+    for _ in range(rounds):
+        client.send_stream_data(stream_id, payload)
+        start = time.perf_counter()
+        datagrams = client.datagrams_to_send(now=time.time())
+        elapsed += time.perf_counter() - start
+        sent += len(datagrams)
+
+        # acknowledge everything so congestion control stays out of the way
+        for data, _ in datagrams:
+            server.receive_datagram(data, CLIENT_ADDR, now=time.time())
+        transfer(server, client)
+    return elapsed / sent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"idle datagrams_to_send(): {bench_idle(args.rounds) * 1e6:8.1f} us/call")
+    print(f"bulk datagrams_to_send(): {bench_bulk(args.rounds) * 1e6:8.1f} us/datagram")
+
+
+if __name__ == "__main__":
+    main()
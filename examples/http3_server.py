@@ -79,7 +79,12 @@ class HttpRequestHandler:
         await app(self.scope, self.receive, self.send)
 
     async def receive(self) -> dict:
-        return await self.queue.get()
+        message = await self.queue.get()
+        if message.get("body") and isinstance(self.connection, H3Connection):
+            # let the client send more of the body
+            self.connection.stream_data_consumed(self.stream_id, len(message["body"]))
+            self.transmit()
+        return message
 
     async def send(self, message: dict) -> None:
         if message["type"] == "http.response.start":
@@ -147,6 +152,7 @@ class WebSocketHandler:
         if isinstance(event, DataReceived) and not self.closed:
             if self.websocket is not None:
                 self.websocket.receive_data(event.data)
+                self.connection.stream_data_consumed(self.stream_id, len(event.data))
 
                 for ws_event in self.websocket.events():
                     self.websocket_event_received(ws_event)
@@ -276,7 +282,13 @@ class WebTransportHandler:
                 await self.send({"type": "webtransport.close"})
 
     async def receive(self) -> dict:
-        return await self.queue.get()
+        message = await self.queue.get()
+        if message["type"] == "webtransport.stream.receive" and message["data"]:
+            self.connection.stream_data_consumed(
+                message["stream"], len(message["data"])
+            )
+            self.transmit()
+        return message
 
     async def send(self, message: dict) -> None:
         data = b""
@@ -574,6 +586,7 @@ if __name__ == "__main__":
     configuration = QuicConfiguration(
         alpn_protocols=H3_ALPN + ["siduck"],
         is_client=False,
+        flow_control_on_consumption=True,
         max_datagram_frame_size=65536,
         quic_logger=quic_logger,
         secrets_log_file=secrets_log_file,
@@ -11,7 +11,7 @@ from .quic.configuration import QuicConfiguration
 from .quic.connection import QuicConnection, QuicConnectionError
 from .quic.logger import QuicFileLogger, QuicLogger
 from .quic.packet import QuicProtocolVersion
-from .tls import CipherSuite, SessionTicket
+from .tls import CipherSuite, SessionTicket, SessionTicketKeyRing
 
 __version__ = "1.8.1"
 
@@ -33,6 +33,7 @@ __all__ = (
     "ProtocolError",
     "CipherSuite",
     "SessionTicket",
+    "SessionTicketKeyRing",
     "__version__",
 )
 
@@ -15,13 +15,18 @@ class DecompressionFailed(Exception): ...
 class DecoderStreamError(Exception): ...
 class EncoderStreamError(Exception): ...
 class StreamBlocked(Exception): ...
+class FinalSizeError(Exception): ...
 
 class QpackDecoder:
     def __init__(self, max_table_capacity: int, blocked_streams: int) -> None: ...
     def feed_encoder(self, data: bytes) -> None: ...
     def feed_header(
-        self, stream_id: int, data: bytes
-    ) -> tuple[bytes, list[tuple[bytes, bytes]]]: ...
+        self, stream_id: int, data: bytes, kind: int = 0
+    ) -> tuple[
+        bytes,
+        list[tuple[bytes, bytes]],
+        tuple[bytes | None, bytes | None, int | None] | None,
+    ]: ...
     def resume_header(
         self, stream_id: int
     ) -> tuple[bytes, list[tuple[bytes, bytes]]]: ...
@@ -257,6 +262,20 @@ class CryptoContext:
         plain_header: bytes,
         packet_number: int,
     ) -> bytes: ...
+    def open_batch(
+        self,
+        packets: list[bytes],
+        encrypted_offset: int,
+        expected_packet_number: int,
+        previous: CryptoContext | None = None,
+    ) -> list[tuple[bytes, bytes, int] | None]:
+        """
+        Remove header protection from and decrypt a burst of short header
+        packets with the GIL released. Undecryptable packets yield `None`.
+        Decoding stops at the first packet requiring a key update, in which
+        case the returned list is shorter than `packets`.
+        """
+        ...
     def encrypt_packet(
         self,
         plain_header: bytes,
@@ -279,7 +298,47 @@ class CryptoContext:
         peer_token: bytes,
         spin_bit: int,
         packet_number: int,
+        seal: bool = True,
     ) -> int: ...
+    def seal_batch(
+        self, buffer: Buffer, packets: list[tuple[int, int, int, int]]
+    ) -> None:
+        """
+        Encrypt and apply header protection to packets laid out by
+        `finalize_packet(..., seal=False)`. Each entry is
+        `(packet_start, header_size, payload_size, packet_number)`.
+        The GIL is released while sealing.
+        """
+        ...
+
+class KeySchedule:
+    """TLS 1.3 key schedule and handshake transcript hash."""
+
+    generation: int
+    digest_size: int
+    secret: bytes
+
+    def __init__(self, algorithm: int) -> None: ...
+    def transcript(self) -> bytes: ...
+    def update_hash(self, data: bytes) -> None: ...
+    def reset_hash(self, data: bytes) -> None: ...
+    def extract(self, key_material: bytes | None = None) -> None: ...
+    def derive_secret(self, label: bytes) -> bytes: ...
+    def finished_verify_data(self, secret: bytes) -> bytes: ...
+    def certificate_verify_data(self, context_string: bytes) -> bytes: ...
+
+def hkdf_extract(algorithm: int, salt: bytes, key_material: bytes) -> bytes: ...
+def hkdf_expand_label(
+    algorithm: int, secret: bytes, label: bytes, hash_value: bytes, length: int
+) -> bytes: ...
+def quic_derive_key_iv_hp(
+    algorithm: int, secret: bytes, key_size: int, prefix: bytes
+) -> tuple[bytes, bytes, bytes]:
+    """
+    Derive the QUIC packet protection key, IV and header protection key
+    from a traffic secret, `prefix` being b"quic" or b"quicv2".
+    """
+    ...
 
 class QuicStreamSender:
     """The send part of a QUIC stream."""
@@ -306,7 +365,56 @@ class QuicStreamSender:
     def on_data_delivery(self, delivery: int, start: int, stop: int) -> None: ...
     def on_reset_delivery(self, delivery: int) -> None: ...
     def reset(self, error_code: int) -> None: ...
-    def write(self, data: bytes, end_stream: bool = False) -> None: ...
+    def write(
+        self, data: bytes | bytearray | memoryview, end_stream: bool = False
+    ) -> None: ...
+
+def fill_stream_frames(
+    buffer: Buffer,
+    senders: list[QuicStreamSender],
+    max_stream_data: list[int],
+    flight_end: int,
+    remote_data_remaining: int,
+) -> tuple[list[tuple[int, int, int, int, int]], int]:
+    """
+    Pack as many STREAM frames as fit into ``buffer`` before ``flight_end``.
+
+    Returns ``(records, used)`` where each record is
+    ``(sender_index, frame_type, offset, stop_offset, used)``.
+    """
+
+class QuicStreamReceiver:
+    """The receive part of a QUIC stream."""
+
+    highest_offset: int
+    is_finished: bool
+    stop_pending: bool
+    unordered: bool
+
+    def __init__(self, stream_id: int | None = None, readable: bool = True) -> None: ...
+    @property
+    def _buffer_start(self) -> int: ...
+    @property
+    def _final_size(self) -> int | None: ...
+    @property
+    def _ranges(self) -> list[tuple[int, int]]: ...
+    def starting_offset(self) -> int: ...
+    def set_unordered(self) -> list[tuple[bytes, int]]:
+        """
+        Deliver data as soon as it is received, return the data held until
+        now along with its offset.
+        """
+    def handle_frame(
+        self, frame_offset: int, frame_data: bytes, frame_fin: bool = False
+    ) -> tuple[bytes, bool, int] | None:
+        """
+        Handle a frame of received data, return the data which can be
+        delivered, whether the stream ended and the data's offset, if any.
+        """
+    def handle_reset(self, *, final_size: int) -> None: ...
+    def get_stop_frame(self) -> tuple[int, int]: ...
+    def on_stop_sending_delivery(self, delivery: int) -> None: ...
+    def stop(self, error_code: int = 0) -> None: ...
 
 class ReasonFlags(Enum):
     unspecified = 0
@@ -320,6 +428,8 @@ class ReasonFlags(Enum):
     aa_compromise = 10
     remove_from_crl = 8
 
+    def __int__(self) -> int: ...
+
 class OCSPResponseStatus(Enum):
     SUCCESSFUL = 0
     MALFORMED_REQUEST = 1
@@ -438,12 +548,18 @@ class QuicRttMonitor:
 
 class RevokedCertificate:
     serial_number: str
+    raw_serial_number: bytes
     reason: ReasonFlags
     expired_at: int
 
 class CertificateRevocationList:
     def __init__(self, crl: bytes) -> None: ...
-    def is_revoked(self, serial_number: str) -> RevokedCertificate | None: ...
+    def is_revoked(self, serial_number: str | bytes) -> RevokedCertificate | None:
+        """
+        Look the serial number up, either raw or formatted as colon
+        separated hex bytes, in constant time.
+        """
+    def revoked_certificates(self) -> list[RevokedCertificate]: ...
     def serialize(self) -> bytes: ...
     @staticmethod
     def deserialize(src: bytes) -> CertificateRevocationList: ...
@@ -495,6 +611,49 @@ def push_stream_frame_body(
     buffer: Buffer, stream_id: int, offset: int, data: bytes
 ) -> None: ...
 def push_crypto_frame_body(buffer: Buffer, offset: int, data: bytes) -> None: ...
+def pull_client_hello(
+    buffer: Buffer,
+) -> tuple[
+    bytes,  # random
+    bytes,  # legacy_session_id
+    list[int],  # cipher_suites
+    list[int],  # legacy_compression_methods
+    tuple[
+        list[bytes] | None,  # alpn_protocols
+        bool,  # early_data
+        list[tuple[int, bytes]] | None,  # key_share
+        tuple[list[tuple[bytes, int]], list[bytes]] | None,  # pre_shared_key
+        list[int] | None,  # psk_key_exchange_modes
+        bytes | None,  # server_name
+        list[int] | None,  # signature_algorithms
+        list[int] | None,  # supported_groups
+        list[int] | None,  # supported_versions
+        bool,  # status_request
+        list[tuple[int, bytes]],  # other_extensions
+    ],
+]: ...
+def push_server_hello(
+    buffer: Buffer,
+    random: bytes,
+    legacy_session_id: bytes,
+    cipher_suite: int,
+    compression_method: int,
+    key_share: tuple[int, bytes] | None = None,
+    pre_shared_key: int | None = None,
+    supported_version: int | None = None,
+    other_extensions: list[tuple[int, bytes]] = ...,
+) -> None: ...
+def push_encrypted_extensions(
+    buffer: Buffer,
+    alpn_protocol: bytes | None = None,
+    early_data: bool = False,
+    other_extensions: list[tuple[int, bytes]] = ...,
+) -> None: ...
+def push_certificate(
+    buffer: Buffer,
+    request_context: bytes,
+    certificates: list[tuple[bytes, bytes]],
+) -> None: ...
 
 class UdpSocketState:
     """UDP socket state backed by quinn-udp for fast batched syscalls.
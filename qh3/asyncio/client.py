@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import dataclasses
 import ipaddress
 import socket
 from contextlib import asynccontextmanager
@@ -8,7 +9,8 @@ from typing import AsyncGenerator, Callable, cast
 
 from ..quic.configuration import QuicConfiguration
 from ..quic.connection import QuicConnection
-from ..tls import SessionTicketHandler
+from ..quic.session_cache import SessionCache
+from ..tls import SessionTicket, SessionTicketHandler
 from ._transport import create_optimized_datagram_transport
 from .protocol import QuicConnectionProtocol, QuicStreamHandler
 
@@ -30,6 +32,7 @@ async def connect(
     stream_handler: QuicStreamHandler | None = None,
     wait_connected: bool = True,
     local_port: int = 0,
+    session_cache: SessionCache | None = None,
 ) -> AsyncGenerator[QuicConnectionProtocol]:
     """
     Connect to a QUIC server at the given `host` and `port`.
@@ -52,6 +55,11 @@ async def connect(
       created. It must accept two arguments: a :class:`asyncio.StreamReader`
       and a :class:`asyncio.StreamWriter`.
     * ``local_port`` is the UDP port number that this client wants to bind.
+    * ``session_cache`` is a :class:`~qh3.quic.session_cache.SessionCache`
+      storing the session tickets received, and providing one to resume the
+      session when connecting again to the same server and port with an
+      equivalent configuration. It is not consulted if the configuration
+      already holds a session ticket.
     """
     loop = asyncio.get_running_loop()
     local_host = "::"
@@ -74,6 +82,24 @@ async def connect(
         configuration = QuicConfiguration(is_client=True)
     if configuration.server_name is None:
         configuration.server_name = server_name
+    if session_cache is not None:
+        cache_configuration = configuration
+        if configuration.session_ticket is None:
+            session_ticket = session_cache.get(cache_configuration, port)
+            if session_ticket is not None:
+                configuration = dataclasses.replace(
+                    configuration, session_ticket=session_ticket
+                )
+
+        application_session_ticket_handler = session_ticket_handler
+
+        def cache_session_ticket(ticket: SessionTicket) -> None:
+            session_cache.add(cache_configuration, port, ticket)
+            if application_session_ticket_handler is not None:
+                application_session_ticket_handler(ticket)
+
+        session_ticket_handler = cache_session_ticket
+
     connection = QuicConnection(
         configuration=configuration, session_ticket_handler=session_ticket_handler
     )
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+from concurrent.futures import Future
 from typing import Any, Callable, cast
 
 from ..quic import events
@@ -18,6 +19,7 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
 
         self._closed = asyncio.Event()
         self._connected = False
+        self._handshake_operation: Future | None = None
         self._connected_waiter: asyncio.Future[None] | None = None
         self._loop = loop
         self._loop_time = loop.time
@@ -151,14 +153,15 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
 
     def datagram_received(self, data: bytes | str, addr: NetworkAddress) -> None:
         self._quic.receive_datagram(cast(bytes, data), addr, now=self._loop_time())
+        if self._quic.handshake_operation is not None:
+            self._watch_handshake_operation()
         self._process_events()
         self.transmit()
 
     def datagrams_received(self, data: list[bytes], addr: NetworkAddress) -> None:
-        now = self._loop_time()
-        receive = self._quic.receive_datagram
-        for dgram in data:
-            receive(dgram, addr, now=now)
+        self._quic.receive_datagrams(data, addr, now=self._loop_time())
+        if self._quic.handshake_operation is not None:
+            self._watch_handshake_operation()
         self._process_events()
         self.transmit()
 
@@ -211,7 +214,10 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         self, stream_id: int
     ) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
         adapter = QuicStreamAdapter(self, stream_id)
-        reader = asyncio.StreamReader()
+        if self._quic.configuration.flow_control_on_consumption:
+            reader: asyncio.StreamReader = QuicStreamReader(self, stream_id)
+        else:
+            reader = asyncio.StreamReader()
         writer = asyncio.StreamWriter(adapter, None, reader, self._loop)
         self._stream_readers[stream_id] = reader
         return reader, writer
@@ -262,11 +268,83 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
             quic_event_received(event)
             event = quic.next_event()
 
+    def _watch_handshake_operation(self) -> None:
+        operation = self._quic.handshake_operation
+        if operation is not None and operation is not self._handshake_operation:
+            self._handshake_operation = operation
+            operation.add_done_callback(
+                lambda _: self._loop.call_soon_threadsafe(
+                    self._handshake_operation_done
+                )
+            )
+
+    def _handshake_operation_done(self) -> None:
+        self._handshake_operation = None
+        self._quic.resume_handshake()
+        self._watch_handshake_operation()
+        self._process_events()
+        self.transmit()
+
     def _transmit_soon(self) -> None:
         if self._transmit_task is None:
             self._transmit_task = self._loop.call_soon(self.transmit)
 
 
+class QuicStreamReader(asyncio.StreamReader):
+    """
+    A stream reader acknowledging the data read from it to the QUIC
+    connection, so that the peer is only given more flow control credit
+    as the application catches up.
+    """
+
+    def __init__(self, protocol: QuicConnectionProtocol, stream_id: int):
+        super().__init__()
+
+        self.protocol = protocol
+        self.stream_id = stream_id
+
+    async def read(self, n: int = -1) -> bytes:
+        data = await super().read(n)
+        # read(-1) is made of read(n) calls, which already reported their data
+        if n >= 0:
+            self._data_consumed(len(data))
+        return data
+
+    async def readexactly(self, n: int) -> bytes:
+        try:
+            data = await super().readexactly(n)
+        except asyncio.IncompleteReadError as exc:
+            self._data_consumed(len(exc.partial))
+            raise
+        self._data_consumed(len(data))
+        return data
+
+    async def readline(self) -> bytes:
+        # StreamReader.readline drops overlong lines straight from its buffer,
+        # they go through readexactly() here so that they are reported too
+        try:
+            return await self.readuntil(b"\n")
+        except asyncio.IncompleteReadError as exc:
+            return exc.partial
+        except asyncio.LimitOverrunError as exc:
+            await self.readexactly(exc.consumed)
+            raise ValueError(exc.args[0])
+
+    async def readuntil(self, separator: Any = b"\n") -> bytes:
+        try:
+            data = await super().readuntil(separator)
+        except asyncio.IncompleteReadError as exc:
+            self._data_consumed(len(exc.partial))
+            raise
+        self._data_consumed(len(data))
+        return data
+
+    def _data_consumed(self, amount: int) -> None:
+        if amount:
+            self.protocol._quic.stream_data_consumed(self.stream_id, amount)
+            self.protocol._transmit_soon()
+
+
 class QuicStreamAdapter(asyncio.Transport):
     def __init__(self, protocol: QuicConnectionProtocol, stream_id: int):
         super().__init__()
@@ -42,6 +42,7 @@ from .events import (
     StreamReset as H3StreamReset,
 )
 from .exceptions import NoAvailablePushIDError
+from .qpack import QpackEncoderStats, count_table_hits, header_block_prefix_length
 
 logger = logging.getLogger("http3")
 
@@ -58,6 +59,13 @@ _REQUEST_REQUIRED_PSEUDO = frozenset((b":method", b":authority"))
 _PUSH_PROMISE_PSEUDO = frozenset((b":method", b":scheme", b":authority", b":path"))
 _TRAILERS_PSEUDO: frozenset[bytes] = frozenset()
 
+# Kinds of header lists QpackDecoder.feed_header validates while decoding,
+# returning their (method, path, status) pseudo-headers when valid.
+_VALIDATE_REQUEST = 1
+_VALIDATE_RESPONSE = 2
+_VALIDATE_PUSH_PROMISE = 3
+_VALIDATE_TRAILERS = 4
+
 # Lookup table for uppercase ASCII bytes (A-Z = 65-90)
 _HAS_UPPERCASE = bytearray(256)
 for _i in range(65, 91):
@@ -199,6 +207,13 @@ def encode_frame(frame_type: int, frame_data: bytes) -> bytes:
     return buf.data
 
 
+def encode_frame_header(frame_type: int, frame_length: int) -> bytes:
+    buf = Buffer(capacity=2 * UINT_VAR_MAX_SIZE)
+    buf.push_uint_var(frame_type)
+    buf.push_uint_var(frame_length)
+    return buf.data
+
+
 def encode_settings(settings: dict[int, int]) -> bytes:
     buf = Buffer(capacity=1024)
     for setting, value in settings.items():
@@ -330,11 +345,93 @@ def validate_trailers(headers: Headers) -> None:
     )
 
 
+class HeaderTemplate:
+    """
+    A header list validated and QPACK encoded once, to be sent along with
+    the fields which vary from one message to the next, see
+    :meth:`H3Connection.send_headers`.
+
+    The fields of a template only reference the QPACK static table, they are
+    never inserted in the dynamic table. This trades bytes for CPU: a long
+    field is smaller among the varying fields, where the dynamic table turns
+    it into a reference once the peer has it.
+
+    :param headers: The HTTP headers shared by the messages.
+    """
+
+    def __init__(self, headers: Headers) -> None:
+        pseudo_headers: Headers = []
+        regular_headers: Headers = []
+        seen_pseudo_headers: set[bytes] = set()
+        for key, value in headers:
+            for b in key:
+                if _HAS_UPPERCASE[b]:
+                    raise MessageError(f"Header {key!r} contains uppercase letters")
+            if key and key[0] == 58:  # ord(b":") == 58
+                if regular_headers:
+                    raise MessageError(
+                        f"Pseudo-header {key!r} is not allowed after regular headers"
+                    )
+                if key in seen_pseudo_headers:
+                    raise MessageError(f"Pseudo-header {key!r} is included twice")
+                seen_pseudo_headers.add(key)
+                pseudo_headers.append((key, value))
+            else:
+                regular_headers.append((key, value))
+
+        #: The pseudo-headers, sent ahead of the varying fields.
+        self.pseudo_headers = pseudo_headers
+        #: The regular headers, sent after the varying fields.
+        self.regular_headers = regular_headers
+
+        # without a dynamic table, the field lines do not depend on the
+        # connection nor the stream, only the two bytes prefix is dropped
+        encoder = QpackEncoder()
+        encoder.apply_settings(0, 0, 0)
+        try:
+            self._pseudo_field_lines = encoder.encode(0, pseudo_headers)[1][2:]
+            self._regular_field_lines = encoder.encode(0, regular_headers)[1][2:]
+        except EncoderStreamError as exc:
+            raise MessageError(str(exc)) from exc
+
+        #: The QPACK encoder counters of the template's fields, added to those
+        #: of the connections sending it.
+        self.encoder_stats = QpackEncoderStats(
+            field_lines=len(headers),
+            static_table_hits=count_table_hits(
+                b"\x00\x00" + self._pseudo_field_lines + self._regular_field_lines
+            )[1],
+            uncompressed_bytes=sum(len(k) + len(v) for k, v in headers),
+            header_block_bytes=(
+                len(self._pseudo_field_lines) + len(self._regular_field_lines)
+            ),
+        )
+
+    def expand(self, headers: Headers) -> Headers:
+        """
+        Return the header list sent for the given varying fields.
+        """
+        return self.pseudo_headers + headers + self.regular_headers
+
+    def encode(self, prefix: bytes, field_lines: bytes) -> bytes:
+        """
+        Return the header block combining the template with the varying
+        fields encoded as `field_lines`, following the `prefix` of their
+        header block.
+        """
+        return b"".join(
+            (prefix, self._pseudo_field_lines, field_lines, self._regular_field_lines)
+        )
+
+
 class H3Stream:
     def __init__(self, stream_id: int) -> None:
         self.blocked = False
         self.blocked_frame_size: int | None = None
         self.buffer = bytearray()
+        self.bytes_acknowledged = 0
+        self.bytes_delivered = 0
+        self.bytes_received = 0
         self.ended = False
         self.frame_size: int | None = None
         self.frame_type: int | None = None
@@ -366,9 +463,16 @@ class H3Connection:
 
     def __init__(self, quic: QuicConnection, enable_webtransport: bool = False) -> None:
         # settings
-        self._max_table_capacity = 4096
-        self._blocked_streams = 16
+        configuration = quic.configuration
+        self._qpack_table_sizer = configuration.qpack_table_sizer
+        self._max_table_capacity = (
+            self._qpack_table_sizer.capacity
+            if self._qpack_table_sizer is not None
+            else configuration.qpack_max_table_capacity
+        )
+        self._blocked_streams = configuration.qpack_blocked_streams
         self._enable_webtransport = enable_webtransport
+        self._flow_control_on_consumption = configuration.flow_control_on_consumption
 
         self._is_client = quic.configuration.is_client
         self._is_done = False
@@ -380,6 +484,9 @@ class H3Connection:
         self._encoder = QpackEncoder()
         self._encoder_bytes_received = 0
         self._encoder_bytes_sent = 0
+        self._encoder_stats: QpackEncoderStats | None = (
+            QpackEncoderStats() if configuration.qpack_encoder_stats else None
+        )
         self._settings_received = False
         self._stream: dict[int, H3Stream] = {}
 
@@ -544,7 +651,9 @@ class H3Connection:
 
         return push_stream_id
 
-    def send_data(self, stream_id: int, data: bytes, end_stream: bool) -> None:
+    def send_data(
+        self, stream_id: int, data: bytes | bytearray | memoryview, end_stream: bool
+    ) -> None:
         """
         Send data on the given stream.
 
@@ -553,7 +662,7 @@ class H3Connection:
         method.
 
         :param stream_id: The stream ID on which to send the data.
-        :param data: The data to send.
+        :param data: The data to send, any object supporting the buffer protocol.
         :param end_stream: Whether to end the stream.
         """
         # check DATA frame is allowed
@@ -566,22 +675,31 @@ class H3Connection:
 
         self._maybe_cleanup_stream(stream)
 
+        length = len(data) if type(data) is bytes else memoryview(data).nbytes
+
         # log frame
         if self._quic_logger is not None:
             self._quic_logger.log_event(
                 category="http",
                 event="frame_created",
                 data=self._quic_logger.encode_http3_data_frame(
-                    length=len(data), stream_id=stream_id
+                    length=length, stream_id=stream_id
                 ),
             )
 
+        # the frame header and the payload are written separately, sparing a
+        # copy of the payload
         self._quic.send_stream_data(
-            stream_id, encode_frame(FrameType.DATA, data), end_stream
+            stream_id, encode_frame_header(FrameType.DATA, length)
         )
+        self._quic.send_stream_data(stream_id, data, end_stream)
 
     def send_headers(
-        self, stream_id: int, headers: Headers, end_stream: bool = False
+        self,
+        stream_id: int,
+        headers: Headers,
+        end_stream: bool = False,
+        template: HeaderTemplate | None = None,
     ) -> None:
         """
         Send headers on the given stream.
@@ -593,6 +711,9 @@ class H3Connection:
         :param stream_id: The stream ID on which to send the headers.
         :param headers: The HTTP headers to send.
         :param end_stream: Whether to end the stream.
+        :param template: A :class:`HeaderTemplate` holding the fields sent
+            along with `headers`, its pseudo-headers ahead of them and its
+            regular headers after them.
         """
         # check HEADERS frame is allowed
         stream = self._get_or_create_stream(stream_id)
@@ -602,7 +723,9 @@ class H3Connection:
         if end_stream:
             stream.finish_sending()
 
-        frame_data = self._encode_headers(stream_id, headers)
+        frame_data = self._encode_headers(stream_id, headers, template)
+        if template is not None:
+            headers = template.expand(headers)
 
         # log frame
         if self._quic_logger is not None:
@@ -637,6 +760,30 @@ class H3Connection:
         )
         self._maybe_cleanup_stream(stream)
 
+    def stream_data_consumed(self, stream_id: int, amount: int) -> None:
+        """
+        Acknowledge that the application consumed data from the
+        :class:`~qh3.h3.events.DataReceived` or
+        :class:`~qh3.h3.events.WebTransportStreamDataReceived` events of a
+        stream, see
+        :meth:`~qh3.quic.connection.QuicConnection.stream_data_consumed`.
+
+        The rest of the stream data is acknowledged by the connection itself.
+
+        :param stream_id: The stream's ID.
+        :param amount: The number of bytes consumed.
+        """
+        self._quic.stream_data_consumed(stream_id, amount)
+
+    @property
+    def qpack_encoder_stats(self) -> QpackEncoderStats | None:
+        """
+        Return the counters of the QPACK encoder, or None unless the
+        configuration sets
+        :attr:`~qh3.quic.configuration.QuicConfiguration.qpack_encoder_stats`.
+        """
+        return self._encoder_stats
+
     @property
     def received_settings(self) -> dict[int, int] | None:
         """
@@ -662,12 +809,19 @@ class H3Connection:
         self._quic.send_stream_data(stream_id, encode_uint_var(stream_type))
         return stream_id
 
-    def _decode_headers(self, stream_id: int, frame_data: bytes | None) -> Headers:
+    def _decode_headers(
+        self, stream_id: int, frame_data: bytes | None, kind: int = 0
+    ) -> tuple[Headers, tuple[bytes | None, bytes | None, int | None] | None]:
         """
         Decode a HEADERS block and send decoder updates on the decoder stream.
 
+        The header list is validated as the given `kind` while decoding, its
+        (method, path, status) pseudo-headers are returned if it is valid.
+        `None` is returned in their place if it is not, or was not validated.
+
         This is called with frame_data=None when a stream becomes unblocked.
         """
+        pseudo_headers = None
         try:
             if frame_data is None:
                 decoder, headers = self._blocked_stream_map[stream_id]._pending  # type: ignore[attr-defined]
@@ -677,25 +831,54 @@ class H3Connection:
                 #  seems to ignore bad frames..
                 if not frame_data:
                     raise DecompressionFailed()
-                decoder, headers = self._decoder.feed_header(stream_id, frame_data)
+                decoder, headers, pseudo_headers = self._decoder.feed_header(
+                    stream_id, frame_data, kind
+                )
             self._decoder_bytes_sent += len(decoder)
             self._quic.send_stream_data(self._local_decoder_stream_id, decoder)
         except DecompressionFailed as exc:
             raise QpackDecompressionFailed() from exc
 
-        return headers
+        if self._qpack_table_sizer is not None:
+            self._qpack_table_sizer.observe(headers)
+        return headers, pseudo_headers
 
-    def _encode_headers(self, stream_id: int, headers: Headers) -> bytes:
+    def _encode_headers(
+        self, stream_id: int, headers: Headers, template: HeaderTemplate | None = None
+    ) -> bytes:
         """
         Encode a HEADERS block and send encoder updates on the encoder stream.
+
+        The fields of `template`, if any, are spliced around `headers`.
         """
-        try:
-            encoder, frame_data = self._encoder.encode(stream_id, headers)
-        except EncoderStreamError as exc:
-            raise QpackEncoderStreamError() from exc
+        if template is not None and not headers:
+            encoder, frame_data = b"", b"\x00\x00"
+        else:
+            try:
+                encoder, frame_data = self._encoder.encode(stream_id, headers)
+            except EncoderStreamError as exc:
+                raise QpackEncoderStreamError() from exc
 
         self._encoder_bytes_sent += len(encoder)
-        self._quic.send_stream_data(self._local_encoder_stream_id, encoder)
+        if self._encoder_stats is not None:
+            self._encoder_stats.record(
+                len(headers),
+                sum(len(k) + len(v) for k, v in headers),
+                encoder,
+                frame_data,
+            )
+            if template is not None:
+                self._encoder_stats.merge(template.encoder_stats)
+        if template is not None:
+            prefix_length = header_block_prefix_length(frame_data)
+            frame_data = template.encode(
+                frame_data[:prefix_length], frame_data[prefix_length:]
+            )
+
+        if self._qpack_table_sizer is not None:
+            self._qpack_table_sizer.observe(headers)
+        if encoder:
+            self._quic.send_stream_data(self._local_encoder_stream_id, encoder)
         return frame_data
 
     def _get_or_create_stream(self, stream_id: int) -> H3Stream:
@@ -742,11 +925,19 @@ class H3Connection:
             settings = parse_settings(frame_data)
             self._validate_settings(settings)
             self._received_settings = settings
+            max_table_capacity = settings.get(Setting.QPACK_MAX_TABLE_CAPACITY, 0)
+            dyn_table_capacity = max_table_capacity
+            if self._qpack_table_sizer is not None:
+                dyn_table_capacity = min(
+                    max_table_capacity, self._qpack_table_sizer.capacity
+                )
             encoder = self._encoder.apply_settings(
-                max_table_capacity=settings.get(Setting.QPACK_MAX_TABLE_CAPACITY, 0),
-                dyn_table_capacity=settings.get(Setting.QPACK_MAX_TABLE_CAPACITY, 0),
+                max_table_capacity=max_table_capacity,
+                dyn_table_capacity=dyn_table_capacity,
                 blocked_streams=settings.get(Setting.QPACK_BLOCKED_STREAMS, 0),
             )
+            if self._encoder_stats is not None:
+                self._encoder_stats.encoder_stream_bytes += len(encoder)
             self._quic.send_stream_data(self._local_encoder_stream_id, encoder)
             self._settings_received = True
         elif frame_type == FrameType.GOAWAY:
@@ -799,17 +990,27 @@ class H3Connection:
             if stream.headers_recv_state is HeadersState.AFTER_TRAILERS:
                 raise FrameUnexpected("HEADERS frame is not allowed in this state")
 
+            if stream.headers_recv_state is not HeadersState.INITIAL:
+                kind = _VALIDATE_TRAILERS
+            elif self._is_client:
+                kind = _VALIDATE_RESPONSE
+            else:
+                kind = _VALIDATE_REQUEST
+
             # try to decode HEADERS, may raise pylsqpack.StreamBlocked
-            headers = self._decode_headers(stream.stream_id, frame_data)
+            headers, pseudo_headers = self._decode_headers(
+                stream.stream_id, frame_data, kind
+            )
 
             status_code: int | None = None
 
-            # validate headers
-            if stream.headers_recv_state is HeadersState.INITIAL:
-                if self._is_client:
-                    status_code = validate_response_headers(headers)
-                else:
-                    validate_request_headers(headers)
+            # validate headers, unless the decoder found them valid
+            if pseudo_headers is not None:
+                status_code = pseudo_headers[2]
+            elif kind == _VALIDATE_RESPONSE:
+                status_code = validate_response_headers(headers)
+            elif kind == _VALIDATE_REQUEST:
+                validate_request_headers(headers)
             else:
                 validate_trailers(headers)
 
@@ -868,12 +1069,13 @@ class H3Connection:
                 raise FrameUnexpected("Clients must not send PUSH_PROMISE")
             frame_buf = Buffer(data=frame_data)
             push_id = frame_buf.pull_uint_var()
-            headers = self._decode_headers(
-                stream.stream_id, frame_data[frame_buf.tell() :]
+            headers, pseudo_headers = self._decode_headers(
+                stream.stream_id, frame_data[frame_buf.tell() :], _VALIDATE_PUSH_PROMISE
             )
 
-            # validate headers
-            validate_push_promise_headers(headers)
+            # validate headers, unless the decoder found them valid
+            if pseudo_headers is None:
+                validate_push_promise_headers(headers)
 
             # log frame
             if self._quic_logger is not None:
@@ -976,9 +1178,39 @@ class H3Connection:
             result = self._receive_request_or_push_data(
                 stream, event.data, event.end_stream
             )
+        if self._flow_control_on_consumption:
+            stream.bytes_received += len(event.data)
+            self._acknowledge_stream_data(stream, result)
         self._maybe_cleanup_stream(stream)
         return result
 
+    def _acknowledge_stream_data(
+        self, stream: H3Stream, http_events: list[H3Event]
+    ) -> None:
+        """
+        Acknowledge the stream data processed by the connection itself, that
+        is all but the data carried by the events and the data still buffered.
+        """
+        streams = {stream.stream_id: stream}
+        for event in http_events:
+            stream_id = getattr(event, "stream_id", None)
+            if stream_id is None or stream_id not in self._stream:
+                continue
+            h3_stream = streams[stream_id] = self._stream[stream_id]
+            if isinstance(event, (DataReceived, WebTransportStreamDataReceived)):
+                h3_stream.bytes_delivered += len(event.data)
+
+        for h3_stream in streams.values():
+            amount = (
+                h3_stream.bytes_received
+                - h3_stream.bytes_delivered
+                - h3_stream.bytes_acknowledged
+                - len(h3_stream.buffer)
+            )
+            if amount > 0:
+                h3_stream.bytes_acknowledged += amount
+                self._quic.stream_data_consumed(h3_stream.stream_id, amount)
+
     def _receive_request_or_push_data(
         self, stream: H3Stream, data: bytes, stream_ended: bool
     ) -> list[H3Event]:
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .events import Headers
+
+# RFC 9204 3.2.1: an entry costs its name and value lengths plus 32 bytes
+ENTRY_OVERHEAD = 32
+
+
+@dataclass
+class QpackEncoderStats:
+    """
+    Counters of the QPACK encoder of an :class:`~qh3.h3.connection.H3Connection`.
+    """
+
+    header_blocks: int = 0
+    "The number of header blocks encoded."
+
+    field_lines: int = 0
+    "The number of field lines encoded."
+
+    dynamic_table_hits: int = 0
+    "The field lines encoded as a reference to a dynamic table entry."
+
+    static_table_hits: int = 0
+    "The field lines encoded as a reference to a static table entry."
+
+    dynamic_header_blocks: int = 0
+    """
+    The header blocks with a non-zero Required Insert Count, those referencing
+    the dynamic table. The peer may have to wait for the entries they
+    reference, whether it actually did is not known to the encoder.
+    """
+
+    uncompressed_bytes: int = 0
+    "The size of the names and values of the field lines encoded."
+
+    header_block_bytes: int = 0
+    "The size of the header blocks sent in HEADERS and PUSH_PROMISE frames."
+
+    encoder_stream_bytes: int = 0
+    "The size of the instructions sent on the encoder stream."
+
+    @property
+    def dynamic_table_hit_ratio(self) -> float:
+        """
+        The share of field lines encoded as a reference to a dynamic table
+        entry.
+        """
+        return self.dynamic_table_hits / self.field_lines if self.field_lines else 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        """
+        How many bytes QPACK saved, compared to sending names and values as is.
+        """
+        return (
+            self.uncompressed_bytes
+            - self.header_block_bytes
+            - self.encoder_stream_bytes
+        )
+
+    def record(
+        self,
+        field_lines: int,
+        uncompressed_bytes: int,
+        encoder: bytes,
+        frame_data: bytes,
+    ) -> None:
+        """
+        Account for `field_lines` totalling `uncompressed_bytes`, encoded as
+        `frame_data` along with the `encoder` stream instructions.
+        """
+        self.header_blocks += 1
+        self.field_lines += field_lines
+        self.uncompressed_bytes += uncompressed_bytes
+        self.header_block_bytes += len(frame_data)
+        self.encoder_stream_bytes += len(encoder)
+
+        dynamic, static = count_table_hits(frame_data)
+        self.dynamic_table_hits += dynamic
+        self.static_table_hits += static
+        if frame_data[:1] != b"\x00":
+            # a non-zero Required Insert Count
+            self.dynamic_header_blocks += 1
+
+    def merge(self, other: QpackEncoderStats) -> None:
+        """
+        Add the counters of `other` to these.
+        """
+        self.header_blocks += other.header_blocks
+        self.field_lines += other.field_lines
+        self.dynamic_table_hits += other.dynamic_table_hits
+        self.static_table_hits += other.static_table_hits
+        self.dynamic_header_blocks += other.dynamic_header_blocks
+        self.uncompressed_bytes += other.uncompressed_bytes
+        self.header_block_bytes += other.header_block_bytes
+        self.encoder_stream_bytes += other.encoder_stream_bytes
+
+
+def _skip_prefixed_int(data: bytes, pos: int, mask: int) -> int:
+    """
+    Return the position following the integer with an N-bit prefix
+    (RFC 7541 5.1) at `pos`, `mask` having its N low bits set.
+    """
+    if data[pos] & mask == mask:
+        pos += 1
+        while data[pos] & 0x80:
+            pos += 1
+    return pos + 1
+
+
+def _pull_prefixed_int(data: bytes, pos: int, mask: int) -> tuple[int, int]:
+    """
+    Read the integer with an N-bit prefix (RFC 7541 5.1) at `pos`, `mask`
+    having its N low bits set, return it along with the position following it.
+    """
+    value = data[pos] & mask
+    pos += 1
+    if value == mask:
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value += (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+    return value, pos
+
+
+def header_block_prefix_length(frame_data: bytes) -> int:
+    """
+    Return the length of the prefix of an encoded header block, its Required
+    Insert Count and Delta Base (RFC 9204 4.5.1).
+    """
+    return _skip_prefixed_int(frame_data, _skip_prefixed_int(frame_data, 0, 0xFF), 0x7F)
+
+
+@lru_cache(maxsize=256)
+def count_table_hits(frame_data: bytes) -> tuple[int, int]:
+    """
+    Return how many field lines of an encoded header block are references to
+    the dynamic table and to the static table (RFC 9204 4.5).
+
+    Results are memoized, as responses tend to repeat the same header blocks
+    once the dynamic table is warm.
+    """
+    dynamic = static = 0
+    try:
+        # Required Insert Count, then Delta Base
+        pos = _skip_prefixed_int(frame_data, 0, 0xFF)
+        pos = _skip_prefixed_int(frame_data, pos, 0x7F)
+        end = len(frame_data)
+        while pos < end:
+            byte = frame_data[pos]
+            if byte & 0x80:
+                # indexed field line
+                if byte & 0x40:
+                    static += 1
+                else:
+                    dynamic += 1
+                pos = _skip_prefixed_int(frame_data, pos, 0x3F)
+                continue
+            if byte & 0x40:
+                # literal field line with name reference
+                pos = _skip_prefixed_int(frame_data, pos, 0x0F)
+            elif byte & 0x20:
+                # literal field line with literal name
+                length, pos = _pull_prefixed_int(frame_data, pos, 0x07)
+                pos += length
+            elif byte & 0x10:
+                # indexed field line with post-base index
+                dynamic += 1
+                pos = _skip_prefixed_int(frame_data, pos, 0x0F)
+                continue
+            else:
+                # literal field line with post-base name reference
+                pos = _skip_prefixed_int(frame_data, pos, 0x07)
+            length, pos = _pull_prefixed_int(frame_data, pos, 0x7F)
+            pos += length
+    except IndexError:
+        pass  # Defensive: the encoder produced a truncated block.
+    return dynamic, static
+
+
+class QpackTableSizer:
+    """
+    Picks the QPACK dynamic table capacity from the header lists seen by the
+    connections using it: the capacity holding the fields which repeat
+    across header lists, within `min_capacity` and `max_capacity`.
+
+    It is given to connections through
+    :attr:`~qh3.quic.configuration.QuicConfiguration.qpack_table_sizer`,
+    and can be shared by all the configurations of a process.
+
+    :param min_capacity: the smallest capacity picked, in bytes.
+    :param max_capacity: the largest capacity picked, in bytes.
+    :param max_fields: how many distinct fields are tracked, the least
+        recently seen is forgotten first.
+    """
+
+    def __init__(
+        self,
+        min_capacity: int = 4096,
+        max_capacity: int = 65536,
+        max_fields: int = 4096,
+    ) -> None:
+        self._fields: OrderedDict[tuple[bytes, bytes], bool] = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_capacity = max_capacity
+        self._max_fields = max_fields
+        self._min_capacity = min_capacity
+        self._repeated_size = 0
+
+    @property
+    def capacity(self) -> int:
+        """
+        The dynamic table capacity, in bytes, for the header lists seen so far.
+        """
+        return max(self._min_capacity, min(self._max_capacity, self._repeated_size))
+
+    def observe(self, headers: Headers) -> None:
+        """
+        Account for a header list sent or received.
+        """
+        with self._lock:
+            fields = self._fields
+            for name, value in headers:
+                key = (name, value)
+                repeated = fields.get(key)
+                if repeated is None:
+                    fields[key] = False
+                    if len(fields) > self._max_fields:
+                        (old_name, old_value), old_repeated = fields.popitem(last=False)
+                        if old_repeated:
+                            self._repeated_size -= (
+                                len(old_name) + len(old_value) + ENTRY_OVERHEAD
+                            )
+                else:
+                    if not repeated:
+                        fields[key] = True
+                        self._repeated_size += len(name) + len(value) + ENTRY_OVERHEAD
+                    fields.move_to_end(key)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from concurrent.futures import Executor
 from dataclasses import dataclass, field
 from os import PathLike
 from re import split
@@ -8,10 +9,18 @@ from typing import TYPE_CHECKING, TextIO
 if TYPE_CHECKING:
     from .._hazmat import Certificate as X509Certificate
     from .._hazmat import DsaPrivateKey, EcPrivateKey, Ed25519PrivateKey, RsaPrivateKey
+    from ..h3.qpack import QpackTableSizer
 
 from ..tls import (
     CipherSuite,
+    KeyShareGroupCache,
+    KeySharePool,
+    OcspCache,
+    ServerCredentials,
     SessionTicket,
+    SessionTicketKeyRing,
+    VerifiedChainCache,
+    build_server_credentials,
     load_pem_private_key,
     load_pem_x509_certificates,
 )
@@ -68,6 +77,53 @@ class QuicConfiguration:
     Per-stream flow control limit.
     """
 
+    flow_control_on_consumption: bool = False
+    """
+    Only give the peer more flow control credit as the application consumes
+    the data received, reported with
+    :meth:`~qh3.quic.connection.QuicConnection.stream_data_consumed`, instead
+    of as the data is received.
+
+    The data buffered for a connection then stays within :attr:`max_data`,
+    and within :attr:`max_stream_data` for each stream, however slowly it is
+    read.
+    """
+
+    receive_window_budget: int | None = None
+    """
+    Enables the auto-tuning of the receive windows, up to this many bytes for
+    a connection and for each of its streams.
+
+    :attr:`max_data` and :attr:`max_stream_data` are then the initial windows,
+    grown towards twice the bandwidth-delay product measured from the RTT and
+    the rate at which data is received, or consumed.
+    """
+
+    qpack_max_table_capacity: int = 4096
+    """
+    The maximum size in bytes of the QPACK dynamic table the peer may use to
+    encode the HTTP/3 headers it sends.
+    """
+
+    qpack_blocked_streams: int = 16
+    """
+    How many HTTP/3 streams the peer may leave blocked on QPACK dynamic table
+    updates.
+    """
+
+    qpack_encoder_stats: bool = False
+    """
+    Whether HTTP/3 connections count what their QPACK encoder does, see
+    :attr:`~qh3.h3.connection.H3Connection.qpack_encoder_stats`.
+    """
+
+    qpack_table_sizer: QpackTableSizer | None = None
+    """
+    Picks the QPACK dynamic table capacity from the headers observed, in place
+    of :attr:`qpack_max_table_capacity`. The table used to encode headers is
+    also held to it, within the peer's limit.
+    """
+
     quic_logger: QuicLogger | None = None
     """
     The :class:`~qh3.quic.logger.QuicLogger` instance to log events to.
@@ -137,6 +193,64 @@ class QuicConfiguration:
     .. note:: Client side only!
     """
 
+    session_ticket_key_ring: SessionTicketKeyRing | None = None
+    """
+    The keys sealing the resumption state into the session tickets issued
+    by the server, allowing any server holding the same keys to resume
+    sessions and accept 0-RTT without storing tickets.
+
+    .. note:: Server side only!
+    """
+
+    key_share_pool: KeySharePool | None = None
+    """
+    A pool of key exchange key pairs generated ahead of time, which
+    handshakes draw from instead of generating them on the spot.
+
+    It can be shared by all the configurations of a process.
+    """
+
+    key_share_group_cache: KeyShareGroupCache | None = None
+    """
+    Remembers the key exchange group each server selected, so that later
+    ClientHellos to that server only carry a key share for that group.
+
+    .. note:: Client side only!
+    """
+
+    verified_chain_cache: VerifiedChainCache | None = None
+    """
+    Remembers the server certificate chains which passed validation, so that
+    handshakes with a server seen recently skip path building. The
+    CertificateVerify signature is still checked on every handshake.
+
+    .. note:: Client side only!
+    """
+
+    ocsp_cache: OcspCache | None = None
+    """
+    OCSP responses kept until their nextUpdate. Servers staple the response
+    for their certificate, fetched and refreshed in the background, to the
+    handshakes asking for it.
+
+    .. note:: Server side only!
+    """
+
+    handshake_executor: Executor | None = None
+    """
+    An executor, such as a :class:`concurrent.futures.ThreadPoolExecutor`,
+    running the CertificateVerify signature (servers) and the peer
+    certificate verification (clients) off the thread driving the
+    connection.
+
+    The handshake is suspended meanwhile, see
+    :attr:`~qh3.quic.connection.QuicConnection.handshake_operation`.
+    """
+
+    _server_credentials: ServerCredentials | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
     def load_cert_chain(
         self,
         certfile: str | bytes | PathLike,
@@ -182,6 +296,7 @@ class QuicConfiguration:
 
         self.certificate = certificates[0]
         self.certificate_chain = certificates[1:]
+        self._server_credentials = None
 
         if keyfile is not None:
             self.private_key = load_pem_private_key(
@@ -191,6 +306,26 @@ class QuicConfiguration:
                 ),
             )
 
+    def server_credentials(self) -> ServerCredentials | None:
+        """
+        Return the encoded Certificate message and signing parameters for
+        :attr:`certificate`, :attr:`certificate_chain` and :attr:`private_key`.
+
+        They are computed on first use and shared by every connection using
+        this configuration, until :meth:`load_cert_chain` is called again.
+        """
+        if self.certificate is None:
+            return None
+
+        credentials = self._server_credentials
+        if credentials is None or not credentials.matches(
+            self.certificate, self.certificate_chain, self.private_key
+        ):
+            credentials = self._server_credentials = build_server_credentials(
+                self.certificate, self.certificate_chain, self.private_key
+            )
+        return credentials
+
     def load_verify_locations(
         self,
         cafile: str | None = None,
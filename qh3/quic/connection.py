@@ -4,10 +4,11 @@ import binascii
 import logging
 import os
 from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass
 from enum import IntEnum
 from functools import lru_cache, partial
-from typing import TYPE_CHECKING, Any, Sequence
+from typing import TYPE_CHECKING, Any, Callable, Sequence
 
 if TYPE_CHECKING:
     from .configuration import QuicConfiguration
@@ -18,12 +19,12 @@ from .._compat import DATACLASS_KWARGS, UINT_VAR_MAX_SIZE
 from .._hazmat import (
     Buffer,
     BufferReadError,
+    fill_stream_frames,
     pull_ack_frame,
     pull_crypto_frame,
     pull_stream_frame,
     push_ack_frame,
     push_crypto_frame_body,
-    push_stream_frame_body,
     size_uint_var,
 )
 from .._hazmat import Certificate as X509Certificate
@@ -34,6 +35,7 @@ from .crypto import CryptoError, CryptoPair, KeyUnavailableError, NoCallback
 from .packet import (
     CONNECTION_ID_MAX_SIZE,
     NON_ACK_ELICITING_FRAME_TYPES,
+    PACKET_LONG_HEADER,
     PROBING_FRAME_TYPES,
     RETRY_INTEGRITY_TAG_SIZE,
     STATELESS_RESET_TOKEN_SIZE,
@@ -52,7 +54,9 @@ from .packet import (
 )
 from .packet_builder import (
     MTU_PROBE_SIZES,
+    SEAL_BATCH_DATAGRAMS,
     SMALLEST_MAX_DATAGRAM_SIZE,
+    QuicDeliveryHandler,
     QuicDeliveryState,
     QuicPacketBuilder,
     QuicPacketBuilderStop,
@@ -181,6 +185,23 @@ def check_stream_id_for_receiving(is_client: bool, stream_id: int) -> bool:
     ) is not is_client or not stream_is_unidirectional(stream_id)
 
 
+def tune_receive_window(
+    window: int, received: int, elapsed: float, rtt: float, max_window: int
+) -> int:
+    """
+    Return the size of a receive window through which `received` bytes went
+    in the `elapsed` seconds since it was last topped up.
+
+    The window grows towards twice the bandwidth-delay product, so that new
+    credit reaches the peer before it runs out, at most doubling at a time.
+    It never shrinks, nor grows past `max_window`.
+    """
+    target = 2 * received * rtt / max(elapsed, K_GRANULARITY)
+    if target > window:
+        window = max(window, min(int(target), 2 * window, max_window))
+    return window
+
+
 class Limit:
     def __init__(self, frame_type: int, name: str, value: int):
         self.frame_type = frame_type
@@ -298,6 +319,9 @@ class QuicConnection:
         "_local_challenges",
         "_local_initial_source_connection_id",
         "_local_max_data",
+        "_local_max_data_consumed",
+        "_local_max_data_window",
+        "_local_max_data_window_at",
         "_local_max_stream_data_bidi_local",
         "_local_max_stream_data_bidi_remote",
         "_local_max_stream_data_uni",
@@ -368,6 +392,10 @@ class QuicConnection:
         "_initial_source_connection_id",
         "_ech_retry_configs",
         "_effective_idle_timeout",
+        "_flow_control_on_consumption",
+        "_receive_window_budget",
+        "_builder",
+        "_probe_builder",
     )
 
     def __init__(
@@ -443,6 +471,11 @@ class QuicConnection:
             name="max_data",
             value=configuration.max_data,
         )
+        self._local_max_data_consumed = 0
+        self._local_max_data_window = configuration.max_data
+        self._local_max_data_window_at: float | None = None
+        self._flow_control_on_consumption = configuration.flow_control_on_consumption
+        self._receive_window_budget = configuration.receive_window_budget
         self._local_max_stream_data_bidi_local = configuration.max_stream_data
         self._local_max_stream_data_bidi_remote = configuration.max_stream_data
         self._local_max_stream_data_uni = configuration.max_stream_data
@@ -542,6 +575,10 @@ class QuicConnection:
         self._retire_connection_ids: list[int] = []
         self._streams_blocked_pending = False
 
+        # packet builders, reused across calls to datagrams_to_send
+        self._builder: QuicPacketBuilder | None = None
+        self._probe_builder: QuicPacketBuilder | None = None
+
         # callbacks
         self._session_ticket_fetcher = session_ticket_fetcher
         self._session_ticket_handler = session_ticket_handler
@@ -595,6 +632,18 @@ class QuicConnection:
     def max_concurrent_uni_streams(self) -> int:
         return self._remote_max_streams_uni
 
+    @property
+    def handshake_operation(self) -> Future | None:
+        """
+        The CertificateVerify signature or certificate verification the
+        handshake is waiting for, when
+        :attr:`~qh3.quic.configuration.QuicConfiguration.handshake_executor`
+        is set. Call :meth:`resume_handshake` once it is done.
+        """
+        if not hasattr(self, "tls"):
+            return None
+        return self.tls.pending_operation
+
     def get_cipher(self) -> tls.CipherSuite | None:
         return self.tls.key_schedule.cipher_suite if self.tls.key_schedule else None
 
@@ -728,19 +777,12 @@ class QuicConnection:
             return []
 
         # build datagrams
-        builder = QuicPacketBuilder(
-            host_cid=self.host_cid,
-            is_client=self._is_client,
-            max_datagram_size=self._max_datagram_size,
-            packet_numbers={
-                epoch: space.packet_number for epoch, space in self._spaces.items()
-            },
-            peer_cid=self._peer_cid.cid,
-            peer_token=self._peer_token,
-            quic_logger=self._quic_logger,
-            spin_bit=self._spin_bit,
-            version=self._version,
+        builder = self._builder = self._reset_packet_builder(
+            self._builder, self._max_datagram_size
         )
+        packet_numbers = builder.packet_numbers
+        for epoch, space in self._spaces.items():
+            packet_numbers[epoch] = space.packet_number
         if self._close_pending:
             epoch_packet_types = []
             if not self._handshake_confirmed:
@@ -803,17 +845,11 @@ class QuicConnection:
         ):
             probe_size = self._mtu_probe_sizes[0]
             self._mtu_probe_pending = probe_size
-            probe_builder = QuicPacketBuilder(
-                host_cid=self.host_cid,
-                is_client=self._is_client,
-                max_datagram_size=probe_size,
-                packet_numbers=dict(builder.packet_numbers),
-                peer_cid=self._peer_cid.cid,
-                peer_token=self._peer_token,
-                quic_logger=self._quic_logger,
-                spin_bit=self._spin_bit,
-                version=self._version,
+            # the probe is a single datagram
+            probe_builder = self._probe_builder = self._reset_packet_builder(
+                self._probe_builder, probe_size, max_datagrams=1
             )
+            probe_builder.packet_numbers.update(builder.packet_numbers)
             probe_builder.start_packet(
                 QuicPacketType.ONE_RTT, self._cryptos[tls.Epoch.ONE_RTT]
             )
@@ -1028,6 +1064,64 @@ class QuicConnection:
         :param addr: The network address from which the datagram was received.
         :param now: The current time.
         """
+        self._receive_datagram(data, addr, now, None)
+
+    def receive_datagrams(
+        self, datagrams: list[bytes], addr: NetworkAddress, now: float
+    ) -> None:
+        """
+        Handle a burst of datagrams received from the same address, such as
+        the segments of a GRO receive.
+
+        The 1-RTT packets of the burst are decrypted in a single call, the
+        datagrams are then handled in order as by :meth:`receive_datagram`.
+
+        :param datagrams: The datagrams which were received.
+        :param addr: The network address from which the datagrams were received.
+        :param now: The current time.
+        """
+        crypto = self._cryptos.get(tls.Epoch.ONE_RTT)
+        opened: list[tuple[bytes, bytes, int] | None] = [None] * len(datagrams)
+        if (
+            len(datagrams) > 1
+            and self._state not in END_STATES
+            and crypto is not None
+            and crypto.recv.is_valid()
+        ):
+            indices = [
+                i
+                for i, data in enumerate(datagrams)
+                if data and not data[0] & PACKET_LONG_HEADER
+            ]
+            if len(indices) > 1:
+                crypto.expire_previous_keys(now)
+                key_phase = crypto.recv.key_phase
+                for i, result in zip(
+                    indices,
+                    crypto.open_batch(
+                        [datagrams[i] for i in indices],
+                        1 + self._configuration.connection_id_length,
+                        self._spaces[tls.Epoch.ONE_RTT].expected_packet_number,
+                    ),
+                ):
+                    opened[i] = result
+                # if a key rotation just happened, schedule retention of
+                # the previous keys for 3*PTO (RFC 9001 6.5).
+                if crypto.recv.key_phase != key_phase:
+                    crypto.retain_previous_keys(
+                        now + 3 * self._loss.get_probe_timeout()
+                    )
+
+        for data, result in zip(datagrams, opened):
+            self._receive_datagram(data, addr, now, result)
+
+    def _receive_datagram(
+        self,
+        data: bytes,
+        addr: NetworkAddress,
+        now: float,
+        opened: tuple[bytes, bytes, int] | None,
+    ) -> None:
         # stop handling packets when closing
         if self._state in END_STATES:
             # RFC 9000 10.2.1: while in CLOSING, an endpoint SHOULD send
@@ -1208,26 +1302,31 @@ class QuicConnection:
             else:
                 space = self._spaces[epoch]
 
-            # decrypt packet
+            # decrypt packet, unless it was opened along with its burst
             try:
-                # remember key phase before decryption to detect rotation
-                _kp_before = (
-                    crypto.recv.key_phase
-                    if epoch in (tls.Epoch.ONE_RTT, tls.Epoch.ZERO_RTT)
-                    else None
-                )
-                # opportunistically expire previously retained recv keys
-                if _kp_before is not None:
-                    crypto.expire_previous_keys(now)
-                plain_header, plain_payload, packet_number = crypto.decrypt_packet(
-                    data[start_off:end_off], encrypted_off, space.expected_packet_number
-                )
-                # if a key rotation just happened, schedule retention of
-                # the previous keys for 3*PTO (RFC 9001 6.5).
-                if _kp_before is not None and crypto.recv.key_phase != _kp_before:
-                    crypto.retain_previous_keys(
-                        now + 3 * self._loss.get_probe_timeout()
+                if opened is not None and _packet_type == QuicPacketType.ONE_RTT:
+                    plain_header, plain_payload, packet_number = opened
+                else:
+                    # remember key phase before decryption to detect rotation
+                    _kp_before = (
+                        crypto.recv.key_phase
+                        if epoch in (tls.Epoch.ONE_RTT, tls.Epoch.ZERO_RTT)
+                        else None
                     )
+                    # opportunistically expire previously retained recv keys
+                    if _kp_before is not None:
+                        crypto.expire_previous_keys(now)
+                    plain_header, plain_payload, packet_number = crypto.decrypt_packet(
+                        data[start_off:end_off],
+                        encrypted_off,
+                        space.expected_packet_number,
+                    )
+                    # if a key rotation just happened, schedule retention of
+                    # the previous keys for 3*PTO (RFC 9001 6.5).
+                    if _kp_before is not None and crypto.recv.key_phase != _kp_before:
+                        crypto.retain_previous_keys(
+                            now + 3 * self._loss.get_probe_timeout()
+                        )
             except KeyUnavailableError as exc:
                 self._logger.debug(exc)
                 if quic_logger is not None:
@@ -1457,6 +1556,38 @@ class QuicConnection:
         stream = self._get_or_create_stream_for_send(stream_id)
         stream.sender.reset(error_code)
 
+    def resume_handshake(self) -> None:
+        """
+        Resume the handshake once :attr:`handshake_operation` is done.
+
+        After calling this method call :meth:`datagrams_to_send` to retrieve data
+        which needs to be sent.
+        """
+        if self._state in END_STATES or self.handshake_operation is None:
+            return
+
+        try:
+            self._handle_tls(
+                QuicFrameType.CRYPTO,
+                partial(self.tls.resume_handshake, self._crypto_buffers),
+            )
+        except QuicConnectionError as exc:
+            self._logger.debug(exc)
+            self.close(
+                error_code=exc.error_code,
+                frame_type=exc.frame_type,
+                reason_phrase=exc.reason_phrase,
+            )
+        except Exception as exc:
+            # this runs from an event loop callback, nothing above us
+            # would close the connection
+            self._logger.exception("Failed to resume the handshake")
+            self.close(
+                error_code=QuicErrorCode.INTERNAL_ERROR,
+                frame_type=QuicFrameType.CRYPTO,
+                reason_phrase=str(exc),
+            )
+
     def send_ping(self, uid: int) -> None:
         """
         Send a PING frame to the peer.
@@ -1474,18 +1605,50 @@ class QuicConnection:
         self._datagrams_pending.append(data)
 
     def send_stream_data(
-        self, stream_id: int, data: bytes, end_stream: bool = False
+        self,
+        stream_id: int,
+        data: bytes | bytearray | memoryview,
+        end_stream: bool = False,
     ) -> None:
         """
         Send data on the specific stream.
 
         :param stream_id: The stream's ID.
-        :param data: The data to be sent.
+        :param data: The data to be sent, any object supporting the buffer
+            protocol. It is copied, the caller may reuse it.
         :param end_stream: If set to `True`, the FIN bit will be set.
         """
         stream = self._get_or_create_stream_for_send(stream_id)
         stream.sender.write(data, end_stream=end_stream)
 
+    def stream_data_consumed(self, stream_id: int, amount: int) -> None:
+        """
+        Acknowledge that the application consumed data received on a stream.
+
+        When the configuration sets
+        :attr:`~qh3.quic.configuration.QuicConfiguration.flow_control_on_consumption`,
+        the flow control credit given to the peer only grows as data is
+        acknowledged this way. Otherwise this method has no effect.
+
+        :param stream_id: The stream's ID.
+        :param amount: The number of bytes consumed.
+        """
+        if amount < 0:
+            raise ValueError("Cannot consume a negative amount of data")
+        if not self._flow_control_on_consumption:
+            return
+
+        # the stream may be gone already, its data still counts against MAX_DATA
+        self._local_max_data_consumed = min(
+            self._local_max_data_consumed + amount, self._local_max_data.used
+        )
+        stream = self._streams.get(stream_id, None)
+        if stream is not None:
+            stream.consumed = min(
+                stream.consumed + amount, stream.receiver.highest_offset
+            )
+            self._streams_dirty_limits.add(stream)
+
     def stop_stream(self, stream_id: int, error_code: int) -> None:
         """
         Request termination of the receiving part of a stream.
@@ -1504,6 +1667,40 @@ class QuicConnection:
 
         stream.receiver.stop(error_code)
 
+    def set_stream_unordered(self, stream_id: int) -> None:
+        """
+        Deliver the data received on a stream as soon as it arrives, instead of
+        waiting for the data preceding it.
+
+        :class:`~qh3.quic.events.StreamDataReceived` events then carry the
+        `offset` of their data, which may arrive in any order, and
+        `end_stream` is set once all the data of the stream was received.
+        The data held waiting for the data preceding it is delivered right
+        away.
+
+        :param stream_id: The stream's ID.
+        """
+        if not check_stream_id_for_receiving(self._is_client, stream_id):
+            raise ValueError(
+                "Cannot receive on a local-initiated unidirectional stream"
+            )
+
+        if stream_is_client_initiated(stream_id) is self._is_client:
+            stream = self._get_or_create_stream_for_send(stream_id)
+        else:
+            stream = self._streams.get(stream_id, None)
+            if stream is None:
+                raise ValueError(
+                    "Cannot receive unordered on an unknown peer-initiated stream"
+                )
+
+        for data, offset in stream.receiver.set_unordered():
+            self._events.append(
+                events.StreamDataReceived(
+                    data=data, end_stream=False, stream_id=stream_id, offset=offset
+                )
+            )
+
     # Private
 
     def _alpn_handler(self, alpn_protocol: str) -> None:
@@ -1841,6 +2038,17 @@ class QuicConnection:
                 "PEM encoded values."
             )
         self.tls.certificate_private_key = self._configuration.private_key
+        self.tls.handshake_executor = self._configuration.handshake_executor
+        self.tls.key_share_pool = self._configuration.key_share_pool
+        self.tls.ocsp_cache = self._configuration.ocsp_cache
+        if self._is_client:
+            self.tls.key_share_group_cache = self._configuration.key_share_group_cache
+            self.tls.verified_chain_cache = self._configuration.verified_chain_cache
+        else:
+            self.tls.server_credentials = self._configuration.server_credentials()
+            self.tls.session_ticket_key_ring = (
+                self._configuration.session_ticket_key_ring
+            )
         self.tls.handshake_extensions = [
             (
                 tls.ExtensionType.QUIC_TRANSPORT_PARAMETERS,
@@ -2055,74 +2263,22 @@ class QuicConnection:
                 reason_phrase="too much crypto buffering",
             )
 
-        event = stream.receiver.handle_frame(offset, data)
-        if event is not None:
+        received = stream.receiver.handle_frame(offset, data)
+        if received is not None:
             # Pass data to TLS layer, which may cause calls to:
             # - _alpn_handler
             # - _update_traffic_key
             self._crypto_frame_type = frame_type
             self._crypto_packet_version = context.version
-            try:
-                self.tls.handle_message(
-                    event.data, self._crypto_buffers, epoch=context.epoch
-                )
-                self._push_crypto_data()
-            except tls.AlertECHRequired as exc:
-                # ECH was offered but rejected. Store retry_configs before
-                # propagating the error so the caller can retry.
-                self._ech_retry_configs = self.tls.ech_retry_configs
-                raise QuicConnectionError(
-                    error_code=QuicErrorCode.CRYPTO_ERROR + int(exc.description),
-                    frame_type=frame_type,
-                    reason_phrase=str(exc),
-                )
-            except tls.Alert as exc:
-                raise QuicConnectionError(
-                    error_code=QuicErrorCode.CRYPTO_ERROR + int(exc.description),
-                    frame_type=frame_type,
-                    reason_phrase=str(exc),
-                )
-
-            # update current epoch
-            if not self._handshake_complete and self.tls.state in [
-                tls.State.CLIENT_POST_HANDSHAKE,
-                tls.State.SERVER_POST_HANDSHAKE,
-            ]:
-                self._handshake_complete = True
-
-                # for servers, the handshake is now confirmed
-                if not self._is_client:
-                    # RFC 9001 4.9.2: defer Handshake key discard until we
-                    # have evidence the client received our Handshake keys.
-                    # We discard upon receiving any 1-RTT packet from the
-                    # client. This prevents losing client-retransmitted
-                    # Handshake CRYPTO that arrives after our handshake
-                    # completes (which would otherwise cause a client hang).
-                    self._handshake_keys_discard_pending = True
-                    self._handshake_confirmed = True
-                    self._handshake_done_pending = True
-                    # RFC 9002 6.2.1: max_ack_delay only applies after the
-                    # handshake is confirmed.
-                    self._loss.max_ack_delay = self._remote_max_ack_delay
-                    # RFC 9001 4.9.3: server discards 0-RTT receive keys
-                    # once the handshake is complete (no further 0-RTT
-                    # data can usefully arrive). We discard send keys too;
-                    # servers never send 0-RTT.
-                    self._discard_zero_rtt_keys()
-
-                self._replenish_connection_ids()
-                self._events.append(
-                    events.HandshakeCompleted(
-                        alpn_protocol=self.tls.alpn_negotiated,
-                        early_data_accepted=self.tls.early_data_accepted,
-                        session_resumed=self.tls.session_resumed,
-                    )
-                )
-                self._unblock_streams(is_unidirectional=False)
-                self._unblock_streams(is_unidirectional=True)
-                self._logger.debug(
-                    "ALPN negotiated protocol %s", self.tls.alpn_negotiated
-                )
+            self._handle_tls(
+                frame_type,
+                partial(
+                    self.tls.handle_message,
+                    received[0],
+                    self._crypto_buffers,
+                    epoch=context.epoch,
+                ),
+            )
         else:
             self._logger.debug(
                 "Duplicate CRYPTO data received for epoch %s", context.epoch
@@ -2138,6 +2294,68 @@ class QuicConnection:
                 self._loss.reschedule_data(now=context.time)
                 self._crypto_retransmitted = True
 
+    def _handle_tls(self, frame_type: int, operation: Callable[[], None]) -> None:
+        """
+        Run a TLS `operation` and report the handshake progress.
+        """
+        try:
+            operation()
+            self._push_crypto_data()
+        except tls.AlertECHRequired as exc:
+            # ECH was offered but rejected. Store retry_configs before
+            # propagating the error so the caller can retry.
+            self._ech_retry_configs = self.tls.ech_retry_configs
+            raise QuicConnectionError(
+                error_code=QuicErrorCode.CRYPTO_ERROR + int(exc.description),
+                frame_type=frame_type,
+                reason_phrase=str(exc),
+            )
+        except tls.Alert as exc:
+            raise QuicConnectionError(
+                error_code=QuicErrorCode.CRYPTO_ERROR + int(exc.description),
+                frame_type=frame_type,
+                reason_phrase=str(exc),
+            )
+
+        # update current epoch
+        if not self._handshake_complete and self.tls.state in [
+            tls.State.CLIENT_POST_HANDSHAKE,
+            tls.State.SERVER_POST_HANDSHAKE,
+        ]:
+            self._handshake_complete = True
+
+            # for servers, the handshake is now confirmed
+            if not self._is_client:
+                # RFC 9001 4.9.2: defer Handshake key discard until we
+                # have evidence the client received our Handshake keys.
+                # We discard upon receiving any 1-RTT packet from the
+                # client. This prevents losing client-retransmitted
+                # Handshake CRYPTO that arrives after our handshake
+                # completes (which would otherwise cause a client hang).
+                self._handshake_keys_discard_pending = True
+                self._handshake_confirmed = True
+                self._handshake_done_pending = True
+                # RFC 9002 6.2.1: max_ack_delay only applies after the
+                # handshake is confirmed.
+                self._loss.max_ack_delay = self._remote_max_ack_delay
+                # RFC 9001 4.9.3: server discards 0-RTT receive keys
+                # once the handshake is complete (no further 0-RTT
+                # data can usefully arrive). We discard send keys too;
+                # servers never send 0-RTT.
+                self._discard_zero_rtt_keys()
+
+            self._replenish_connection_ids()
+            self._events.append(
+                events.HandshakeCompleted(
+                    alpn_protocol=self.tls.alpn_negotiated,
+                    early_data_accepted=self.tls.early_data_accepted,
+                    session_resumed=self.tls.session_resumed,
+                )
+            )
+            self._unblock_streams(is_unidirectional=False)
+            self._unblock_streams(is_unidirectional=True)
+            self._logger.debug("ALPN negotiated protocol %s", self.tls.alpn_negotiated)
+
     def _handle_data_blocked_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -2156,7 +2374,13 @@ class QuicConnection:
         # limit is a hint that the peer would benefit from more credit.
         # Bump the local connection-level MAX_DATA so a fresh frame is
         # sent on the next write.
-        if limit >= self._local_max_data.value:
+        # When credit follows consumption, the peer has to wait for the
+        # application instead, and a tuned window is topped up anyway.
+        if (
+            not self._flow_control_on_consumption
+            and self._receive_window_budget is None
+            and limit >= self._local_max_data.value
+        ):
             self._local_max_data.value *= 2
             self._logger.debug(
                 "Local %s raised to %d in response to DATA_BLOCKED",
@@ -2575,21 +2799,25 @@ class QuicConnection:
             final_size,
         )
         try:
-            event = stream.receiver.handle_reset(
-                error_code=error_code, final_size=final_size
-            )
+            stream.receiver.handle_reset(final_size=final_size)
         except FinalSizeError as exc:
             raise QuicConnectionError(
                 error_code=QuicErrorCode.FINAL_SIZE_ERROR,
                 frame_type=frame_type,
                 reason_phrase=str(exc),
             )
-        if event is not None:
-            self._events.append(event)
+        self._events.append(
+            events.StreamReset(error_code=error_code, stream_id=stream_id)
+        )
         self._local_max_data.used += newly_received
         if newly_received > 0:
             self._streams_dirty_limits.add(stream)
 
+        # the data left unread will never reach the application
+        if self._flow_control_on_consumption and final_size > stream.consumed:
+            self._local_max_data_consumed += final_size - stream.consumed
+            stream.consumed = final_size
+
     def _handle_retire_connection_id_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -2709,15 +2937,22 @@ class QuicConnection:
 
         # process data
         try:
-            event = stream.receiver.handle_frame(offset, data, fin)
+            received = stream.receiver.handle_frame(offset, data, fin)
         except FinalSizeError as exc:
             raise QuicConnectionError(
                 error_code=QuicErrorCode.FINAL_SIZE_ERROR,
                 frame_type=frame_type,
                 reason_phrase=str(exc),
             )
-        if event is not None:
-            self._events.append(event)
+        if received is not None:
+            self._events.append(
+                events.StreamDataReceived(
+                    data=received[0],
+                    end_stream=received[1],
+                    stream_id=stream_id,
+                    offset=received[2],
+                )
+            )
         self._local_max_data.used += newly_received
         if newly_received > 0:
             self._streams_dirty_limits.add(stream)
@@ -2749,7 +2984,9 @@ class QuicConnection:
         # consider the stream live (not finished, not reset), grant more
         # credit and queue a MAX_STREAM_DATA on the next write.
         if (
-            not stream.receiver.is_finished
+            not self._flow_control_on_consumption
+            and self._receive_window_budget is None
+            and not stream.receiver.is_finished
             and stream.max_stream_data_local
             and limit >= stream.max_stream_data_local
         ):
@@ -3185,6 +3422,40 @@ class QuicConnection:
             self._crypto_streams[epoch].sender.write(buf.data)
             buf.seek(0)
 
+    def _reset_packet_builder(
+        self,
+        builder: QuicPacketBuilder | None,
+        max_datagram_size: int,
+        max_datagrams: int = SEAL_BATCH_DATAGRAMS,
+    ) -> QuicPacketBuilder:
+        """
+        Return `builder` ready for a new round of datagrams, creating it if
+        this is the first use.
+        """
+        if builder is None:
+            return QuicPacketBuilder(
+                host_cid=self.host_cid,
+                is_client=self._is_client,
+                max_datagram_size=max_datagram_size,
+                max_datagrams=max_datagrams,
+                peer_cid=self._peer_cid.cid,
+                peer_token=self._peer_token,
+                quic_logger=self._quic_logger,
+                spin_bit=self._spin_bit,
+                version=self._version,
+            )
+
+        builder.reset(
+            host_cid=self.host_cid,
+            peer_cid=self._peer_cid.cid,
+            version=self._version,
+            max_datagram_size=max_datagram_size,
+            max_datagrams=max_datagrams,
+            peer_token=self._peer_token,
+            spin_bit=self._spin_bit,
+        )
+        return builder
+
     def _send_probe(self) -> None:
         self._probe_pending = True
 
@@ -3552,6 +3823,65 @@ class QuicConnection:
             key = next(iter(self._local_challenges.keys()))
             del self._local_challenges[key]
 
+    def _update_local_max_data(self, now: float) -> None:
+        """
+        Keep a window of credit past the data consumed, or received, topping
+        it up once half of it is gone.
+        """
+        limit = self._local_max_data
+        if self._flow_control_on_consumption:
+            base = self._local_max_data_consumed
+        else:
+            base = limit.used
+        window = self._local_max_data_window
+        if (base + window - limit.value) * 2 <= window:
+            return
+
+        if self._receive_window_budget is not None:
+            if self._local_max_data_window_at is not None:
+                window = self._local_max_data_window = tune_receive_window(
+                    window,
+                    received=base + window - limit.value,
+                    elapsed=now - self._local_max_data_window_at,
+                    rtt=self._loss.smoothed_rtt,
+                    max_window=self._receive_window_budget,
+                )
+            self._local_max_data_window_at = now
+
+        limit.value = base + window
+        self._logger.debug("Local %s raised to %d", limit.name, limit.value)
+
+    def _update_local_max_stream_data(self, stream: QuicStream, now: float) -> None:
+        """
+        Keep a window of credit past the stream data consumed, or received,
+        topping it up once half of it is gone.
+        """
+        if self._flow_control_on_consumption:
+            base = stream.consumed
+        else:
+            base = stream.receiver.highest_offset
+        window = stream.receive_window
+        if (base + window - stream.max_stream_data_local) * 2 <= window:
+            return
+
+        if self._receive_window_budget is not None:
+            if stream.receive_window_at is not None:
+                window = stream.receive_window = tune_receive_window(
+                    window,
+                    received=base + window - stream.max_stream_data_local,
+                    elapsed=now - stream.receive_window_at,
+                    rtt=self._loss.smoothed_rtt,
+                    max_window=self._receive_window_budget,
+                )
+            stream.receive_window_at = now
+
+        stream.max_stream_data_local = base + window
+        self._logger.debug(
+            "Stream %d local max_stream_data raised to %d",
+            stream.stream_id,
+            stream.max_stream_data_local,
+        )
+
     def _write_application(
         self, builder: QuicPacketBuilder, network_path: QuicNetworkPath, now: float
     ) -> None:
@@ -3572,6 +3902,9 @@ class QuicConnection:
         pacer = self._loss._pacer
         streams_queue = self._streams_queue
         _quic_logger = self._quic_logger
+        windowed = (
+            self._flow_control_on_consumption or self._receive_window_budget is not None
+        )
 
         while True:
             # apply pacing, except if we have ACKs to send or a PTO probe
@@ -3651,12 +3984,15 @@ class QuicConnection:
                     self._streams_blocked_pending = False
 
                 # MAX_DATA and MAX_STREAMS
+                local_max_data = self._local_max_data
                 for limit in (
-                    self._local_max_data,
+                    local_max_data,
                     self._local_max_streams_bidi,
                     self._local_max_streams_uni,
                 ):
-                    if limit.used * 2 > limit.value:
+                    if limit is local_max_data and windowed:
+                        self._update_local_max_data(now)
+                    elif limit.used * 2 > limit.value:
                         limit.value *= 2
                         self._logger.debug(
                             "Local %s raised to %d", limit.name, limit.value
@@ -3689,7 +4025,9 @@ class QuicConnection:
                     # credit is meaningless and MUST NOT be sent.
                     if stream.receiver.is_finished:
                         continue
-                    if (
+                    if windowed:
+                        self._update_local_max_stream_data(stream, now)
+                    elif (
                         stream.max_stream_data_local
                         and stream.receiver.highest_offset * 2
                         > stream.max_stream_data_local
@@ -3753,20 +4091,12 @@ class QuicConnection:
                     self._datagrams_pending.appendleft(datagram_pending)
                     break
 
-            sent: list[QuicStream] = []
+            # stream housekeeping, collecting streams which have data to send
+            ready: list[QuicStream] = []
             write_idx = 0
             queue_len = len(streams_queue)
             read_idx = 0
 
-            # Cache builder internals as locals to avoid repeated attr lookups
-            _b_buffer = builder._buffer
-            _b_flight = builder._flight_capacity
-            _b_aead = builder._aead_tag_size
-            _b_start_frame = builder.start_frame
-            _remote_max_data = self._remote_max_data
-            _remote_data_remaining = _remote_max_data - self._remote_max_data_used
-            _push_stream_frame_body = push_stream_frame_body
-
             try:
                 while read_idx < queue_len:
                     stream = streams_queue[read_idx]
@@ -3788,72 +4118,58 @@ class QuicConnection:
                     if sender.reset_pending:
                         self._write_reset_stream_frame(builder=builder, stream=stream)
                     elif not stream.is_blocked and not sender.buffer_is_empty:
-                        # Compute flight space from cached locals
-                        flight_space = _b_flight - _b_buffer.tell() - _b_aead
-
-                        # Early exit: if no room for even the largest stream
-                        # frame header, no subsequent stream can write either.
-                        if flight_space < 20:
-                            streams_queue[write_idx] = stream
-                            write_idx += 1
-                            break
-
-                        # Inline stream frame write — compute max_offset
-                        max_offset = sender.highest_offset + _remote_data_remaining
-                        sdr = stream.max_stream_data_remote
-                        if sdr < max_offset:
-                            max_offset = sdr
-
-                        result = sender.prepare_stream_frame(flight_space, max_offset)
-
-                        if result is not None:
-                            (
-                                f_data,
-                                frame_type,
-                                f_offset,
-                                stop_offset,
-                                previous_send_highest,
-                                frame_overhead,
-                            ) = result
-                            stream_id = stream.stream_id
-
-                            _b_start_frame(
-                                frame_type,
-                                frame_overhead,
-                                sender.on_data_delivery,
-                                (f_offset, stop_offset),
-                            )
-                            _push_stream_frame_body(
-                                _b_buffer, stream_id, f_offset, f_data
-                            )
-
-                            if _quic_logger is not None:
-                                builder.quic_logger_frames.append(
-                                    _quic_logger.encode_stream_frame(
-                                        bool(frame_type & 1),
-                                        f_data,
-                                        f_offset,
-                                        stream_id=stream_id,
-                                    )
-                                )
-
-                            used = sender.highest_offset - previous_send_highest
-                            _remote_data_remaining -= used
-                            self._remote_max_data_used += used
-                            if used > 0:
-                                sent.append(stream)
-                                continue
+                        ready.append(stream)
 
                     streams_queue[write_idx] = stream
                     write_idx += 1
             finally:
-                # Compact: reshelved at [0:write_idx], unvisited at [read_idx:]
+                # Compact: kept at [0:write_idx], unvisited at [read_idx:]
                 while read_idx < queue_len:
                     streams_queue[write_idx] = streams_queue[read_idx]
                     write_idx += 1
                     read_idx += 1
                 del streams_queue[write_idx:]
-                streams_queue.extend(sent)
+
+            # STREAM frames, packed natively into the packet
+            if ready:
+                records, used = fill_stream_frames(
+                    builder._buffer,
+                    [stream.sender for stream in ready],
+                    [stream.max_stream_data_remote for stream in ready],
+                    builder._flight_capacity - builder._aead_tag_size,
+                    self._remote_max_data - self._remote_max_data_used,
+                )
+                if records:
+                    self._remote_max_data_used += used
+                    handlers: list[tuple[QuicDeliveryHandler, Sequence[Any]]] = []
+                    sent: list[QuicStream] = []
+                    for index, frame_type, f_offset, stop_offset, f_used in records:
+                        stream = ready[index]
+                        handlers.append(
+                            (stream.sender.on_data_delivery, (f_offset, stop_offset))
+                        )
+                        if f_used > 0:
+                            sent.append(stream)
+
+                        if _quic_logger is not None:
+                            builder.quic_logger_frames.append(
+                                _quic_logger.encode_stream_frame(
+                                    bool(frame_type & 1),
+                                    b"",
+                                    f_offset,
+                                    stream_id=stream.stream_id,
+                                    length=stop_offset - f_offset,
+                                )
+                            )
+                    builder.register_frames(handlers)
+
+                    # round-robin: streams which sent new data go last
+                    if sent:
+                        sent_set = set(sent)
+                        streams_queue[:] = [
+                            stream for stream in streams_queue if stream not in sent_set
+                        ]
+                        streams_queue.extend(sent)
 
             if builder.packet_is_empty:
                 break
@@ -4202,15 +4518,15 @@ class QuicConnection:
             capacity=STOP_SENDING_FRAME_CAPACITY,
             handler=stream.receiver.on_stop_sending_delivery,
         )
-        frame = stream.receiver.get_stop_frame()
-        buf.push_uint_var(frame.stream_id)
-        buf.push_uint_var(frame.error_code)
+        error_code, stream_id = stream.receiver.get_stop_frame()
+        buf.push_uint_var(stream_id)
+        buf.push_uint_var(error_code)
 
         # log frame
         if self._quic_logger is not None:
             builder.quic_logger_frames.append(
                 self._quic_logger.encode_stop_sending_frame(
-                    error_code=frame.error_code, stream_id=frame.stream_id
+                    error_code=error_code, stream_id=stream_id
                 )
             )
 
@@ -8,6 +8,7 @@ from .._hazmat import (
 )
 from .._hazmat import (
     CryptoError,
+    quic_derive_key_iv_hp,
 )
 from ..tls import CipherSuite, cipher_suite_hash, hkdf_expand_label, hkdf_extract
 from .packet import QuicProtocolVersion
@@ -47,18 +48,12 @@ def derive_key_iv_hp(
     else:
         key_size = 16
 
-    if version == QuicProtocolVersion.VERSION_2:
-        return (
-            hkdf_expand_label(algorithm, secret, b"quicv2 key", b"", key_size),
-            hkdf_expand_label(algorithm, secret, b"quicv2 iv", b"", 12),
-            hkdf_expand_label(algorithm, secret, b"quicv2 hp", b"", key_size),
-        )
-    else:
-        return (
-            hkdf_expand_label(algorithm, secret, b"quic key", b"", key_size),
-            hkdf_expand_label(algorithm, secret, b"quic iv", b"", 12),
-            hkdf_expand_label(algorithm, secret, b"quic hp", b"", key_size),
-        )
+    return quic_derive_key_iv_hp(
+        algorithm,
+        secret,
+        key_size,
+        b"quicv2" if version == QuicProtocolVersion.VERSION_2 else b"quic",
+    )
 
 
 class CryptoContext:
@@ -256,6 +251,48 @@ class CryptoPair:
             self._update_key("remote_update")
         return plain_header, payload, packet_number
 
+    def open_batch(
+        self, packets: list[bytes], encrypted_offset: int, expected_packet_number: int
+    ) -> list[tuple[bytes, bytes, int] | None]:
+        """
+        Decrypt a burst of short header packets, each spanning a whole datagram.
+
+        Packets which cannot be decrypted are reported as `None`. Key phases
+        are handled as in :meth:`decrypt_packet`.
+        """
+        if self.recv._inner is None:
+            raise KeyUnavailableError("Decryption key is not available")
+
+        results: list[tuple[bytes, bytes, int] | None] = []
+        while True:
+            previous = self._previous_recv
+            opened = self.recv._inner.open_batch(
+                packets[len(results) :] if results else packets,
+                encrypted_offset,
+                expected_packet_number,
+                previous._inner if previous is not None else None,
+            )
+            results.extend(opened)
+            for result in opened:
+                if result is not None and result[2] > expected_packet_number:
+                    expected_packet_number = result[2] + 1
+            if len(results) == len(packets):
+                return results
+
+            # the peer initiated a key update
+            try:
+                result = self.decrypt_packet(
+                    packets[len(results)], encrypted_offset, expected_packet_number
+                )
+            except CryptoError:
+                result = None
+            else:
+                if result[2] > expected_packet_number:
+                    expected_packet_number = result[2] + 1
+            results.append(result)
+            if len(results) == len(packets):
+                return results
+
     def encrypt_packet(
         self, plain_header: bytes, plain_payload: bytes, packet_number: int
     ) -> bytes:
@@ -278,8 +315,14 @@ class CryptoPair:
         peer_token: bytes,
         spin_bit: int,
         packet_number: int,
+        seal: bool = True,
     ) -> int:
-        """Finalize a packet: write header, pad, encrypt, apply HP in one call."""
+        """
+        Finalize a packet: write header, pad, encrypt, apply HP in one call.
+
+        With `seal=False` only the header and padding are written, the packet
+        must later be passed to :meth:`seal_batch`.
+        """
         if self._update_key_requested:
             self._update_key("local_update")
         return self.send._inner.finalize_packet(
@@ -296,8 +339,18 @@ class CryptoPair:
             peer_token,
             spin_bit,
             packet_number,
+            seal,
         )
 
+    def seal_batch(self, buffer, packets: list[tuple[int, int, int, int]]) -> None:
+        """
+        Encrypt and apply header protection to packets laid out by
+        :meth:`finalize_packet` with `seal=False`.
+
+        Each entry is `(packet_start, header_size, payload_size, packet_number)`.
+        """
+        self.send._inner.seal_batch(buffer, packets)
+
     def setup_initial(self, cid: bytes, is_client: bool, version: int) -> None:
         if is_client:
             recv_label, send_label = b"server in", b"client in"
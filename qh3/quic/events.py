@@ -99,6 +99,13 @@ class StreamDataReceived(QuicEvent):
     stream_id: int
     "The ID of the stream the data was received for."
 
+    offset: int = 0
+    """
+    The offset of the data in the stream. Unless the stream delivers data
+    unordered, see :meth:`~qh3.quic.connection.QuicConnection.set_stream_unordered`,
+    it always follows the data of the previous event.
+    """
+
 
 @dataclass
 class StopSendingReceived(QuicEvent):
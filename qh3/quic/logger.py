@@ -177,12 +177,17 @@ class QuicLoggerTrace:
         }
 
     def encode_stream_frame(
-        self, fin: bool, data: bytes, offset: int, stream_id: int
+        self,
+        fin: bool,
+        data: bytes,
+        offset: int,
+        stream_id: int,
+        length: int | None = None,
     ) -> dict:
         return {
             "fin": fin,
             "frame_type": "stream",
-            "length": len(data),
+            "length": len(data) if length is None else length,
             "offset": offset,
             "stream_id": stream_id,
         }
@@ -38,6 +38,10 @@ MTU_PROBE_SIZES = [1350, 1452]
 PACKET_LENGTH_SEND_SIZE = 2
 PACKET_NUMBER_SEND_SIZE = 2
 
+# Number of datagrams laid out back to back in the builder's buffer before
+# their 1-RTT packets are sealed with a single call to `seal_batch`.
+SEAL_BATCH_DATAGRAMS = 16
+
 
 QuicDeliveryHandler = Callable[..., None]
 
@@ -125,6 +129,8 @@ class QuicPacketBuilder:
         "_datagram_flight_bytes",
         "_datagram_init",
         "_datagram_needs_padding",
+        "_datagram_spans",
+        "_datagram_start",
         "_packets",
         "_flight_bytes",
         "_total_bytes",
@@ -139,6 +145,9 @@ class QuicPacketBuilder:
         "_buffer_capacity",
         "_flight_capacity",
         "_aead_tag_size",
+        "_max_datagram_size",
+        "_unsealed",
+        "_unsealed_crypto",
     )
 
     def __init__(
@@ -149,21 +158,67 @@ class QuicPacketBuilder:
         version: int,
         is_client: bool,
         max_datagram_size: int = PACKET_MAX_SIZE,
+        max_datagrams: int = SEAL_BATCH_DATAGRAMS,
         packet_number: int = 0,
         packet_numbers: dict[Epoch, int] | None = None,
         peer_token: bytes = b"",
         quic_logger: QuicLoggerTrace | None = None,
         spin_bit: bool = False,
     ):
+        self._is_client = is_client
+        self._quic_logger = quic_logger
+        self._buffer = Buffer(max_datagram_size * max_datagrams)
+
+        # per-space packet numbers (RFC 9000 §12.3)
+        if packet_numbers is not None:
+            self._packet_numbers = dict(packet_numbers)
+        else:
+            self._packet_numbers = {
+                Epoch.INITIAL: packet_number,
+                Epoch.HANDSHAKE: packet_number,
+                Epoch.ONE_RTT: packet_number,
+            }
+
+        self.reset(
+            host_cid=host_cid,
+            peer_cid=peer_cid,
+            version=version,
+            max_datagram_size=max_datagram_size,
+            max_datagrams=max_datagrams,
+            peer_token=peer_token,
+            spin_bit=spin_bit,
+        )
+
+    def reset(
+        self,
+        *,
+        host_cid: bytes,
+        peer_cid: bytes,
+        version: int,
+        max_datagram_size: int,
+        max_datagrams: int = SEAL_BATCH_DATAGRAMS,
+        peer_token: bytes = b"",
+        spin_bit: bool = False,
+    ) -> None:
+        """
+        Prepare the builder for a new round of datagrams.
+
+        The write buffer is kept as long as the datagram size does not
+        change, so a connection can hold on to a single builder instead of
+        allocating one on every call to `datagrams_to_send`. Per-space
+        packet numbers are left untouched, update them through
+        :attr:`packet_numbers`.
+
+        `max_datagrams` is how many datagrams are laid out in the buffer
+        before their 1-RTT packets are sealed together.
+        """
         self.max_flight_bytes: int | None = None
         self.max_total_bytes: int | None = None
         self.quic_logger_frames: list[dict] | None = None
 
         self._host_cid = host_cid
-        self._is_client = is_client
         self._peer_cid = peer_cid
         self._peer_token = peer_token
-        self._quic_logger = quic_logger
         self._spin_bit = spin_bit
         self._version = version
 
@@ -172,6 +227,8 @@ class QuicPacketBuilder:
         self._datagram_flight_bytes = 0
         self._datagram_init = True
         self._datagram_needs_padding = False
+        self._datagram_spans: list[tuple[int, int]] = []
+        self._datagram_start = 0
         self._packets: list[QuicSentPacket] = []
         self._flight_bytes = 0
         self._total_bytes = 0
@@ -184,17 +241,17 @@ class QuicPacketBuilder:
         self._packet_start = 0
         self._packet_type: QuicPacketType | None = None
 
-        # per-space packet numbers (RFC 9000 §12.3)
-        if packet_numbers is not None:
-            self._packet_numbers = dict(packet_numbers)
-        else:
-            self._packet_numbers = {
-                Epoch.INITIAL: packet_number,
-                Epoch.HANDSHAKE: packet_number,
-                Epoch.ONE_RTT: packet_number,
-            }
+        # 1-RTT packets awaiting encryption
+        self._unsealed: list[tuple[int, int, int, int]] = []
+        self._unsealed_crypto: CryptoPair | None = None
 
-        self._buffer = Buffer(max_datagram_size)
+        # capacities are absolute positions in the buffer
+        buffer_size = max_datagram_size * max_datagrams
+        if self._buffer.capacity != buffer_size:
+            self._buffer = Buffer(buffer_size)
+        else:
+            self._buffer.seek(0)
+        self._max_datagram_size = max_datagram_size
         self._buffer_capacity = max_datagram_size
         self._flight_capacity = max_datagram_size
 
@@ -254,6 +311,7 @@ class QuicPacketBuilder:
         if self._packet is not None:
             self._end_packet()
         self._flush_current_datagram()
+        self._seal_datagrams()
 
         datagrams = self._datagrams
         packets = self._packets
@@ -295,6 +353,22 @@ class QuicPacketBuilder:
                 dh.append((handler, handler_args))
         return self._buffer
 
+    def register_frames(
+        self, handlers: list[tuple[QuicDeliveryHandler, Sequence[Any]]]
+    ) -> None:
+        """
+        Account for ack-eliciting, in-flight frames which were written
+        directly into the buffer, bypassing :meth:`start_frame`.
+        """
+        packet = self._packet
+        packet.is_ack_eliciting = True
+        packet.in_flight = True
+        dh = packet.delivery_handlers
+        if dh is None:
+            packet.delivery_handlers = handlers
+        else:
+            dh.extend(handlers)
+
     def start_packet(self, packet_type: QuicPacketType, crypto: CryptoPair) -> None:
         """
         Starts a new packet.
@@ -315,20 +389,24 @@ class QuicPacketBuilder:
         packet_start = buf.tell()
         if self._buffer_capacity - packet_start < 128:
             self._flush_current_datagram()
-            packet_start = 0
+            packet_start = self._datagram_start
 
         # initialize datagram if needed
         if self._datagram_init:
+            buffer_capacity = self._max_datagram_size
             if self.max_total_bytes is not None:
                 remaining_total_bytes = self.max_total_bytes - self._total_bytes
-                if remaining_total_bytes < self._buffer_capacity:
-                    self._buffer_capacity = remaining_total_bytes
+                if remaining_total_bytes < buffer_capacity:
+                    buffer_capacity = remaining_total_bytes
 
-            self._flight_capacity = self._buffer_capacity
+            flight_capacity = buffer_capacity
             if self.max_flight_bytes is not None:
                 remaining_flight_bytes = self.max_flight_bytes - self._flight_bytes
-                if remaining_flight_bytes < self._flight_capacity:
-                    self._flight_capacity = remaining_flight_bytes
+                if remaining_flight_bytes < flight_capacity:
+                    flight_capacity = remaining_flight_bytes
+
+            self._buffer_capacity = self._datagram_start + buffer_capacity
+            self._flight_capacity = self._datagram_start + flight_capacity
             self._datagram_flight_bytes = 0
             self._datagram_init = False
             self._datagram_needs_padding = False
@@ -419,8 +497,13 @@ class QuicPacketBuilder:
             else:
                 padding_size = 0
 
-            # Write header, pad, encrypt, apply header protection
-            self._packet.sent_bytes = self._packet_crypto.finalize_packet(
+            # Write header and pad. Long header packets are encrypted and
+            # protected right away, 1-RTT packets are sealed in batches.
+            crypto = self._packet_crypto
+            seal = self._packet_type != QuicPacketType.ONE_RTT
+            if not seal and self._unsealed and crypto is not self._unsealed_crypto:
+                self._seal_packets()
+            self._packet.sent_bytes = crypto.finalize_packet(
                 buf,
                 self._packet_start,
                 packet_size,
@@ -434,7 +517,18 @@ class QuicPacketBuilder:
                 self._peer_token,
                 self._spin_bit,
                 self._packet.packet_number,
+                seal,
             )
+            if not seal:
+                self._unsealed.append(
+                    (
+                        self._packet_start,
+                        self._header_size,
+                        packet_size + padding_size - self._header_size,
+                        self._packet.packet_number,
+                    )
+                )
+                self._unsealed_crypto = crypto
 
             self._packets.append(self._packet)
             if self._packet.in_flight:
@@ -453,19 +547,46 @@ class QuicPacketBuilder:
         self.quic_logger_frames = None
 
     def _flush_current_datagram(self) -> None:
-        datagram_bytes = self._buffer.tell()
+        buf = self._buffer
+        datagram_end = buf.tell()
+        datagram_bytes = datagram_end - self._datagram_start
         if datagram_bytes:
             # Padding for datagrams containing initial packets; see RFC 9000
             # section 14.1.
             if self._datagram_needs_padding:
-                extra_bytes = self._flight_capacity - self._buffer.tell()
+                extra_bytes = self._flight_capacity - datagram_end
                 if extra_bytes > 0:
-                    self._buffer.push_bytes(bytes(extra_bytes))
+                    buf.push_bytes(bytes(extra_bytes))
                     self._datagram_flight_bytes += extra_bytes
                     datagram_bytes += extra_bytes
+                    datagram_end += extra_bytes
 
-            self._datagrams.append(self._buffer.data)
+            self._datagram_spans.append((self._datagram_start, datagram_end))
             self._flight_bytes += self._datagram_flight_bytes
             self._total_bytes += datagram_bytes
             self._datagram_init = True
-            self._buffer.seek(0)
+
+            # the next datagram must fit in the buffer
+            if buf.capacity - datagram_end < self._max_datagram_size:
+                self._seal_datagrams()
+            else:
+                self._datagram_start = datagram_end
+
+    def _seal_datagrams(self) -> None:
+        """
+        Seal pending 1-RTT packets and hand out the datagrams laid out
+        in the buffer, which is then rewound.
+        """
+        self._seal_packets()
+        data_slice = self._buffer.data_slice
+        for start, end in self._datagram_spans:
+            self._datagrams.append(data_slice(start, end))
+        self._datagram_spans.clear()
+        self._datagram_start = 0
+        self._buffer.seek(0)
+
+    def _seal_packets(self) -> None:
+        if self._unsealed:
+            self._unsealed_crypto.seal_batch(self._buffer, self._unsealed)
+            self._unsealed = []
+            self._unsealed_crypto = None
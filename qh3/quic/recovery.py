@@ -406,6 +406,13 @@ class QuicPacketRecovery:
     def congestion_window(self) -> int:
         return self._cc.congestion_window
 
+    @property
+    def smoothed_rtt(self) -> float:
+        """
+        The smoothed RTT, or the initial RTT until one is measured.
+        """
+        return self._rtt_smoothed if self._rtt_initialized else self._rtt_initial
+
     def discard_space(self, space: QuicPacketSpace) -> None:
         assert space in self.spaces
 
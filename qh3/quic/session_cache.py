@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import binascii
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from typing import Any, Optional, Tuple
+
+from ..tls import CipherSuite, SessionTicket
+from .configuration import QuicConfiguration
+
+SessionCacheKey = Tuple[Optional[str], int, Tuple[str, ...], str]
+
+
+def _verification_digest(configuration: QuicConfiguration) -> str:
+    """
+    Digest of the settings deciding whether a server is trusted, and of
+    the client certificate. Resuming a session skips certificate
+    verification, so tickets must not be shared across these.
+    """
+    h = hashlib.sha256()
+    for value in (
+        configuration.verify_mode,
+        configuration.verify_hostname,
+        configuration.hostname_checks_common_name,
+        configuration.assert_fingerprint,
+        configuration.cafile,
+        configuration.capath,
+    ):
+        h.update(repr(value).encode() + b"\x00")
+    for data in (
+        configuration.cadata,
+        (
+            configuration.certificate.public_bytes()
+            if configuration.certificate is not None
+            else None
+        ),
+    ):
+        h.update(hashlib.sha256(data).digest() if data is not None else b"-")
+    return h.hexdigest()
+
+
+def _cache_key(configuration: QuicConfiguration, port: int) -> SessionCacheKey:
+    return (
+        configuration.server_name,
+        port,
+        tuple(configuration.alpn_protocols or ()),
+        _verification_digest(configuration),
+    )
+
+
+def _encode_ticket(ticket: SessionTicket) -> dict[str, Any]:
+    return {
+        "age_add": ticket.age_add,
+        "cipher_suite": int(ticket.cipher_suite),
+        "not_valid_after": ticket.not_valid_after.isoformat(),
+        "not_valid_before": ticket.not_valid_before.isoformat(),
+        "resumption_secret": binascii.hexlify(ticket.resumption_secret).decode(),
+        "server_name": ticket.server_name,
+        "ticket": binascii.hexlify(ticket.ticket).decode(),
+        "max_early_data_size": ticket.max_early_data_size,
+        "other_extensions": [
+            [extension_type, binascii.hexlify(extension_value).decode()]
+            for extension_type, extension_value in ticket.other_extensions
+        ],
+        "alpn_protocol": ticket.alpn_protocol,
+    }
+
+
+def _decode_ticket(data: dict[str, Any]) -> SessionTicket:
+    return SessionTicket(
+        age_add=data["age_add"],
+        cipher_suite=CipherSuite(data["cipher_suite"]),
+        not_valid_after=datetime.datetime.fromisoformat(data["not_valid_after"]),
+        not_valid_before=datetime.datetime.fromisoformat(data["not_valid_before"]),
+        resumption_secret=binascii.unhexlify(data["resumption_secret"]),
+        server_name=data["server_name"],
+        ticket=binascii.unhexlify(data["ticket"]),
+        max_early_data_size=data["max_early_data_size"],
+        other_extensions=[
+            (extension_type, binascii.unhexlify(extension_value))
+            for extension_type, extension_value in data["other_extensions"]
+        ],
+        alpn_protocol=data["alpn_protocol"],
+    )
+
+
+class SessionCache:
+    """
+    A bounded client cache of session tickets.
+
+    Tickets are keyed by server name, port and offered ALPN protocols, and
+    by the certificate verification settings and client certificate of
+    the configuration: a session established with a laxer configuration is
+    never resumed by a stricter one. Each ticket is handed out once
+    (RFC 8446 Appendix C.4).
+
+    :param max_entries: how many origins are remembered, the least recently
+        used ones are evicted first.
+    :param max_tickets: how many tickets are kept per origin.
+    :param path: when set, the cache is loaded from this file and written
+        back to it from a background thread whenever it changes. The file
+        holds resumption secrets and is created readable by its owner only.
+    :param early_data: whether connections resuming from a cached ticket
+        may send 0-RTT data. 0-RTT data can be replayed by an attacker, so
+        this is off unless asked for.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_tickets: int = 4,
+        path: str | PathLike | None = None,
+        early_data: bool = False,
+    ) -> None:
+        self._early_data = early_data
+        self._entries: OrderedDict[SessionCacheKey, list[SessionTicket]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._max_tickets = max_tickets
+        self._path = path
+        self._save_executor: ThreadPoolExecutor | None = None
+        self._save_pending = False
+
+        if path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(
+        self, configuration: QuicConfiguration, port: int, ticket: SessionTicket
+    ) -> None:
+        """
+        Remember a session ticket received by a connection using
+        `configuration` to the given port.
+        """
+        key = _cache_key(configuration, port)
+        with self._lock:
+            tickets = self._entries.setdefault(key, [])
+            tickets.append(ticket)
+            del tickets[: -self._max_tickets]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+            self._schedule_save()
+
+    def get(self, configuration: QuicConfiguration, port: int) -> SessionTicket | None:
+        """
+        Take the most recent valid session ticket to resume a connection
+        using `configuration` to the given port, or return `None`.
+        """
+        key = _cache_key(configuration, port)
+        with self._lock:
+            tickets = self._entries.get(key)
+            while tickets:
+                ticket = tickets.pop()
+                if ticket.is_valid:
+                    if tickets:
+                        self._entries.move_to_end(key)
+                    else:
+                        del self._entries[key]
+                    self._schedule_save()
+                    if not self._early_data:
+                        ticket = dataclasses.replace(ticket, max_early_data_size=None)
+                    return ticket
+            self._entries.pop(key, None)
+            return None
+
+    def clear(self) -> None:
+        """
+        Forget all session tickets.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+
+    def flush(self) -> None:
+        """
+        Wait until the changes made so far are written to `path`.
+        """
+        with self._lock:
+            executor = self._save_executor
+        if executor is not None:
+            executor.submit(lambda: None).result()
+
+    def _load(self) -> None:
+        try:
+            with open(self._path, encoding="utf-8") as fp:
+                entries = json.load(fp)["entries"]
+            for entry in entries:
+                key = (
+                    entry["server_name"],
+                    entry["port"],
+                    tuple(entry["alpn"]),
+                    entry["verification"],
+                )
+                tickets = [_decode_ticket(ticket) for ticket in entry["tickets"]]
+                self._entries[key] = [t for t in tickets if t.is_valid][
+                    -self._max_tickets :
+                ]
+        except (OSError, ValueError, KeyError, TypeError):
+            # a missing or unreadable cache is an empty cache
+            self._entries.clear()
+
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _schedule_save(self) -> None:
+        # called with the lock held, writes are coalesced and done off the
+        # caller's thread, which is usually running an event loop
+        if self._path is None or self._save_pending:
+            return
+        if self._save_executor is None:
+            self._save_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="qh3-session-cache"
+            )
+        self._save_pending = True
+        self._save_executor.submit(self._save)
+
+    def _save(self) -> None:
+        with self._lock:
+            self._save_pending = False
+            data = json.dumps(
+                {
+                    "entries": [
+                        {
+                            "server_name": server_name,
+                            "port": port,
+                            "alpn": list(alpn_protocols),
+                            "verification": verification,
+                            "tickets": [
+                                _encode_ticket(t) for t in tickets if t.is_valid
+                            ],
+                        }
+                        for (
+                            server_name,
+                            port,
+                            alpn_protocols,
+                            verification,
+                        ), tickets in self._entries.items()
+                    ]
+                }
+            )
+
+        # write to a private temporary file, then swap it in
+        path = os.fspath(self._path)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or None,
+            prefix=f"{os.path.basename(path)}.",
+            suffix=".tmp",
+        )
+        try:
+            with open(fd, "w", encoding="utf-8") as fp:
+                fp.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
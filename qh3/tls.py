@@ -4,21 +4,41 @@ import datetime
 import glob
 import hashlib
 import logging
+import mmap
 import os
 import re
 import ssl
 import struct
+import tempfile
+import threading
+import time
+import urllib.request
+import weakref
+import zlib
 from binascii import unhexlify
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import IntEnum
 from functools import partial
 from hmac import HMAC
-from typing import Any, Callable, Generator, Optional, Sequence, Tuple, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from ._hazmat import (
+    AeadAes256Gcm,
     Buffer,
     BufferReadError,
+    CertificateRevocationList,
     CryptoError,
     DsaPrivateKey,
     ECDHP256KeyExchange,
@@ -30,7 +50,11 @@ from ._hazmat import (
     HpkeContext,
     InvalidNameCertificateError,
     KeyType,
+    OCSPRequest,
+    OCSPResponse,
+    OCSPResponseStatus,
     PrivateKeyInfo,
+    ReasonFlags,
     RsaPrivateKey,
     SelfSignedCertificateError,
     ServerVerifier,
@@ -46,6 +70,42 @@ from ._hazmat import (
 from ._hazmat import (
     Certificate as X509Certificate,
 )
+from ._hazmat import (
+    KeySchedule as NativeKeySchedule,
+)
+from ._hazmat import (
+    hkdf_expand_label as _hkdf_expand_label,
+)
+from ._hazmat import (
+    hkdf_extract as _hkdf_extract,
+)
+from ._hazmat import (
+    pull_client_hello as _pull_client_hello,
+)
+from ._hazmat import (
+    push_certificate as _push_certificate,
+)
+from ._hazmat import (
+    push_encrypted_extensions as _push_encrypted_extensions,
+)
+from ._hazmat import (
+    push_server_hello as _push_server_hello,
+)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:  # pragma: no cover
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+logger = logging.getLogger("quic")
 
 _HASHED_CERT_FILENAME_RE = re.compile(r"^[0-9a-fA-F]{8}\.[0-9]$")
 
@@ -54,6 +114,11 @@ TLS_VERSION_1_3 = 0x0304
 
 ECH_VERSION = 0xFE0D
 
+# ServerHello.random of a HelloRetryRequest (RFC 8446 4.1.3)
+HELLO_RETRY_REQUEST_RANDOM = unhexlify(
+    "cf21ad74e59a6111be1d8c021e65b891c2a211167abb8c5e079e09e2c8a8339c"
+)
+
 
 def _generate_grease_value() -> int:
     """Generate a random GREASE value of the form 0xNaNa (RFC 8701).
@@ -273,17 +338,11 @@ def hkdf_expand_label(
     hash_value: bytes,
     length: int,
 ) -> bytes:
-    return HKDFExpand(
-        algorithm=algorithm,
-        length=length,
-        info=hkdf_label(label, hash_value, length),
-    ).derive(secret)
+    return _hkdf_expand_label(algorithm, secret, label, hash_value, length)
 
 
 def hkdf_extract(algorithm: int, salt: bytes, key_material: bytes) -> bytes:
-    h = HMAC(salt, digestmod=f"sha{algorithm}")
-    h.update(key_material)
-    return h.digest()
+    return _hkdf_extract(algorithm, salt, key_material)
 
 
 def load_pem_private_key(
@@ -360,6 +419,383 @@ def _capath_contains_certs(capath: str) -> bool:
     return False
 
 
+@dataclass
+class _TrustStore:
+    """
+    A loaded and classified CA store, along with the verifier built
+    from its trust anchors.
+    """
+
+    stamp: tuple
+    trust_anchors: list[bytes]
+    intermediaries: list[bytes]
+    others: list[bytes]
+    verifier: ServerVerifier | None = None
+    key: tuple = ()
+
+
+# Process-wide LRU cache of loaded CA stores, keyed by
+# (cadata digest, cafile, capath).
+_TRUST_STORE_CACHE: OrderedDict[
+    tuple[bytes | None, str | None, str | None], _TrustStore
+] = OrderedDict()
+_TRUST_STORE_CACHE_SIZE = 16
+_TRUST_STORE_LOCK = threading.Lock()
+
+
+def _trust_store_stamp(cafile: str | None, capath: str | None) -> tuple:
+    """
+    Snapshot the modification times of the files backing a CA store,
+    so that a cached store is reloaded when they change.
+
+    For a capath only the directory itself is looked at: adding, removing
+    or renaming a certificate (as c_rehash and update-ca-certificates do)
+    changes its mtime, and this costs one syscall per handshake however
+    many certificates it holds.
+    """
+    stamp: list = []
+    for path in (cafile, capath):
+        if path:
+            try:
+                st = os.stat(path)
+            except OSError:
+                stamp.append(None)
+            else:
+                stamp.append((st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+def _load_trust_store(
+    cadata: bytes | None, cafile: str | None, capath: str | None
+) -> _TrustStore:
+    """
+    Return the classified CA store for the given locations, loading it
+    only if it is not cached or its files changed since it was loaded.
+    """
+    key = (
+        hashlib.sha256(cadata).digest() if cadata is not None else None,
+        cafile,
+        capath,
+    )
+    stamp = _trust_store_stamp(cafile, capath)
+
+    with _TRUST_STORE_LOCK:
+        store = _TRUST_STORE_CACHE.get(key)
+        if store is not None and store.stamp == stamp:
+            _TRUST_STORE_CACHE.move_to_end(key)
+            return store
+
+    store = _TrustStore(
+        stamp,
+        *_load_store_and_sort(cadata=cadata, cafile=cafile, capath=capath),
+        key=key,
+    )
+    with _TRUST_STORE_LOCK:
+        _TRUST_STORE_CACHE[key] = store
+        _TRUST_STORE_CACHE.move_to_end(key)
+        while len(_TRUST_STORE_CACHE) > _TRUST_STORE_CACHE_SIZE:
+            _TRUST_STORE_CACHE.popitem(last=False)
+    return store
+
+
+def clear_trust_store_cache() -> None:
+    """
+    Forget every cached CA store, e.g. after the system store was updated.
+    """
+    with _TRUST_STORE_LOCK:
+        _TRUST_STORE_CACHE.clear()
+
+
+class VerifiedChainCache:
+    """
+    Certificate chains which passed path validation, so that handshakes
+    with a server seen recently skip rebuilding and validating its chain.
+    The CertificateVerify signature is still checked on every handshake.
+
+    An entry is bound to the CA store, the certificates, the server name and
+    the stapled OCSP response. It expires with the first certificate of the
+    chain to expire, or after `ttl` seconds.
+
+    It can be shared by all the client configurations of a process.
+
+    :param max_entries: how many chains are remembered, the least recently
+        used is forgotten first.
+    :param ttl: how long, in seconds, a chain is trusted without being
+        validated again.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0) -> None:
+        self._entries: OrderedDict[tuple, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._ttl = ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> bool:
+        """
+        Return whether the chain identified by `key` was validated and has
+        not expired since.
+        """
+        with self._lock:
+            verified_until = self._entries.get(key)
+            if verified_until is None:
+                return False
+            if verified_until <= time.time():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, key: tuple, certificates: list[X509Certificate]) -> None:
+        """
+        Remember that the chain identified by `key`, made of `certificates`,
+        was validated.
+        """
+        verified_until = min(
+            [time.time() + self._ttl]
+            + [certificate.not_valid_after for certificate in certificates]
+        )
+        with self._lock:
+            self._entries[key] = verified_until
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Forget every chain, e.g. after a certificate was revoked.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def _fetch_ocsp_response(url: str, request: bytes) -> bytes:
+    http_request = urllib.request.Request(
+        url,
+        data=request,
+        headers={"Content-Type": "application/ocsp-request"},
+    )
+    with urllib.request.urlopen(http_request, timeout=10) as response:
+        return response.read()
+
+
+class OcspCache:
+    """
+    OCSP responses keyed by the issuer's public key and the certificate
+    serial number, kept until their nextUpdate.
+
+    Servers staple the cached response for their certificate when a
+    ClientHello asks for it, see :meth:`staple`, so handshakes never block
+    on a responder.
+
+    It can be shared by all the configurations of a process.
+
+    :param max_entries: how many responses are kept, the least recently used
+        is forgotten first.
+    :param refresh_margin: how long, in seconds, before its nextUpdate a
+        stapled response is fetched again.
+    :param fetch: a callable posting a DER encoded OCSP request to the given
+        responder URL and returning the DER encoded response. It defaults to
+        an HTTP POST using :mod:`urllib`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        refresh_margin: float = 3600.0,
+        fetch: Callable[[str, bytes], bytes] | None = None,
+    ) -> None:
+        self._closed = False
+        self._entries: OrderedDict[tuple[bytes, str], tuple[bytes, int]] = OrderedDict()
+        self._fetch = fetch if fetch is not None else _fetch_ocsp_response
+        self._fetch_executor: ThreadPoolExecutor | None = None
+        self._fetch_pending: set[tuple[bytes, str]] = set()
+        self._fetch_retry_at: dict[tuple[bytes, str], float] = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._refresh_margin = refresh_margin
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, certificate: X509Certificate, issuer: X509Certificate
+    ) -> bytes | None:
+        """
+        Return the DER encoded OCSP response for `certificate`, issued by
+        `issuer`, or `None` if none is cached or it expired.
+        """
+        key = _ocsp_cache_key(certificate, issuer)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def add(
+        self, certificate: X509Certificate, issuer: X509Certificate, response: bytes
+    ) -> None:
+        """
+        Remember the DER encoded OCSP `response` for `certificate`, issued by
+        `issuer`.
+
+        :raises ValueError: if the response is malformed, unsuccessful, not
+            signed on behalf of `issuer` or expired.
+        """
+        ocsp_response = OCSPResponse(response)
+        if ocsp_response.response_status != OCSPResponseStatus.SUCCESSFUL:
+            raise ValueError("OCSP response is not successful")
+        if not ocsp_response.authenticate_for(issuer.public_bytes()):
+            raise ValueError("OCSP response is not signed on behalf of the issuer")
+        if ocsp_response.next_update <= time.time():
+            raise ValueError("OCSP response expired")
+
+        key = _ocsp_cache_key(certificate, issuer)
+        with self._lock:
+            self._entries[key] = (response, ocsp_response.next_update)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def staple(
+        self, certificate: X509Certificate, issuer: X509Certificate
+    ) -> bytes | None:
+        """
+        Return the OCSP response to staple for `certificate`, issued by
+        `issuer`, or `None` if none is cached yet.
+
+        A response is fetched in the background when none is cached or the
+        cached one expires within `refresh_margin`.
+        """
+        key = _ocsp_cache_key(certificate, issuer)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if (
+                (entry is None or entry[1] - self._refresh_margin <= now)
+                and not self._closed
+                and key not in self._fetch_pending
+                and self._fetch_retry_at.get(key, 0.0) <= now
+            ):
+                self._fetch_pending.add(key)
+                if self._fetch_executor is None:
+                    self._fetch_executor = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="qh3-ocsp"
+                    )
+                self._fetch_executor.submit(self._refresh, key, certificate, issuer)
+
+        return self.get(certificate, issuer)
+
+    def clear(self) -> None:
+        """
+        Forget every response.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._fetch_retry_at.clear()
+
+    def close(self) -> None:
+        """
+        Stop the background thread fetching responses, the cached responses
+        are still stapled but no longer refreshed.
+        """
+        with self._lock:
+            self._closed = True
+            executor = self._fetch_executor
+            self._fetch_executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _refresh(
+        self,
+        key: tuple[bytes, str],
+        certificate: X509Certificate,
+        issuer: X509Certificate,
+    ) -> None:
+        try:
+            request = OCSPRequest(
+                certificate.public_bytes(), issuer.public_bytes()
+            ).public_bytes()
+            for endpoint in certificate.get_ocsp_endpoints():
+                # endpoints are formatted as "URI(http://...)"
+                url = endpoint.decode()
+                if url.startswith("URI(") and url.endswith(")"):
+                    url = url[4:-1]
+                try:
+                    self.add(certificate, issuer, self._fetch(url, request))
+                    break
+                except Exception as exc:
+                    logger.warning("OCSP fetch from %s failed: %r", url, exc)
+            else:
+                # do not hammer a failing responder, try again later
+                with self._lock:
+                    self._fetch_retry_at[key] = time.time() + 60.0
+        finally:
+            with self._lock:
+                self._fetch_pending.discard(key)
+
+
+def _ocsp_cache_key(
+    certificate: X509Certificate, issuer: X509Certificate
+) -> tuple[bytes, str]:
+    return (hashlib.sha256(issuer.public_key()).digest(), certificate.serial_number)
+
+
+class KeyShareGroupCache:
+    """
+    The key exchange group each server selected, keyed by server name.
+    ClientHellos to a known server only carry a key share for that group,
+    a HelloRetryRequest recovers should the server's preference change.
+
+    It can be shared by all the client configurations of a process.
+
+    :param max_entries: how many servers are remembered, the least recently
+        used is forgotten first.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, server_name: str) -> int | None:
+        """
+        Return the group `server_name` selected last, if known.
+        """
+        with self._lock:
+            group = self._entries.get(server_name)
+            if group is not None:
+                self._entries.move_to_end(server_name)
+            return group
+
+    def add(self, server_name: str, group: int) -> None:
+        """
+        Remember that `server_name` selected `group`.
+        """
+        with self._lock:
+            self._entries[server_name] = group
+            self._entries.move_to_end(server_name)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Forget every server, so that the next ClientHellos carry a key share
+        for each supported group again.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
 def load_store_and_sort(
     cadata: bytes | None = None,
     cafile: str | None = None,
@@ -372,7 +808,23 @@ def load_store_and_sort(
         - Intermediates (CAs signed by another CA)
         - Others        (self-issued but flagged with TLS-purpose EKU;
                          excluded from trust anchors)
+
+    Results are cached per process and reloaded when cafile or the
+    content of capath change.
     """
+    store = _load_trust_store(cadata, cafile, capath)
+    return (
+        list(store.trust_anchors),
+        list(store.intermediaries),
+        list(store.others),
+    )
+
+
+def _load_store_and_sort(
+    cadata: bytes | None = None,
+    cafile: str | None = None,
+    capath: str | None = None,
+) -> tuple[list[bytes], list[bytes], list[bytes]]:
     raw_ders: list[bytes] = []
 
     if cadata is not None:
@@ -404,15 +856,28 @@ def verify_certificate(
     server_name: str | None = None,
     assert_server_name: bool = True,
     ocsp_response: bytes | None = None,
+    verified_chain_cache: VerifiedChainCache | None = None,
 ) -> None:
     if chain is None:
         chain = []
 
-    trust_anchors, intermediaries, _ = load_store_and_sort(
-        cadata=cadata,
-        cafile=cafile,
-        capath=capath,
-    )
+    trust_store = _load_trust_store(cadata, cafile, capath)
+    trust_anchors = trust_store.trust_anchors
+
+    cache_key: tuple | None = None
+    if verified_chain_cache is not None:
+        cache_key = (
+            trust_store.key,
+            trust_store.stamp,
+            hashlib.sha256(certificate.public_bytes()).digest(),
+            tuple(hashlib.sha256(c.public_bytes()).digest() for c in chain),
+            server_name,
+            assert_server_name,
+            hashlib.sha256(ocsp_response).digest() if ocsp_response else None,
+        )
+        if verified_chain_cache.get(cache_key):
+            return
+    intermediaries = trust_store.intermediaries
 
     if server_name is None or assert_server_name is False:
         # get_subject_alt_names()... caution for :
@@ -462,11 +927,13 @@ def verify_certificate(
         else:
             chain = []
 
-    # load CAs
-    try:
-        store = ServerVerifier(trust_anchors)
-    except CryptoError as e:
-        raise AlertBadCertificate("unable to create the verifier x509 store") from e
+    # load CAs, the verifier is built once per cached store
+    store = trust_store.verifier
+    if store is None:
+        try:
+            store = trust_store.verifier = ServerVerifier(trust_anchors)
+        except CryptoError as e:
+            raise AlertBadCertificate("unable to create the verifier x509 store") from e
 
     try:
         store.verify(
@@ -481,9 +948,204 @@ def verify_certificate(
         ExpiredCertificateError,
         UnacceptableCertificateError,
     ) as exc:
-        if isinstance(exc, InvalidNameCertificateError) and assert_server_name is False:
-            return
-        raise AlertBadCertificate(exc.args[0])
+        if (
+            not isinstance(exc, InvalidNameCertificateError)
+            or assert_server_name is not False
+        ):
+            raise AlertBadCertificate(exc.args[0])
+
+    if verified_chain_cache is not None:
+        verified_chain_cache.add(cache_key, [certificate] + chain)
+
+
+# Layout of the index files of a RevocationListStore, big endian: a header
+# (magic, issuer digest, nextUpdate, revoked count, slot count, serial width)
+# then an open addressing hash table of (length, serial number, reason) slots.
+_CRL_INDEX_MAGIC = b"qh3crl\x00\x01"
+_CRL_INDEX_HEADER = struct.Struct(">8s32sqIII")
+
+_REASON_FLAGS = {
+    int(reason): reason
+    for reason in (
+        ReasonFlags.unspecified,
+        ReasonFlags.key_compromise,
+        ReasonFlags.ca_compromise,
+        ReasonFlags.affiliation_changed,
+        ReasonFlags.superseded,
+        ReasonFlags.cessation_of_operation,
+        ReasonFlags.certificate_hold,
+        ReasonFlags.remove_from_crl,
+        ReasonFlags.privilege_withdrawn,
+        ReasonFlags.aa_compromise,
+    )
+}
+
+
+def _write_crl_index(path: str, crl: CertificateRevocationList) -> None:
+    revoked = crl.revoked_certificates()
+    width = max((len(entry.raw_serial_number) for entry in revoked), default=1)
+    slots = 1
+    while slots < 2 * len(revoked):
+        slots <<= 1
+    slot = struct.Struct(f">B{width}sB")
+
+    table = bytearray(slots * slot.size)
+    for entry in revoked:
+        serial_number = entry.raw_serial_number
+        position = zlib.crc32(serial_number) & (slots - 1)
+        while table[position * slot.size]:
+            position = (position + 1) & (slots - 1)
+        slot.pack_into(
+            table,
+            position * slot.size,
+            len(serial_number),
+            serial_number,
+            int(entry.reason),
+        )
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(
+                _CRL_INDEX_HEADER.pack(
+                    _CRL_INDEX_MAGIC,
+                    hashlib.sha256(crl.issuer.encode()).digest(),
+                    crl.next_update_at,
+                    len(revoked),
+                    slots,
+                    width,
+                )
+            )
+            fp.write(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class RevocationListIndex:
+    """
+    The serial numbers revoked by a CRL, memory-mapped from an index file
+    written by :class:`RevocationListStore`.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            self.issuer_digest,
+            self.next_update_at,
+            self._count,
+            slots,
+            width,
+        ) = _CRL_INDEX_HEADER.unpack_from(self._map)
+        if magic != _CRL_INDEX_MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a CRL index")
+        self._mask = slots - 1
+        self._slot = struct.Struct(f">B{width}sB")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def is_revoked(self, serial_number: bytes) -> ReasonFlags | None:
+        """
+        Return the revocation reason of the certificate with the given raw
+        serial number, or `None` if it is not revoked.
+        """
+        position = zlib.crc32(serial_number) & self._mask
+        while True:
+            length, candidate, reason = self._slot.unpack_from(
+                self._map, _CRL_INDEX_HEADER.size + position * self._slot.size
+            )
+            if not length:
+                return None
+            if candidate[:length] == serial_number:
+                return _REASON_FLAGS.get(reason, ReasonFlags.unspecified)
+            position = (position + 1) & self._mask
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class RevocationListStore:
+    """
+    Certificate revocation lists indexed once and persisted to a directory,
+    which every process of the host memory-maps instead of parsing the CRLs
+    again. A lookup hashes the raw serial number and probes a slot or two,
+    however many certificates the CRL revokes.
+
+    Indexes are keyed by issuer and nextUpdate. CRLs must be authenticated,
+    see :meth:`CertificateRevocationList.authenticate_for`, before they are
+    added.
+
+    :param path: the directory holding the indexes, created if needed.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self._path = os.fspath(path)
+        os.makedirs(self._path, exist_ok=True)
+        self._indexes: dict[bytes, RevocationListIndex] = {}
+        self._lock = threading.Lock()
+        self._stamp: int | None = None
+
+    def add(self, crl: CertificateRevocationList) -> None:
+        """
+        Index `crl`, replacing the indexes of older CRLs of the same issuer.
+        """
+        digest = hashlib.sha256(crl.issuer.encode()).digest()
+        path = os.path.join(self._path, f"{digest.hex()}-{crl.next_update_at}.crlidx")
+        if not os.path.exists(path):
+            _write_crl_index(path, crl)
+        with self._lock:
+            self._indexes.pop(digest, None)
+
+        # processes which mapped an older index keep reading it until they
+        # notice the directory changed
+        for other_path, next_update_at in self._index_paths(digest.hex()):
+            if next_update_at < crl.next_update_at:
+                try:
+                    os.unlink(other_path)
+                except OSError:
+                    pass
+
+    def get(self, issuer: str) -> RevocationListIndex | None:
+        """
+        Return the index of the most recent CRL of `issuer`, or `None` if
+        there is none or it is past its nextUpdate.
+        """
+        digest = hashlib.sha256(issuer.encode()).digest()
+        stamp = os.stat(self._path).st_mtime_ns
+
+        with self._lock:
+            if stamp != self._stamp:
+                self._indexes.clear()
+                self._stamp = stamp
+            index = self._indexes.get(digest)
+            if index is None:
+                paths = sorted(self._index_paths(digest.hex()), key=lambda x: x[1])
+                if not paths:
+                    return None
+                index = self._indexes[digest] = RevocationListIndex(paths[-1][0])
+
+        if index.next_update_at <= time.time():
+            with self._lock:
+                self._indexes.pop(digest, None)
+            return None
+        return index
+
+    def _index_paths(self, digest: str) -> list[tuple[str, int]]:
+        paths = []
+        for path in glob.glob(
+            os.path.join(glob.escape(self._path), f"{digest}-*.crlidx")
+        ):
+            try:
+                next_update_at = int(path[:-7].rsplit("-", 1)[1])
+            except ValueError:
+                continue
+            paths.append((path, next_update_at))
+        return paths
 
 
 class CipherSuite(IntEnum):
@@ -518,6 +1180,12 @@ class ExtensionType(IntEnum):
     GREASE = 0x0A0A
 
 
+class CertificateCompressionAlgorithm(IntEnum):
+    ZLIB = 1
+    BROTLI = 2
+    ZSTD = 3
+
+
 class Group(IntEnum):
     SECP256R1 = 0x0017
     SECP384R1 = 0x0018
@@ -896,6 +1564,9 @@ class ClientHello:
     supported_groups: list[int] | None = None
     supported_versions: list[int] | None = None
 
+    # Whether an OCSP response is requested, clients always send it.
+    status_request: bool = False
+
     other_extensions: list[Extension] = field(default_factory=list)
 
     # Per-connection GREASE extension types (RFC 8701).
@@ -907,67 +1578,51 @@ class ClientHello:
 
 
 def pull_client_hello(buf: Buffer) -> ClientHello:
-    assert buf.pull_uint8() == HandshakeType.CLIENT_HELLO
-    with pull_block(buf, 3):
-        assert buf.pull_uint16() == TLS_VERSION_1_2
-
-        hello = ClientHello(
-            random=buf.pull_bytes(32),
-            legacy_session_id=pull_opaque(buf, 1),
-            cipher_suites=pull_list(buf, 2, buf.pull_uint16),
-            legacy_compression_methods=pull_list(buf, 1, buf.pull_uint8),
-        )
-
-        # extensions
-        after_psk = False
-
-        def pull_extension() -> None:
-            # pre_shared_key MUST be last
-            nonlocal after_psk
-            assert not after_psk
-
-            extension_type = buf.pull_uint16()
-            extension_length = buf.pull_uint16()
-            if extension_type == ExtensionType.KEY_SHARE:
-                hello.key_share = pull_list(buf, 2, partial(pull_key_share, buf))
-            elif extension_type == ExtensionType.SUPPORTED_VERSIONS:
-                hello.supported_versions = pull_list(buf, 1, buf.pull_uint16)
-            elif extension_type == ExtensionType.SIGNATURE_ALGORITHMS:
-                hello.signature_algorithms = pull_list(buf, 2, buf.pull_uint16)
-            elif extension_type == ExtensionType.SUPPORTED_GROUPS:
-                hello.supported_groups = pull_list(buf, 2, buf.pull_uint16)
-            elif extension_type == ExtensionType.PSK_KEY_EXCHANGE_MODES:
-                hello.psk_key_exchange_modes = pull_list(buf, 1, buf.pull_uint8)
-            elif extension_type == ExtensionType.SERVER_NAME:
-                with pull_block(buf, 2):
-                    assert buf.pull_uint8() == 0
-                    hello.server_name = pull_opaque(buf, 2).decode("ascii")
-            elif extension_type == ExtensionType.ALPN:
-                hello.alpn_protocols = pull_list(
-                    buf, 2, partial(pull_alpn_protocol, buf)
-                )
-            elif extension_type == ExtensionType.EARLY_DATA:
-                hello.early_data = True
-            elif extension_type == ExtensionType.PRE_SHARED_KEY:
-                hello.pre_shared_key = OfferedPsks(
-                    identities=pull_list(buf, 2, partial(pull_psk_identity, buf)),
-                    binders=pull_list(buf, 2, partial(pull_psk_binder, buf)),
-                )
-                after_psk = True
-            elif extension_type == ExtensionType.STATUS_REQUEST:
-                buf.pull_bytes(
-                    extension_length
-                )  # we don't implement it for the server...
-            elif _is_grease_value(extension_type):
-                buf.pull_bytes(extension_length)  # skip GREASE extensions
-            else:
-                hello.other_extensions.append(
-                    (extension_type, buf.pull_bytes(extension_length))
-                )
-
-        pull_list(buf, 2, pull_extension)
-
-    return hello
+    (
+        random,
+        legacy_session_id,
+        cipher_suites,
+        legacy_compression_methods,
+        (
+            alpn_protocols,
+            early_data,
+            key_share,
+            pre_shared_key,
+            psk_key_exchange_modes,
+            server_name,
+            signature_algorithms,
+            supported_groups,
+            supported_versions,
+            status_request,
+            other_extensions,
+        ),
+    ) = _pull_client_hello(buf)
+
+    return ClientHello(
+        random=random,
+        legacy_session_id=legacy_session_id,
+        cipher_suites=cipher_suites,
+        legacy_compression_methods=legacy_compression_methods,
+        alpn_protocols=(
+            [protocol.decode("ascii") for protocol in alpn_protocols]
+            if alpn_protocols is not None
+            else None
+        ),
+        early_data=early_data,
+        key_share=key_share,
+        pre_shared_key=(
+            OfferedPsks(identities=pre_shared_key[0], binders=pre_shared_key[1])
+            if pre_shared_key is not None
+            else None
+        ),
+        psk_key_exchange_modes=psk_key_exchange_modes,
+        server_name=server_name.decode("ascii") if server_name is not None else None,
+        signature_algorithms=signature_algorithms,
+        supported_groups=supported_groups,
+        supported_versions=supported_versions,
+        status_request=status_request,
+        other_extensions=other_extensions,
+    )
 
 
 def push_client_hello(buf: Buffer, hello: ClientHello) -> None:
@@ -1051,6 +1706,24 @@ def push_client_hello(buf: Buffer, hello: ClientHello) -> None:
                     )
 
 
+def _retried_client_hello(hello: ClientHello) -> ClientHello:
+    """
+    Return `hello` without the fields a client updates when retrying after a
+    HelloRetryRequest (RFC 8446 4.1.2).
+    """
+    return replace(
+        hello,
+        early_data=False,
+        key_share=None,
+        pre_shared_key=None,
+        other_extensions=[
+            extension
+            for extension in hello.other_extensions
+            if extension[0] != ExtensionType.COOKIE
+        ],
+    )
+
+
 @dataclass
 class ServerHello:
     random: bytes
@@ -1084,7 +1757,11 @@ def pull_server_hello(buf: Buffer) -> ServerHello:
             if extension_type == ExtensionType.SUPPORTED_VERSIONS:
                 hello.supported_version = buf.pull_uint16()
             elif extension_type == ExtensionType.KEY_SHARE:
-                hello.key_share = pull_key_share(buf)
+                if hello.random == HELLO_RETRY_REQUEST_RANDOM:
+                    # HelloRetryRequest only carries the selected group
+                    hello.key_share = (buf.pull_uint16(), b"")
+                else:
+                    hello.key_share = pull_key_share(buf)
             elif extension_type == ExtensionType.PRE_SHARED_KEY:
                 hello.pre_shared_key = buf.pull_uint16()
             else:
@@ -1098,32 +1775,17 @@ def pull_server_hello(buf: Buffer) -> ServerHello:
 
 
 def push_server_hello(buf: Buffer, hello: ServerHello) -> None:
-    buf.push_uint8(HandshakeType.SERVER_HELLO)
-    with push_block(buf, 3):
-        buf.push_uint16(TLS_VERSION_1_2)
-        buf.push_bytes(hello.random)
-
-        push_opaque(buf, 1, hello.legacy_session_id)
-        buf.push_uint16(hello.cipher_suite)
-        buf.push_uint8(hello.compression_method)
-
-        # extensions
-        with push_block(buf, 2):
-            if hello.supported_version is not None:
-                with push_extension(buf, ExtensionType.SUPPORTED_VERSIONS):
-                    buf.push_uint16(hello.supported_version)
-
-            if hello.key_share is not None:
-                with push_extension(buf, ExtensionType.KEY_SHARE):
-                    push_key_share(buf, hello.key_share)
-
-            if hello.pre_shared_key is not None:
-                with push_extension(buf, ExtensionType.PRE_SHARED_KEY):
-                    buf.push_uint16(hello.pre_shared_key)
-
-            for extension_type, extension_value in hello.other_extensions:
-                with push_extension(buf, extension_type):
-                    buf.push_bytes(extension_value)
+    _push_server_hello(
+        buf,
+        hello.random,
+        hello.legacy_session_id,
+        hello.cipher_suite,
+        hello.compression_method,
+        hello.key_share,
+        hello.pre_shared_key,
+        hello.supported_version,
+        hello.other_extensions,
+    )
 
 
 @dataclass
@@ -1219,25 +1881,16 @@ def pull_encrypted_extensions(buf: Buffer) -> EncryptedExtensions:
 
 
 def push_encrypted_extensions(buf: Buffer, extensions: EncryptedExtensions) -> None:
-    buf.push_uint8(HandshakeType.ENCRYPTED_EXTENSIONS)
-    with push_block(buf, 3):
-        with push_block(buf, 2):
-            if extensions.alpn_protocol is not None:
-                with push_extension(buf, ExtensionType.ALPN):
-                    push_list(
-                        buf,
-                        2,
-                        partial(push_alpn_protocol, buf),
-                        [extensions.alpn_protocol],
-                    )
-
-            if extensions.early_data:
-                with push_extension(buf, ExtensionType.EARLY_DATA):
-                    pass
-
-            for extension_type, extension_value in extensions.other_extensions:
-                with push_extension(buf, extension_type):
-                    buf.push_bytes(extension_value)
+    _push_encrypted_extensions(
+        buf,
+        (
+            extensions.alpn_protocol.encode("ascii")
+            if extensions.alpn_protocol is not None
+            else None
+        ),
+        extensions.early_data,
+        extensions.other_extensions,
+    )
 
 
 CertificateEntry = Tuple[bytes, bytes]
@@ -1300,17 +1953,7 @@ def pull_certificate_request(buf: Buffer) -> CertificateRequest:
 
 
 def push_certificate(buf: Buffer, certificate: Certificate) -> None:
-    buf.push_uint8(HandshakeType.CERTIFICATE)
-    with push_block(buf, 3):
-        push_opaque(buf, 1, certificate.request_context)
-
-        def push_certificate_entry(buf: Buffer, entry: CertificateEntry) -> None:
-            push_opaque(buf, 3, entry[0])
-            push_opaque(buf, 2, entry[1])
-
-        push_list(
-            buf, 3, partial(push_certificate_entry, buf), certificate.certificates
-        )
+    _push_certificate(buf, certificate.request_context, certificate.certificates)
 
 
 @dataclass
@@ -1335,6 +1978,158 @@ def push_certificate_verify(buf: Buffer, verify: CertificateVerify) -> None:
         push_opaque(buf, 2, verify.signature)
 
 
+@dataclass
+class CompressedCertificate:
+    algorithm: int
+    uncompressed_length: int
+    compressed_certificate_message: bytes
+
+
+def pull_compressed_certificate(buf: Buffer) -> CompressedCertificate:
+    assert buf.pull_uint8() == HandshakeType.COMPRESSED_CERTIFICATE
+    with pull_block(buf, 3):
+        algorithm = buf.pull_uint16()
+        uncompressed_length = buf.pull_uint24()
+        compressed_certificate_message = pull_opaque(buf, 3)
+
+    return CompressedCertificate(
+        algorithm=algorithm,
+        uncompressed_length=uncompressed_length,
+        compressed_certificate_message=compressed_certificate_message,
+    )
+
+
+def push_compressed_certificate(
+    buf: Buffer, certificate: CompressedCertificate
+) -> None:
+    buf.push_uint8(HandshakeType.COMPRESSED_CERTIFICATE)
+    with push_block(buf, 3):
+        buf.push_uint16(certificate.algorithm)
+        buf.push_bytes(certificate.uncompressed_length.to_bytes(3, byteorder="big"))
+        push_opaque(buf, 3, certificate.compressed_certificate_message)
+
+
+# The decompressors stop once they produced one byte more than the announced
+# length, a few bytes must not expand to gigabytes before the length check.
+
+
+def _zlib_decompress(data: bytes, length: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    return decompressor.decompress(data, length + 1)
+
+
+def _brotli_decompress(data: bytes, length: int) -> bytes:  # pragma: no cover
+    decompressor = brotli.Decompressor()
+    return decompressor.process(data, output_buffer_limit=length + 1)
+
+
+def _brotli_has_output_limit() -> bool:  # pragma: no cover
+    """
+    Whether the brotli module can bound its output, which it can from 1.2.0.
+    """
+    try:
+        brotli.Decompressor().process(b"", output_buffer_limit=1)
+    except TypeError:
+        return False
+    except Exception:
+        pass
+    return True
+
+
+def _zstd_decompress(data: bytes, length: int) -> bytes:  # pragma: no cover
+    decompressor = zstd.ZstdDecompressor()
+    if not hasattr(decompressor, "stream_reader"):
+        # compression.zstd
+        return decompressor.decompress(data, max_length=length + 1)
+
+    # zstandard
+    chunks = []
+    remaining = length + 1
+    with decompressor.stream_reader(data) as reader:
+        while remaining > 0:
+            chunk = reader.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+CERTIFICATE_COMPRESSORS: dict[int, Callable[[bytes], bytes]] = {
+    CertificateCompressionAlgorithm.ZLIB: partial(zlib.compress, level=9),
+}
+CERTIFICATE_DECOMPRESSORS: dict[int, Callable[[bytes, int], bytes]] = {
+    CertificateCompressionAlgorithm.ZLIB: _zlib_decompress,
+}
+if brotli is not None and _brotli_has_output_limit():  # pragma: no cover
+    CERTIFICATE_COMPRESSORS[CertificateCompressionAlgorithm.BROTLI] = partial(
+        brotli.compress, quality=11
+    )
+    CERTIFICATE_DECOMPRESSORS[CertificateCompressionAlgorithm.BROTLI] = (
+        _brotli_decompress
+    )
+if zstd is not None:  # pragma: no cover
+    CERTIFICATE_COMPRESSORS[CertificateCompressionAlgorithm.ZSTD] = partial(
+        zstd.compress, level=19
+    )
+    CERTIFICATE_DECOMPRESSORS[CertificateCompressionAlgorithm.ZSTD] = _zstd_decompress
+
+# Available certificate compression algorithms, most efficient first.
+CERTIFICATE_COMPRESSION_ALGORITHMS: list[int] = [
+    algorithm
+    for algorithm in (
+        CertificateCompressionAlgorithm.BROTLI,
+        CertificateCompressionAlgorithm.ZSTD,
+        CertificateCompressionAlgorithm.ZLIB,
+    )
+    if algorithm in CERTIFICATE_COMPRESSORS
+]
+
+
+def compress_certificate_message(certificate_message: bytes, algorithm: int) -> bytes:
+    """
+    Return the CompressedCertificate message (RFC 8879) carrying the given
+    Certificate message.
+    """
+    body = certificate_message[4:]
+    compressed = CERTIFICATE_COMPRESSORS[algorithm](body)
+    buf = Buffer(capacity=12 + len(compressed))
+    push_compressed_certificate(
+        buf,
+        CompressedCertificate(
+            algorithm=algorithm,
+            uncompressed_length=len(body),
+            compressed_certificate_message=compressed,
+        ),
+    )
+    return buf.data
+
+
+def decompress_certificate(certificate: CompressedCertificate) -> Certificate:
+    """
+    Return the Certificate message carried by a CompressedCertificate.
+    """
+    try:
+        body = CERTIFICATE_DECOMPRESSORS[certificate.algorithm](
+            certificate.compressed_certificate_message,
+            certificate.uncompressed_length,
+        )
+    except Exception as exc:
+        raise AlertBadCertificate("Unable to decompress certificate") from exc
+    if len(body) != certificate.uncompressed_length:
+        raise AlertBadCertificate("Certificate length mismatch")
+
+    buf = Buffer(
+        data=bytes([HandshakeType.CERTIFICATE])
+        + len(body).to_bytes(3, byteorder="big")
+        + body
+    )
+    try:
+        return pull_certificate(buf)
+    except (AssertionError, BufferReadError) as exc:
+        raise AlertBadCertificate("Malformed compressed certificate") from exc
+
+
 @dataclass
 class Finished:
     verify_data: bytes = b""
@@ -1354,61 +2149,77 @@ def push_finished(buf: Buffer, finished: Finished) -> None:
     push_opaque(buf, 3, finished.verify_data)
 
 
+class _TranscriptHash:
+    """
+    Read-only snapshot of the transcript hash, exposing the subset of the
+    hashlib API that callers of :attr:`KeySchedule.hash` relied upon.
+    """
+
+    def __init__(self, algorithm: int, value: bytes):
+        self.name = f"sha{algorithm}"
+        self.digest_size = len(value)
+        self._value = value
+
+    def copy(self) -> _TranscriptHash:
+        return self
+
+    def digest(self) -> bytes:
+        return self._value
+
+    def hexdigest(self) -> str:
+        return self._value.hex()
+
+
 class KeySchedule:
     def __init__(self, cipher_suite: CipherSuite):
         self.algorithm = cipher_suite_hash(cipher_suite)
         self.digest_size = int(self.algorithm / 8)
         self.cipher_suite = cipher_suite
-        self.generation = 0
-        self.hash = hashlib.new(f"sha{self.algorithm}")
-        self.hash_empty_value = self.hash.copy().digest()
-        self.secret = bytes(self.digest_size)
+        self._inner = NativeKeySchedule(self.algorithm)
+
+    @property
+    def generation(self) -> int:
+        return self._inner.generation
+
+    @property
+    def hash(self) -> _TranscriptHash:
+        """
+        The current transcript hash. It is a snapshot and cannot be updated,
+        use :meth:`update_hash` instead.
+        """
+        return _TranscriptHash(self.algorithm, self._inner.transcript())
+
+    @property
+    def hash_empty_value(self) -> bytes:
+        return hashlib.new(f"sha{self.algorithm}").digest()
+
+    @property
+    def secret(self) -> bytes:
+        return self._inner.secret
 
     def certificate_verify_data(self, context_string: bytes) -> bytes:
-        return b" " * 64 + context_string + b"\x00" + self.hash.copy().digest()
+        return self._inner.certificate_verify_data(context_string)
 
     def finished_verify_data(self, secret: bytes) -> bytes:
-        hmac_key = hkdf_expand_label(
-            algorithm=self.algorithm,
-            secret=secret,
-            label=b"finished",
-            hash_value=b"",
-            length=self.digest_size,
-        )
-
-        h = HMAC(hmac_key, digestmod=f"sha{self.algorithm}")
-        h.update(self.hash.copy().digest())
-        return h.digest()
+        return self._inner.finished_verify_data(secret)
 
     def derive_secret(self, label: bytes) -> bytes:
-        return hkdf_expand_label(
-            algorithm=self.algorithm,
-            secret=self.secret,
-            label=label,
-            hash_value=self.hash.copy().digest(),
-            length=self.digest_size,
-        )
+        return self._inner.derive_secret(label)
 
     def extract(self, key_material: bytes | None = None) -> None:
-        if key_material is None:
-            key_material = bytes(self.digest_size)
-
-        if self.generation:
-            self.secret = hkdf_expand_label(
-                algorithm=self.algorithm,
-                secret=self.secret,
-                label=b"derived",
-                hash_value=self.hash_empty_value,
-                length=self.digest_size,
-            )
-
-        self.generation += 1
-        self.secret = hkdf_extract(
-            algorithm=self.algorithm, salt=self.secret, key_material=key_material
-        )
+        self._inner.extract(key_material)
 
     def update_hash(self, data: bytes) -> None:
-        self.hash.update(data)
+        self._inner.update_hash(data)
+
+    def reset_hash(self, data: bytes) -> None:
+        """
+        Restart the transcript hash from `data`.
+        """
+        self._inner.reset_hash(data)
+
+    def transcript(self) -> bytes:
+        return self._inner.transcript()
 
 
 class KeyScheduleProxy:
@@ -1450,80 +2261,519 @@ def cipher_suite_hash(cipher_suite: CipherSuite) -> int:
     return CIPHER_SUITES[cipher_suite]
 
 
-def negotiate(
-    supported: list[T],
-    offered: list[Any] | None,
-    exc: Alert | None = None,
-    excl: T | None = None,
-    excl_fn: Callable[[Any], bool] | None = None,
-) -> T:
-    if offered is not None:
-        for c in supported:
-            if c in offered:
-                if excl is not None and excl == c:
-                    continue
-                if excl_fn is not None and excl_fn(c):
-                    continue
-                return c
+def negotiate(
+    supported: list[T],
+    offered: list[Any] | None,
+    exc: Alert | None = None,
+    excl: T | None = None,
+    excl_fn: Callable[[Any], bool] | None = None,
+) -> T:
+    if offered is not None:
+        for c in supported:
+            if c in offered:
+                if excl is not None and excl == c:
+                    continue
+                if excl_fn is not None and excl_fn(c):
+                    continue
+                return c
+
+    if exc is not None:
+        raise exc
+    return None
+
+
+def signature_algorithm_params(signature_algorithm: int) -> tuple[Any, ...]:
+    if signature_algorithm in (SignatureAlgorithm.ED25519, SignatureAlgorithm.ED448):
+        return ()
+
+    is_pss, hash_size = SIGNATURE_ALGORITHMS[SignatureAlgorithm(signature_algorithm)]
+
+    if is_pss is None:
+        return ()
+
+    return (
+        is_pss,
+        hash_size,
+    )
+
+
+def private_key_signature_algorithms(
+    private_key: (
+        EcPrivateKey | Ed25519PrivateKey | DsaPrivateKey | RsaPrivateKey | None
+    ),
+) -> list[SignatureAlgorithm]:
+    """
+    Return the signature algorithms usable with `private_key`, in order
+    of preference.
+    """
+    if isinstance(private_key, RsaPrivateKey):
+        return [
+            SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
+            SignatureAlgorithm.RSA_PKCS1_SHA256,
+        ]
+    elif isinstance(private_key, EcPrivateKey):
+        if private_key.curve_type == 256:
+            return [SignatureAlgorithm.ECDSA_SECP256R1_SHA256]
+        elif private_key.curve_type == 384:
+            return [SignatureAlgorithm.ECDSA_SECP384R1_SHA384]
+        elif private_key.curve_type == 521:
+            return [SignatureAlgorithm.ECDSA_SECP521R1_SHA512]
+    elif isinstance(private_key, Ed25519PrivateKey):
+        return [SignatureAlgorithm.ED25519]
+
+    return []
+
+
+@dataclass
+class ServerCredentials:
+    """
+    Handshake material derived from a certificate chain and its private key.
+
+    It is computed once and shared by every server connection using the
+    same certificate, see
+    :meth:`~qh3.quic.configuration.QuicConfiguration.server_credentials`.
+    """
+
+    certificate: X509Certificate | None
+    certificate_chain: list[X509Certificate]
+    private_key: EcPrivateKey | Ed25519PrivateKey | DsaPrivateKey | RsaPrivateKey | None
+
+    certificate_message: bytes
+    "The encoded Certificate handshake message, with an empty request context."
+
+    signature_algorithms: list[SignatureAlgorithm]
+    signature_params: dict[int, tuple[Any, ...]]
+
+    compressed_certificate_messages: dict[int, bytes] = field(default_factory=dict)
+    "The CompressedCertificate handshake messages, by compression algorithm."
+
+    stapled_certificate_messages: tuple[bytes, dict[int | None, bytes]] = field(
+        default_factory=lambda: (b"", {})
+    )
+    "The last OCSP response stapled, and its handshake messages by compression."
+
+    def compressed_certificate_message(self, algorithm: int) -> bytes:
+        """
+        Return the handshake message carrying the certificate chain once
+        compressed with the given algorithm, compressing it on first use.
+
+        The plain Certificate message is returned when compression does not
+        make it any smaller.
+        """
+        message = self.compressed_certificate_messages.get(algorithm)
+        if message is None:
+            message = compress_certificate_message(self.certificate_message, algorithm)
+            if len(message) >= len(self.certificate_message):
+                message = self.certificate_message
+            self.compressed_certificate_messages[algorithm] = message
+        return message
+
+    def stapled_certificate_message(
+        self, ocsp_response: bytes, algorithm: int | None = None
+    ) -> bytes:
+        """
+        Return the handshake message carrying the certificate chain with
+        `ocsp_response` stapled to the leaf (RFC 8446 4.4.2.1), compressed with
+        the given algorithm unless it is `None`.
+
+        The messages are built once per OCSP response.
+        """
+        stapled_response, messages = self.stapled_certificate_messages
+        if stapled_response != ocsp_response:
+            stapled_response, messages = self.stapled_certificate_messages = (
+                ocsp_response,
+                {},
+            )
+
+        message = messages.get(algorithm)
+        if message is None:
+            status = Buffer(capacity=8 + len(ocsp_response))
+            with push_extension(status, ExtensionType.STATUS_REQUEST):
+                status.push_uint8(1)  # OCSP
+                push_opaque(status, 3, ocsp_response)
+            certificates = [(self.certificate.public_bytes(), status.data)] + [
+                (cert.public_bytes(), b"") for cert in self.certificate_chain
+            ]
+            buf = Buffer(capacity=8 + sum(5 + len(a) + len(b) for a, b in certificates))
+            push_certificate(
+                buf, Certificate(request_context=b"", certificates=certificates)
+            )
+            message = buf.data
+            if algorithm is not None:
+                compressed = compress_certificate_message(message, algorithm)
+                if len(compressed) < len(message):
+                    message = compressed
+            messages[algorithm] = message
+        return message
+
+    def matches(
+        self,
+        certificate: X509Certificate | None,
+        certificate_chain: list[X509Certificate],
+        private_key: (
+            EcPrivateKey | Ed25519PrivateKey | DsaPrivateKey | RsaPrivateKey | None
+        ),
+    ) -> bool:
+        return (
+            self.certificate is certificate
+            and self.private_key is private_key
+            and len(self.certificate_chain) == len(certificate_chain)
+            and all(a is b for a, b in zip(self.certificate_chain, certificate_chain))
+        )
+
+
+def build_server_credentials(
+    certificate: X509Certificate | None,
+    certificate_chain: list[X509Certificate],
+    private_key: (
+        EcPrivateKey | Ed25519PrivateKey | DsaPrivateKey | RsaPrivateKey | None
+    ),
+) -> ServerCredentials:
+    certificates = [
+        (cert.public_bytes(), b"")
+        for cert in [certificate] + certificate_chain
+        if cert is not None
+    ]
+    buf = Buffer(capacity=8 + sum(5 + len(cert_data) for cert_data, _ in certificates))
+    push_certificate(buf, Certificate(request_context=b"", certificates=certificates))
+
+    signature_algorithms = private_key_signature_algorithms(private_key)
+
+    return ServerCredentials(
+        certificate=certificate,
+        certificate_chain=list(certificate_chain),
+        private_key=private_key,
+        certificate_message=buf.data,
+        signature_algorithms=signature_algorithms,
+        signature_params={
+            algorithm: signature_algorithm_params(algorithm)
+            for algorithm in signature_algorithms
+        },
+    )
+
+
+@contextmanager
+def push_message(
+    key_schedule: KeySchedule | KeyScheduleProxy, buf: Buffer
+) -> Generator:
+    hash_start = buf.tell()
+    yield
+    key_schedule.update_hash(buf.data_slice(hash_start, buf.tell()))
+
+
+# callback types
+
+
+@dataclass
+class SessionTicket:
+    """
+    A TLS session ticket for session resumption.
+    """
+
+    age_add: int
+    cipher_suite: CipherSuite
+    not_valid_after: datetime.datetime
+    not_valid_before: datetime.datetime
+    resumption_secret: bytes
+    server_name: str
+    ticket: bytes
+
+    max_early_data_size: int | None = None
+    other_extensions: list[tuple[int, bytes]] = field(default_factory=list)
+    alpn_protocol: str | None = None
+
+    @property
+    def is_valid(self) -> bool:
+        now = utcnow()
+        return now >= self.not_valid_before and now <= self.not_valid_after
+
+    @property
+    def obfuscated_age(self) -> int:
+        age = int((utcnow() - self.not_valid_before).total_seconds() * 1000)
+        return (age + self.age_add) % (1 << 32)
+
+
+_TICKET_EPOCH = datetime.datetime(1970, 1, 1)
+_TICKET_KEY_ID_SIZE = 8
+_TICKET_NONCE_SIZE = 12
+
+
+def _ticket_timestamp(value: datetime.datetime) -> int:
+    return (value - _TICKET_EPOCH) // datetime.timedelta(milliseconds=1)
+
+
+class SessionTicketKeyRing:
+    """
+    Keys sealing the resumption state into the session tickets a server
+    hands out, so that resumption and 0-RTT need no server-side storage.
+
+    Tickets are sealed with AES-256-GCM under the newest key and opened
+    with any key still in the ring. Every worker holding the same keys
+    can resume sessions established by the others.
+
+    :param keys: 32-byte keys, newest first. A random key is generated
+        when none is given.
+    :param max_keys: how many keys are kept once :meth:`rotate` is called.
+
+    .. note:: Sealed tickets are bearer tokens: 0-RTT data sent with them
+       can be replayed to any worker holding the keys.
+    """
+
+    def __init__(self, keys: Sequence[bytes] | None = None, max_keys: int = 3):
+        if max_keys < 1:
+            raise ValueError("max_keys must be at least 1")
+        self._max_keys = max_keys
+        self._keys: list[tuple[bytes, bytes]] = []
+        for key in reversed(keys or [os.urandom(32)]):
+            self.rotate(key)
+
+    @property
+    def key_ids(self) -> list[bytes]:
+        """
+        Identifiers of the keys in the ring, newest first.
+        """
+        return [key_id for key_id, _ in self._keys]
+
+    def rotate(self, key: bytes | None = None) -> None:
+        """
+        Make `key` (or a random key) the one sealing new tickets, dropping
+        the oldest key if the ring is full.
+        """
+        if key is None:
+            key = os.urandom(32)
+        elif len(key) != 32:
+            raise ValueError("Session ticket keys must be 32 bytes long")
+
+        key_id = hashlib.sha256(b"qh3 session ticket key" + key).digest()[
+            :_TICKET_KEY_ID_SIZE
+        ]
+        self._keys = [(key_id, key)] + [
+            entry for entry in self._keys if entry[0] != key_id
+        ][: self._max_keys - 1]
+
+    def seal(self, session_ticket: SessionTicket) -> bytes:
+        """
+        Return the ticket bytes carrying `session_ticket`.
+
+        The extensions of the ticket are not sealed, the server has no use
+        for them when resuming.
+        """
+        server_name = (session_ticket.server_name or "").encode()
+        alpn_protocol = (session_ticket.alpn_protocol or "").encode()
+
+        buf = Buffer(
+            capacity=32
+            + len(session_ticket.resumption_secret)
+            + len(server_name)
+            + len(alpn_protocol)
+        )
+        buf.push_uint16(session_ticket.cipher_suite)
+        buf.push_uint64(_ticket_timestamp(session_ticket.not_valid_before))
+        buf.push_uint64(_ticket_timestamp(session_ticket.not_valid_after))
+        buf.push_uint32(session_ticket.age_add)
+        if session_ticket.max_early_data_size is None:
+            buf.push_uint8(0)
+        else:
+            buf.push_uint8(1)
+            buf.push_uint32(session_ticket.max_early_data_size)
+        push_opaque(buf, 1, session_ticket.resumption_secret)
+        push_opaque(buf, 1, server_name)
+        push_opaque(buf, 1, alpn_protocol)
+
+        key_id, key = self._keys[0]
+        nonce = os.urandom(_TICKET_NONCE_SIZE)
+        header = key_id + nonce
+        return header + AeadAes256Gcm(key, nonce).encrypt(0, buf.data, header)
+
+    def unseal(self, ticket: bytes) -> SessionTicket | None:
+        """
+        Return the session ticket carried by `ticket`, or `None` if it was
+        not sealed by a key in the ring or was tampered with.
+        """
+        header_size = _TICKET_KEY_ID_SIZE + _TICKET_NONCE_SIZE
+        key_id = ticket[:_TICKET_KEY_ID_SIZE]
+        for candidate_id, key in self._keys:
+            if candidate_id == key_id:
+                break
+        else:
+            return None
+
+        try:
+            plaintext = AeadAes256Gcm(
+                key, ticket[_TICKET_KEY_ID_SIZE:header_size]
+            ).decrypt(0, ticket[header_size:], ticket[:header_size])
+        except (CryptoError, ValueError):
+            return None
+
+        buf = Buffer(data=plaintext)
+        try:
+            cipher_suite = CipherSuite(buf.pull_uint16())
+            not_valid_before = _TICKET_EPOCH + datetime.timedelta(
+                milliseconds=buf.pull_uint64()
+            )
+            not_valid_after = _TICKET_EPOCH + datetime.timedelta(
+                milliseconds=buf.pull_uint64()
+            )
+            age_add = buf.pull_uint32()
+            max_early_data_size = buf.pull_uint32() if buf.pull_uint8() else None
+            resumption_secret = pull_opaque(buf, 1)
+            server_name = pull_opaque(buf, 1).decode()
+            alpn_protocol = pull_opaque(buf, 1).decode()
+        except (BufferReadError, ValueError):
+            return None
+
+        return SessionTicket(
+            age_add=age_add,
+            cipher_suite=cipher_suite,
+            not_valid_after=not_valid_after,
+            not_valid_before=not_valid_before,
+            resumption_secret=resumption_secret,
+            server_name=server_name or None,
+            ticket=ticket,
+            max_early_data_size=max_early_data_size,
+            alpn_protocol=alpn_protocol or None,
+        )
+
+
+KeyExchange = Union[
+    ECDHP256KeyExchange,
+    ECDHP384KeyExchange,
+    ECDHP521KeyExchange,
+    X25519KeyExchange,
+    X25519ML768KeyExchange,
+]
+
+KEY_EXCHANGES: dict[int, Callable[[], KeyExchange]] = {
+    Group.SECP256R1: ECDHP256KeyExchange,
+    Group.SECP384R1: ECDHP384KeyExchange,
+    Group.SECP521R1: ECDHP521KeyExchange,
+    Group.X25519: X25519KeyExchange,
+    Group.X25519ML768: X25519ML768KeyExchange,
+}
+
+
+class KeySharePool:
+    """
+    Single-use key exchange key pairs generated ahead of time by a background
+    thread, taking key generation off the handshake latency path.
 
-    if exc is not None:
-        raise exc
-    return None
+    Key generation releases the GIL, so refilling the pool does not stall
+    the thread driving connections. When the pool for a group runs dry, the
+    handshake generates its key pair itself.
 
+    :param groups: the groups to pre-generate key pairs for.
+    :param size: how many key pairs are kept ready per group.
+    """
 
-def signature_algorithm_params(signature_algorithm: int) -> tuple[Any, ...]:
-    if signature_algorithm in (SignatureAlgorithm.ED25519, SignatureAlgorithm.ED448):
-        return ()
+    def __init__(
+        self,
+        groups: Sequence[int] = (Group.X25519ML768, Group.X25519, Group.SECP256R1),
+        size: int = 8,
+    ) -> None:
+        self._condition = threading.Condition()
+        self._groups = [group for group in groups if group in KEY_EXCHANGES]
+        self._keys: dict[int, deque[KeyExchange]] = {}
+        self._size = size
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._start()
+
+        # the background thread may hold the condition's lock when the process
+        # forks, the child must not reuse it nor the key pairs of its parent
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(
+                after_in_child=partial(_reset_key_share_pool, weakref.ref(self))
+            )
 
-    is_pss, hash_size = SIGNATURE_ALGORITHMS[SignatureAlgorithm(signature_algorithm)]
+    def take(self, group: int) -> KeyExchange | None:
+        """
+        Take a key pair for `group`, or return `None` if none is ready.
+        """
+        with self._condition:
+            if self._closed or group not in self._groups:
+                return None
 
-    if is_pss is None:
-        return ()
+            if self._thread is None:
+                self._start()
 
-    return (
-        is_pss,
-        hash_size,
-    )
+            keys = self._keys[group]
+            key = keys.popleft() if keys else None
+            self._condition.notify()
+            return key
 
+    def close(self) -> None:
+        """
+        Stop the background thread and discard the pending key pairs.
+        """
+        with self._condition:
+            self._closed = True
+            self._keys.clear()
+            self._condition.notify()
+
+    def _after_fork(self) -> None:
+        # only the forking thread survives, the pool restarts on first use
+        self._condition = threading.Condition()
+        self._keys = {}
+        self._thread = None
+
+    def _missing_groups(self) -> list[int]:
+        return [group for group in self._groups if len(self._keys[group]) < self._size]
+
+    def _start(self) -> None:
+        self._keys = {group: deque() for group in self._groups}
+        self._thread = threading.Thread(
+            target=_run_key_share_pool,
+            args=(weakref.ref(self), self._condition),
+            name="qh3-key-share-pool",
+            daemon=True,
+        )
+        self._thread.start()
 
-@contextmanager
-def push_message(
-    key_schedule: KeySchedule | KeyScheduleProxy, buf: Buffer
-) -> Generator:
-    hash_start = buf.tell()
-    yield
-    key_schedule.update_hash(buf.data_slice(hash_start, buf.tell()))
+        # wake the thread up when the pool is collected, so that it exits
+        weakref.finalize(self, _wake_key_share_pool, self._condition)
 
 
-# callback types
+def _reset_key_share_pool(ref: weakref.ref[KeySharePool]) -> None:
+    pool = ref()
+    if pool is not None:
+        pool._after_fork()
 
 
-@dataclass
-class SessionTicket:
-    """
-    A TLS session ticket for session resumption.
+def _run_key_share_pool(
+    ref: weakref.ref[KeySharePool], condition: threading.Condition
+) -> None:
     """
+    Fill a key share pool until it is closed or collected.
 
-    age_add: int
-    cipher_suite: CipherSuite
-    not_valid_after: datetime.datetime
-    not_valid_before: datetime.datetime
-    resumption_secret: bytes
-    server_name: str
-    ticket: bytes
+    Only a weak reference to the pool is kept while waiting or generating
+    key pairs, so that a pool which is dropped without being closed can be
+    collected.
+    """
+    while True:
+        with condition:
+            while True:
+                pool = ref()
+                if pool is None or pool._closed:
+                    return
+                groups = pool._missing_groups()
+                del pool
+                if groups:
+                    break
+                condition.wait()
 
-    max_early_data_size: int | None = None
-    other_extensions: list[tuple[int, bytes]] = field(default_factory=list)
+        for group in groups:
+            key = KEY_EXCHANGES[group]()
+            with condition:
+                pool = ref()
+                if pool is None or pool._closed:
+                    return
+                pool._keys[group].append(key)
+                del pool
 
-    @property
-    def is_valid(self) -> bool:
-        now = utcnow()
-        return now >= self.not_valid_before and now <= self.not_valid_after
 
-    @property
-    def obfuscated_age(self) -> int:
-        age = int((utcnow() - self.not_valid_before).total_seconds() * 1000)
-        return (age + self.age_add) % (1 << 32)
+def _wake_key_share_pool(condition: threading.Condition) -> None:
+    with condition:
+        condition.notify()
 
 
 AlpnHandler = Callable[[str], None]
@@ -1607,6 +2857,13 @@ class Context:
             EcPrivateKey | Ed25519PrivateKey | DsaPrivateKey | RsaPrivateKey | None
         ) = None
         self.handshake_extensions: list[Extension] = []
+        self.server_credentials: ServerCredentials | None = None
+        self.handshake_executor: Executor | None = None
+        self.session_ticket_key_ring: SessionTicketKeyRing | None = None
+        self.key_share_pool: KeySharePool | None = None
+        self.key_share_group_cache: KeyShareGroupCache | None = None
+        self.verified_chain_cache: VerifiedChainCache | None = None
+        self.ocsp_cache: OcspCache | None = None
         self._max_early_data = max_early_data
         self.session_ticket: SessionTicket | None = None
 
@@ -1672,8 +2929,14 @@ class Context:
             Group.SECP256R1,
             Group.SECP384R1,
         ]
+        if not is_client:
+            # accepted from clients, but not worth offering
+            self._supported_groups.append(Group.SECP521R1)
 
         self._supported_versions = [self._grease_version, TLS_VERSION_1_3]
+        self._certificate_compression_algorithms = list(
+            CERTIFICATE_COMPRESSION_ALGORITHMS
+        )
 
         # state
         self.alpn_negotiated: str | None = None
@@ -1682,15 +2945,25 @@ class Context:
         self.received_extensions: list[Extension] | None = None
         self._key_schedule_psk: KeySchedule | None = None
         self._key_schedule_proxy: KeyScheduleProxy | None = None
+        self._client_hello: ClientHello | None = None
+        self._hello_retry_cipher_suite: CipherSuite | None = None
+        self._hello_retry_client_hello: ClientHello | None = None
+        self._hello_retry_group: int | None = None
+        self._hello_retry_transcript = b""
         self._new_session_ticket: NewSessionTicket | None = None
         self._peer_certificate: X509Certificate | None = None
         self._peer_certificate_chain: list[X509Certificate] = []
         self._ocsp_response: bytes | None = None
         self._receive_buffer = b""
+        self._pending_operation: (
+            tuple[Future, Callable[[dict[Epoch, Buffer], Any], None]] | None
+        ) = None
+        self._pending_input: list[tuple[bytes, int]] = []
         self._session_resumed = False
         self._enc_key: bytes | None = None
         self._dec_key: bytes | None = None
         self._certificate_request: CertificateRequest | None = None
+        self._certificate_compression_algorithm: int | None = None
         self.__logger = logger
 
         # KeyExchange
@@ -1723,6 +2996,13 @@ class Context:
             self.legacy_session_id = None
             self.state = State.SERVER_EXPECT_CLIENT_HELLO
 
+    def _new_key_exchange(self, group: int) -> Any:
+        if self.key_share_pool is not None:
+            key = self.key_share_pool.take(group)
+            if key is not None:
+                return key
+        return KEY_EXCHANGES[group]()
+
     @property
     def peer_certificate(self) -> X509Certificate | None:
         return self._peer_certificate
@@ -1753,6 +3033,40 @@ class Context:
         """
         return self._ech_retry_configs
 
+    @property
+    def pending_operation(self) -> Future | None:
+        """
+        The CertificateVerify signature or peer certificate verification
+        the handshake is waiting for, when a :attr:`handshake_executor` is
+        set. Call :meth:`resume_handshake` once it is done.
+        """
+        return self._pending_operation[0] if self._pending_operation else None
+
+    def resume_handshake(self, output_buf: dict[Epoch, Buffer]) -> None:
+        """
+        Complete the handshake step suspended on :attr:`pending_operation`,
+        then process the messages received in the meantime.
+        """
+        assert self._pending_operation is not None
+        future, resume = self._pending_operation
+        self._pending_operation = None
+
+        try:
+            result = future.result()
+        except Alert:
+            raise
+        except Exception as exc:
+            raise AlertInternalError(f"Handshake operation failed: {exc!r}") from exc
+
+        resume(output_buf, result)
+
+        pending_input, self._pending_input = self._pending_input, []
+        for index, (input_data, epoch) in enumerate(pending_input):
+            self.handle_message(input_data, output_buf, epoch)
+            if self._pending_operation is not None:
+                self._pending_input.extend(pending_input[index + 1 :])
+                break
+
     def handle_message(
         self, input_data: bytes, output_buf: dict[Epoch, Buffer], epoch: int = -1
     ) -> None:
@@ -1760,6 +3074,10 @@ class Context:
             self._client_send_hello(output_buf[Epoch.INITIAL])
             return
 
+        if self._pending_operation is not None:
+            self._pending_input.append((input_data, epoch))
+            return
+
         self._receive_buffer += input_data
         while len(self._receive_buffer) >= 4:
             # determine message length
@@ -1798,6 +3116,8 @@ class Context:
             elif self.state == State.CLIENT_EXPECT_CERTIFICATE_REQUEST_OR_CERTIFICATE:
                 if message_type == HandshakeType.CERTIFICATE:
                     self._client_handle_certificate(input_buf)
+                elif message_type == HandshakeType.COMPRESSED_CERTIFICATE:
+                    self._client_handle_compressed_certificate(input_buf)
                 elif message_type == HandshakeType.CERTIFICATE_REQUEST:
                     self._client_handle_certificate_request(input_buf)
                 else:
@@ -1840,6 +3160,21 @@ class Context:
 
             assert input_buf.eof()
 
+            if self._pending_operation is not None:
+                # keep what follows until the operation completes
+                if self._receive_buffer:
+                    self._pending_input.append((self._receive_buffer, epoch))
+                    self._receive_buffer = b""
+                break
+
+    def _suspend(
+        self,
+        operation: Callable[[], Any],
+        resume: Callable[[dict[Epoch, Buffer], Any], None],
+    ) -> None:
+        assert self.handshake_executor is not None
+        self._pending_operation = (self.handshake_executor.submit(operation), resume)
+
     def _build_session_ticket(
         self, new_session_ticket: NewSessionTicket, other_extensions: list[Extension]
     ) -> SessionTicket:
@@ -1864,49 +3199,61 @@ class Context:
             resumption_secret=resumption_secret,
             server_name=self._server_name,
             ticket=new_session_ticket.ticket,
+            alpn_protocol=self.alpn_negotiated,
         )
 
+    def _client_hello_extensions(self) -> list[Extension]:
+        """
+        Extensions sent in the ClientHello besides those built from the
+        configuration itself.
+        """
+        extensions = list(self.handshake_extensions)
+        if self._certificate_compression_algorithms:
+            buf = Buffer(capacity=1 + 2 * len(self._certificate_compression_algorithms))
+            push_list(buf, 1, buf.push_uint16, self._certificate_compression_algorithms)
+            extensions.append((ExtensionType.COMPRESS_CERTIFICATE, buf.data))
+        return extensions
+
+    def _client_key_share(self, group: int) -> KeyShareEntry:
+        key = self._new_key_exchange(group)
+        if group == Group.SECP256R1:
+            self._ec_p256_private_key = key
+        elif group == Group.SECP384R1:
+            self._ec_p384_private_key = key
+        elif group == Group.SECP521R1:
+            self._ec_p521_private_key = key
+        elif group == Group.X25519:
+            self._x25519_private_key = key
+        elif group == Group.X25519ML768:
+            self._x25519_kyber_768_private_key = key
+            if self.__logger is not None:
+                self.__logger.debug(
+                    "TLS: Advertising to peer post-quantum algorithm "
+                    "using X25519ML768 (0x11EC)"
+                )
+        return (group, key.public_key())
+
     def _client_send_hello(self, output_buf: Buffer) -> None:
         key_share: list[KeyShareEntry] = []
         supported_groups: list[int] = []
 
+        # lead with the group this server selected last time, a
+        # HelloRetryRequest recovers should its preference have changed
+        key_share_group: int | None = None
+        if (
+            self.key_share_group_cache is not None
+            and self._server_name is not None
+            and self._ech_config_list is None
+        ):
+            key_share_group = self.key_share_group_cache.get(self._server_name)
+            if key_share_group not in self._supported_groups:
+                key_share_group = None
+
         for group in self._supported_groups:
-            if group == Group.SECP256R1:
-                self._ec_p256_private_key = ECDHP256KeyExchange()
-                key_share.append(
-                    (Group.SECP256R1, self._ec_p256_private_key.public_key())
-                )
-                supported_groups.append(Group.SECP256R1)
-            elif group == Group.SECP384R1:
-                self._ec_p384_private_key = ECDHP384KeyExchange()
-                key_share.append(
-                    (Group.SECP384R1, self._ec_p384_private_key.public_key())
-                )
-                supported_groups.append(Group.SECP384R1)
-            elif group == Group.SECP521R1:
-                self._ec_p521_private_key = ECDHP521KeyExchange()
-                key_share.append(
-                    (Group.SECP521R1, self._ec_p521_private_key.public_key())
-                )
-                supported_groups.append(Group.SECP521R1)
-            elif group == Group.X25519:
-                self._x25519_private_key = X25519KeyExchange()
-                key_share.append((Group.X25519, self._x25519_private_key.public_key()))
-                supported_groups.append(Group.X25519)
-            elif group == Group.X25519ML768:
-                self._x25519_kyber_768_private_key = X25519ML768KeyExchange()
-                key_share.append(
-                    (
-                        Group.X25519ML768,
-                        self._x25519_kyber_768_private_key.public_key(),
-                    )
-                )
-                supported_groups.append(Group.X25519ML768)
-                if self.__logger is not None:
-                    self.__logger.debug(
-                        "TLS: Advertising to peer post-quantum algorithm "
-                        "using X25519ML768 (0x11EC)"
-                    )
+            if group in KEY_EXCHANGES:
+                if key_share_group is None or group == key_share_group:
+                    key_share.append(self._client_key_share(group))
+                supported_groups.append(group)
             elif _is_grease_value(group):
                 key_share.append((group, b"\x00"))
                 supported_groups.append(group)
@@ -1944,7 +3291,7 @@ class Context:
                     )
 
         # Build the outer ClientHello
-        extensions = list(self.handshake_extensions)
+        extensions = self._client_hello_extensions()
 
         if ech_config_selected:
             # Real ECH: build the full ECH extension
@@ -1989,15 +3336,46 @@ class Context:
             grease_extension2=self._grease_extension2,
         )
 
+        self._client_hello = hello
+        self._key_schedule_proxy = KeyScheduleProxy(
+            [cs for cs in self._cipher_suites if not _is_grease_value(cs)]
+        )
+        self._key_schedule_proxy.extract(None)
+        self._client_push_hello(hello, output_buf)
+
+    def _client_push_hello(
+        self, hello: ClientHello, output_buf: Buffer, transcript: bytes = b""
+    ) -> None:
+        """
+        Send `hello`, binding the session ticket to it if there is one.
+
+        `transcript` holds the messages preceding `hello`, i.e. the hash of
+        the first ClientHello and the HelloRetryRequest.
+        """
+        retry_cipher_suite = self._hello_retry_cipher_suite
+
         # PSK
-        if self.session_ticket and self.session_ticket.is_valid:
+        hello.pre_shared_key = None
+        self._key_schedule_psk = None
+        if (
+            self.session_ticket
+            and self.session_ticket.is_valid
+            and (
+                retry_cipher_suite is None
+                or cipher_suite_hash(self.session_ticket.cipher_suite)
+                == cipher_suite_hash(retry_cipher_suite)
+            )
+        ):
             self._key_schedule_psk = KeySchedule(self.session_ticket.cipher_suite)
             self._key_schedule_psk.extract(self.session_ticket.resumption_secret)
             binder_key = self._key_schedule_psk.derive_secret(b"res binder")
             binder_length = self._key_schedule_psk.digest_size
 
-            # update hello
-            if self.session_ticket.max_early_data_size is not None:
+            # update hello, early data is not allowed after a HelloRetryRequest
+            if (
+                self.session_ticket.max_early_data_size is not None
+                and retry_cipher_suite is None
+            ):
                 hello.early_data = True
             hello.pre_shared_key = OfferedPsks(
                 identities=[
@@ -2007,11 +3385,12 @@ class Context:
             )
 
             # serialize hello without binder
-            tmp_buf = Buffer(capacity=2048)
+            tmp_buf = Buffer(capacity=2048 + len(self.session_ticket.ticket))
             push_client_hello(tmp_buf, hello)
 
             # calculate binder
             hash_offset = tmp_buf.tell() - binder_length - 3
+            self._key_schedule_psk.update_hash(transcript)
             self._key_schedule_psk.update_hash(tmp_buf.data_slice(0, hash_offset))
             binder = self._key_schedule_psk.finished_verify_data(binder_key)
             hello.pre_shared_key.binders[0] = binder
@@ -2029,16 +3408,75 @@ class Context:
                     early_key,
                 )
 
-        self._key_schedule_proxy = KeyScheduleProxy(
-            [cs for cs in self._cipher_suites if not _is_grease_value(cs)]
-        )
-        self._key_schedule_proxy.extract(None)
-
         with push_message(self._key_schedule_proxy, output_buf):
             push_client_hello(output_buf, hello)
 
         self._set_state(State.CLIENT_EXPECT_SERVER_HELLO)
 
+    def _client_handle_hello_retry_request(
+        self, peer_hello: ServerHello, input_buf: Buffer, output_buf: Buffer
+    ) -> None:
+        hello = self._client_hello
+        if hello is None or self._hello_retry_cipher_suite is not None:
+            # RFC 8446 4.1.4: a second HelloRetryRequest is fatal
+            raise AlertUnexpectedMessage
+        if self._ech_offered:
+            raise AlertHandshakeFailure("HelloRetryRequest is not supported with ECH")
+
+        cipher_suite = negotiate(
+            self._cipher_suites,
+            [peer_hello.cipher_suite],
+            AlertHandshakeFailure("Unsupported cipher suite"),
+            excl_fn=_is_grease_value,
+        )
+        assert peer_hello.supported_version in self._supported_versions
+
+        # the selected group must be supported but not offered yet
+        if peer_hello.key_share is not None:
+            group = peer_hello.key_share[0]
+            if (
+                group not in KEY_EXCHANGES
+                or group not in self._supported_groups
+                or any(entry[0] == group for entry in hello.key_share)
+            ):
+                raise AlertIllegalParameter
+
+            # the key pairs of the first ClientHello are never used
+            self._ec_p256_private_key = None
+            self._ec_p384_private_key = None
+            self._ec_p521_private_key = None
+            self._x25519_private_key = None
+            self._x25519_kyber_768_private_key = None
+            hello.key_share = [self._client_key_share(group)]
+            self._hello_retry_group = group
+
+        hello.early_data = False
+        for extension_type, extension_value in peer_hello.other_extensions:
+            if extension_type == ExtensionType.COOKIE:
+                hello.other_extensions = hello.other_extensions + [
+                    (ExtensionType.COOKIE, extension_value)
+                ]
+
+        # the first ClientHello is replaced by its hash (RFC 8446 4.4.1)
+        client_hello_hash = self._key_schedule_proxy.select(cipher_suite).transcript()
+        transcript = (
+            bytes([HandshakeType.MESSAGE_HASH, 0, 0, len(client_hello_hash)])
+            + client_hello_hash
+            + input_buf.data
+        )
+
+        self._hello_retry_cipher_suite = cipher_suite
+        self._key_schedule_proxy = KeyScheduleProxy([cipher_suite])
+        self._key_schedule_proxy.extract(None)
+        self._key_schedule_proxy.update_hash(transcript)
+        self._client_push_hello(hello, output_buf, transcript)
+
+        if self.__logger is not None:
+            self.__logger.debug(
+                "TLS: HelloRetryRequest for group 0x%04X",
+                hello.key_share[0][0],
+            )
+
     def _build_ech_extension(
         self,
         key_share: list[KeyShareEntry],
@@ -2096,7 +3534,7 @@ class Context:
             compressed_types.append(ExtensionType.PSK_KEY_EXCHANGE_MODES)
         if self._alpn_protocols is not None:
             compressed_types.append(ExtensionType.ALPN)
-        for ext_type, _ in self.handshake_extensions:
+        for ext_type, _ in self._client_hello_extensions():
             compressed_types.append(ext_type)
         compressed_types.append(self._grease_extension2)
 
@@ -2172,7 +3610,7 @@ class Context:
         ech_placeholder = _build_ech_header(b"\x00" * payload_len)
 
         # Build the outer ClientHello with placeholder ECH for AAD
-        aad_extensions = list(self.handshake_extensions)
+        aad_extensions = self._client_hello_extensions()
         aad_extensions.append((ExtensionType.ENCRYPTED_CLIENT_HELLO, ech_placeholder))
 
         aad_hello = ClientHello(
@@ -2334,7 +3772,7 @@ class Context:
                         )
 
                 # handshake_extensions (from outer CH's other_extensions)
-                for ext_type, ext_value in self.handshake_extensions:
+                for ext_type, ext_value in self._client_hello_extensions():
                     with push_extension(inner_ch_buf, ext_type):
                         inner_ch_buf.push_bytes(ext_value)
 
@@ -2433,6 +3871,10 @@ class Context:
 
     def _client_handle_hello(self, input_buf: Buffer, output_buf: Buffer) -> None:
         peer_hello = pull_server_hello(input_buf)
+        if peer_hello.random == HELLO_RETRY_REQUEST_RANDOM:
+            self._client_handle_hello_retry_request(peer_hello, input_buf, output_buf)
+            return
+
         # Capture raw wire bytes AFTER parsing so that pos has advanced
         # (Buffer.data returns data[0..pos]).
         raw_server_hello = input_buf.data
@@ -2443,6 +3885,16 @@ class Context:
             AlertHandshakeFailure("Unsupported cipher suite"),
             excl_fn=_is_grease_value,
         )
+        if (
+            self._hello_retry_cipher_suite is not None
+            and cipher_suite != self._hello_retry_cipher_suite
+        ):
+            raise AlertIllegalParameter
+        if (
+            self._hello_retry_group is not None
+            and peer_hello.key_share[0] != self._hello_retry_group
+        ):
+            raise AlertIllegalParameter
         assert peer_hello.compression_method in self._legacy_compression_methods
         assert peer_hello.supported_version in self._supported_versions
 
@@ -2484,7 +3936,10 @@ class Context:
             and self._x25519_private_key is not None
         ):
             shared_key = self._x25519_private_key.exchange(peer_public_key)
-        elif peer_hello.key_share[0] == Group.X25519ML768:
+        elif (
+            peer_hello.key_share[0] == Group.X25519ML768
+            and self._x25519_kyber_768_private_key is not None
+        ):
             shared_key = self._x25519_kyber_768_private_key.exchange(peer_public_key)
             if self.__logger is not None:
                 self.__logger.debug(
@@ -2507,13 +3962,15 @@ class Context:
             shared_key = self._ec_p521_private_key.exchange(peer_public_key)
 
         assert shared_key is not None
+        self._client_hello = None
+        if self.key_share_group_cache is not None and self._server_name is not None:
+            self.key_share_group_cache.add(self._server_name, peer_hello.key_share[0])
 
         if self._ech_accepted:
             # When ECH is accepted, the transcript uses the inner ClientHello.
             # Replace the outer CH transcript with the inner CH transcript.
             assert self._ech_inner_ch_bytes is not None
-            self.key_schedule.hash = hashlib.new(f"sha{self.key_schedule.algorithm}")
-            self.key_schedule.hash.update(self._ech_inner_ch_bytes)
+            self.key_schedule.reset_hash(self._ech_inner_ch_bytes)
 
         self.key_schedule.update_hash(input_buf.data)
         self.key_schedule.extract(shared_key)
@@ -2561,8 +4018,32 @@ class Context:
             self._set_state(State.CLIENT_EXPECT_CERTIFICATE_REQUEST_OR_CERTIFICATE)
 
     def _client_handle_certificate(self, input_buf: Buffer) -> None:
-        certificate = pull_certificate(input_buf)
+        self._client_store_certificate(pull_certificate(input_buf))
+
+        self.key_schedule.update_hash(input_buf.data)
+
+        self._set_state(State.CLIENT_EXPECT_CERTIFICATE_VERIFY)
+
+    def _client_handle_compressed_certificate(self, input_buf: Buffer) -> None:
+        compressed_certificate = pull_compressed_certificate(input_buf)
+
+        # RFC 8879, Section 4: only the algorithms we offered may be used
+        if (
+            compressed_certificate.algorithm
+            not in self._certificate_compression_algorithms
+        ):
+            raise AlertIllegalParameter(
+                "Server used an unsupported certificate compression algorithm"
+            )
+
+        self._client_store_certificate(decompress_certificate(compressed_certificate))
+
+        # the transcript covers the message as sent, not the decompressed one
+        self.key_schedule.update_hash(input_buf.data)
+
+        self._set_state(State.CLIENT_EXPECT_CERTIFICATE_VERIFY)
 
+    def _client_store_certificate(self, certificate: Certificate) -> None:
         # attempt to extract a possible OCSP staple extension from
         # the leaf certificate only.
         ext_buf = Buffer(data=certificate.certificates[0][1])
@@ -2593,10 +4074,6 @@ class Context:
             for i in range(1, len(certificate.certificates))
         ]
 
-        self.key_schedule.update_hash(input_buf.data)
-
-        self._set_state(State.CLIENT_EXPECT_CERTIFICATE_VERIFY)
-
     def _client_handle_certificate_request(self, input_buf: Buffer) -> None:
         self._certificate_request = pull_certificate_request(input_buf)
         self.key_schedule.update_hash(input_buf.data)
@@ -2607,14 +4084,30 @@ class Context:
 
         assert verify.algorithm in self._signature_algorithms
 
+        check = partial(
+            self._check_peer_certificate,
+            verify,
+            self.key_schedule.certificate_verify_data(
+                b"TLS 1.3, server CertificateVerify"
+            ),
+        )
+        resume = partial(self._client_certificate_verified, input_buf.data)
+
+        if self.handshake_executor is not None:
+            self._suspend(check, resume)
+        else:
+            check()
+            resume(None, None)
+
+    def _check_peer_certificate(
+        self, verify: CertificateVerify, verify_data: bytes
+    ) -> None:
         # check signature
         try:
             verify_with_public_key(
                 self._peer_certificate.public_key(),
                 verify.algorithm,
-                self.key_schedule.certificate_verify_data(
-                    b"TLS 1.3, server CertificateVerify"
-                ),
+                verify_data,
                 verify.signature,
             )
         except SignatureError as e:
@@ -2642,6 +4135,7 @@ class Context:
                 server_name=cert_server_name,
                 assert_server_name=self._verify_hostname,
                 ocsp_response=self._ocsp_response,
+                verified_chain_cache=self.verified_chain_cache,
             )
 
         if self._assert_fingerprint is not None:
@@ -2664,7 +4158,10 @@ class Context:
                     f'got "{peer_fingerprint.hex()}"'
                 )
 
-        self.key_schedule.update_hash(input_buf.data)
+    def _client_certificate_verified(
+        self, message: bytes, output_buf: dict[Epoch, Buffer] | None, result: None
+    ) -> None:
+        self.key_schedule.update_hash(message)
 
         self._set_state(State.CLIENT_EXPECT_FINISHED)
 
@@ -2700,29 +4197,9 @@ class Context:
                 )
 
             if None not in (self.certificate, self.certificate_private_key):
-                # determine applicable signature algorithms
-                signature_algorithms: list[SignatureAlgorithm] = []
-
-                if isinstance(self.certificate_private_key, RsaPrivateKey):
-                    signature_algorithms = [
-                        SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
-                        SignatureAlgorithm.RSA_PKCS1_SHA256,
-                    ]
-                elif isinstance(self.certificate_private_key, EcPrivateKey):
-                    if self.certificate_private_key.curve_type == 256:
-                        signature_algorithms = [
-                            SignatureAlgorithm.ECDSA_SECP256R1_SHA256
-                        ]
-                    elif self.certificate_private_key.curve_type == 384:
-                        signature_algorithms = [
-                            SignatureAlgorithm.ECDSA_SECP384R1_SHA384
-                        ]
-                    elif self.certificate_private_key.curve_type == 521:
-                        signature_algorithms = [
-                            SignatureAlgorithm.ECDSA_SECP521R1_SHA512
-                        ]
-                elif isinstance(self.certificate_private_key, Ed25519PrivateKey):
-                    signature_algorithms = [SignatureAlgorithm.ED25519]
+                signature_algorithms = private_key_signature_algorithms(
+                    self.certificate_private_key
+                )
 
                 signature_algorithm = negotiate(
                     signature_algorithms,
@@ -2796,23 +4273,16 @@ class Context:
     ) -> None:
         peer_hello = pull_client_hello(input_buf)
 
-        # determine applicable signature algorithms
-        signature_algorithms: list[SignatureAlgorithm] = []
+        if self.server_credentials is None or not self.server_credentials.matches(
+            self.certificate, self.certificate_chain, self.certificate_private_key
+        ):
+            self.server_credentials = build_server_credentials(
+                self.certificate, self.certificate_chain, self.certificate_private_key
+            )
+        credentials = self.server_credentials
 
-        if isinstance(self.certificate_private_key, RsaPrivateKey):
-            signature_algorithms = [
-                SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
-                SignatureAlgorithm.RSA_PKCS1_SHA256,
-            ]
-        elif isinstance(self.certificate_private_key, EcPrivateKey):
-            if self.certificate_private_key.curve_type == 256:
-                signature_algorithms = [SignatureAlgorithm.ECDSA_SECP256R1_SHA256]
-            elif self.certificate_private_key.curve_type == 384:
-                signature_algorithms = [SignatureAlgorithm.ECDSA_SECP384R1_SHA384]
-            elif self.certificate_private_key.curve_type == 521:
-                signature_algorithms = [SignatureAlgorithm.ECDSA_SECP521R1_SHA512]
-        elif isinstance(self.certificate_private_key, Ed25519PrivateKey):
-            signature_algorithms = [SignatureAlgorithm.ED25519]
+        # determine applicable signature algorithms
+        signature_algorithms = credentials.signature_algorithms
 
         # negotiate parameters
         cipher_suite = negotiate(
@@ -2848,32 +4318,78 @@ class Context:
                 AlertHandshakeFailure("No common ALPN protocols"),
             )
 
+        # RFC 8446 4.1.2: the second ClientHello only replaces the key share
+        # with one for the requested group
+        if self._hello_retry_client_hello is not None and (
+            [entry[0] for entry in peer_hello.key_share or []]
+            != [self._hello_retry_group]
+            or _retried_client_hello(peer_hello)
+            != _retried_client_hello(self._hello_retry_client_hello)
+        ):
+            raise AlertIllegalParameter
+
+        # ask for another key share if none of the offered ones is usable
+        if not any(
+            entry[0] in KEY_EXCHANGES and entry[0] in self._supported_groups
+            for entry in peer_hello.key_share or []
+        ):
+            self._server_send_hello_retry_request(
+                peer_hello, input_buf, initial_buf, cipher_suite, supported_version
+            )
+            return
+        if (
+            self._hello_retry_cipher_suite is not None
+            and cipher_suite != self._hello_retry_cipher_suite
+        ):
+            raise AlertIllegalParameter
+
         self.client_random = peer_hello.random
         self.server_random = os.urandom(32)
         self.legacy_session_id = peer_hello.legacy_session_id
         self.received_extensions = peer_hello.other_extensions
 
+        # session tickets are bound to the name the client asked for
+        self._server_name = peer_hello.server_name
+
+        # negotiate certificate compression (RFC 8879)
+        for ext_type, ext_value in peer_hello.other_extensions:
+            if ext_type == ExtensionType.COMPRESS_CERTIFICATE:
+                ext_buf = Buffer(data=ext_value)
+                self._certificate_compression_algorithm = negotiate(
+                    self._certificate_compression_algorithms,
+                    pull_list(ext_buf, 1, ext_buf.pull_uint16),
+                )
+                break
+
         if self.alpn_cb:
             self.alpn_cb(self.alpn_negotiated)
 
         # select key schedule
         pre_shared_key = None
         if (
-            self.get_session_ticket_cb is not None
+            (
+                self.get_session_ticket_cb is not None
+                or self.session_ticket_key_ring is not None
+            )
             and psk_key_exchange_mode is not None
             and peer_hello.pre_shared_key is not None
             and len(peer_hello.pre_shared_key.identities) == 1
             and len(peer_hello.pre_shared_key.binders) == 1
         ):
-            # ask application to find session ticket
+            # unseal the session ticket, or ask application to find it
             identity = peer_hello.pre_shared_key.identities[0]
-            session_ticket = self.get_session_ticket_cb(identity[0])
+            session_ticket = None
+            if self.session_ticket_key_ring is not None:
+                session_ticket = self.session_ticket_key_ring.unseal(identity[0])
+            if session_ticket is None and self.get_session_ticket_cb is not None:
+                session_ticket = self.get_session_ticket_cb(identity[0])
 
             # validate session ticket
             if (
                 session_ticket is not None
                 and session_ticket.is_valid
                 and session_ticket.cipher_suite == cipher_suite
+                and session_ticket.server_name == peer_hello.server_name
             ):
                 self.key_schedule = KeySchedule(cipher_suite)
                 self.key_schedule.extract(session_ticket.resumption_secret)
@@ -2886,6 +4402,7 @@ class Context:
                     hash_offset + 3, hash_offset + 3 + binder_length
                 )
 
+                self.key_schedule.update_hash(self._hello_retry_transcript)
                 self.key_schedule.update_hash(input_buf.data_slice(0, hash_offset))
                 expected_binder = self.key_schedule.finished_verify_data(binder_key)
 
@@ -2898,7 +4415,11 @@ class Context:
                 self._session_resumed = True
 
                 # calculate early data key
-                if peer_hello.early_data:
+                if (
+                    peer_hello.early_data
+                    and session_ticket.alpn_protocol == self.alpn_negotiated
+                    and self._hello_retry_cipher_suite is None
+                ):
                     early_key = self.key_schedule.derive_secret(b"c e traffic")
                     self.early_data_accepted = True
                     self.update_traffic_key_cb(
@@ -2914,6 +4435,7 @@ class Context:
         if pre_shared_key is None:
             self.key_schedule = KeySchedule(cipher_suite)
             self.key_schedule.extract(None)
+            self.key_schedule.update_hash(self._hello_retry_transcript)
             self.key_schedule.update_hash(input_buf.data)
 
         # perform key exchange
@@ -2922,16 +4444,20 @@ class Context:
         shared_key: bytes | None = None
 
         for key_share in peer_hello.key_share:
+            if key_share[0] not in self._supported_groups:
+                continue
             peer_public_key = key_share[1]
 
             if key_share[0] == Group.X25519:
-                self._x25519_private_key = X25519KeyExchange()
+                self._x25519_private_key = self._new_key_exchange(Group.X25519)
                 public_key = self._x25519_private_key.public_key()
                 shared_key = self._x25519_private_key.exchange(peer_public_key)
                 group_kx = Group.X25519
                 break
             elif key_share[0] == Group.X25519ML768:
-                self._x25519_kyber_768_private_key = X25519ML768KeyExchange()
+                self._x25519_kyber_768_private_key = self._new_key_exchange(
+                    Group.X25519ML768
+                )
                 shared_key = self._x25519_kyber_768_private_key.exchange(
                     peer_public_key
                 )
@@ -2939,19 +4465,19 @@ class Context:
                 group_kx = Group.X25519ML768
                 break
             elif key_share[0] == Group.SECP256R1:
-                self._ec_p256_private_key = ECDHP256KeyExchange()
+                self._ec_p256_private_key = self._new_key_exchange(Group.SECP256R1)
                 public_key = self._ec_p256_private_key.public_key()
                 shared_key = self._ec_p256_private_key.exchange(peer_public_key)
                 group_kx = Group.SECP256R1
                 break
             elif key_share[0] == Group.SECP384R1:
-                self._ec_p384_private_key = ECDHP384KeyExchange()
+                self._ec_p384_private_key = self._new_key_exchange(Group.SECP384R1)
                 public_key = self._ec_p384_private_key.public_key()
                 shared_key = self._ec_p384_private_key.exchange(peer_public_key)
                 group_kx = Group.SECP384R1
                 break
             elif key_share[0] == Group.SECP521R1:
-                self._ec_p521_private_key = ECDHP521KeyExchange()
+                self._ec_p521_private_key = self._new_key_exchange(Group.SECP521R1)
                 public_key = self._ec_p521_private_key.public_key()
                 shared_key = self._ec_p521_private_key.exchange(peer_public_key)
                 group_kx = Group.SECP521R1
@@ -2993,25 +4519,69 @@ class Context:
 
         if pre_shared_key is None:
             # send certificate
-            with push_message(self.key_schedule, handshake_buf):
-                push_certificate(
-                    handshake_buf,
-                    Certificate(
-                        request_context=b"",
-                        certificates=[
-                            (x.public_bytes(), b"")
-                            for x in [self.certificate] + self.certificate_chain
-                        ],
-                    ),
+            ocsp_response: bytes | None = None
+            if (
+                peer_hello.status_request
+                and self.ocsp_cache is not None
+                and credentials.certificate_chain
+            ):
+                ocsp_response = self.ocsp_cache.staple(
+                    credentials.certificate, credentials.certificate_chain[0]
                 )
+            with push_message(self.key_schedule, handshake_buf):
+                if ocsp_response is not None:
+                    handshake_buf.push_bytes(
+                        credentials.stapled_certificate_message(
+                            ocsp_response, self._certificate_compression_algorithm
+                        )
+                    )
+                elif self._certificate_compression_algorithm is not None:
+                    handshake_buf.push_bytes(
+                        credentials.compressed_certificate_message(
+                            self._certificate_compression_algorithm
+                        )
+                    )
+                else:
+                    handshake_buf.push_bytes(credentials.certificate_message)
 
             # send certificate verify
-            signature = self.certificate_private_key.sign(
+            sign = partial(
+                self.certificate_private_key.sign,
                 self.key_schedule.certificate_verify_data(
                     b"TLS 1.3, server CertificateVerify"
                 ),
-                *signature_algorithm_params(signature_algorithm),
+                *credentials.signature_params[signature_algorithm],
             )
+            resume = partial(
+                self._server_send_finished, signature_algorithm, psk_key_exchange_mode
+            )
+
+            if self.handshake_executor is not None:
+                self._suspend(sign, resume)
+                return
+
+            signature = sign()
+        else:
+            signature = None
+
+        self._server_send_finished(
+            signature_algorithm,
+            psk_key_exchange_mode,
+            {Epoch.HANDSHAKE: handshake_buf, Epoch.ONE_RTT: onertt_buf},
+            signature,
+        )
+
+    def _server_send_finished(
+        self,
+        signature_algorithm: SignatureAlgorithm,
+        psk_key_exchange_mode: int | None,
+        output_buf: dict[Epoch, Buffer],
+        signature: bytes | None,
+    ) -> None:
+        handshake_buf = output_buf[Epoch.HANDSHAKE]
+        onertt_buf = output_buf[Epoch.ONE_RTT]
+
+        if signature is not None:
             with push_message(self.key_schedule, handshake_buf):
                 push_certificate_verify(
                     handshake_buf,
@@ -3046,26 +4616,78 @@ class Context:
         self.key_schedule.update_hash(buf.data)
 
         # create a new session ticket
-        if self.new_session_ticket_cb is not None and psk_key_exchange_mode is not None:
+        key_ring = self.session_ticket_key_ring
+        if psk_key_exchange_mode is not None and (
+            self.new_session_ticket_cb is not None or key_ring is not None
+        ):
             self._new_session_ticket = NewSessionTicket(
                 ticket_lifetime=86400,
                 ticket_age_add=struct.unpack("I", os.urandom(4))[0],
                 ticket_nonce=b"",
-                ticket=os.urandom(64),
+                ticket=os.urandom(64) if key_ring is None else b"",
                 max_early_data_size=self._max_early_data,
             )
+            ticket = self._build_session_ticket(
+                self._new_session_ticket, self.handshake_extensions
+            )
+            if key_ring is not None:
+                ticket.ticket = self._new_session_ticket.ticket = key_ring.seal(ticket)
 
             # send message
             push_new_session_ticket(onertt_buf, self._new_session_ticket)
 
             # notify application
-            ticket = self._build_session_ticket(
-                self._new_session_ticket, self.handshake_extensions
-            )
-            self.new_session_ticket_cb(ticket)
+            if self.new_session_ticket_cb is not None:
+                self.new_session_ticket_cb(ticket)
 
         self._set_state(State.SERVER_EXPECT_FINISHED)
 
+    def _server_send_hello_retry_request(
+        self,
+        peer_hello: ClientHello,
+        input_buf: Buffer,
+        output_buf: Buffer,
+        cipher_suite: CipherSuite,
+        supported_version: int,
+    ) -> None:
+        if self._hello_retry_cipher_suite is not None:
+            # RFC 8446 4.1.4: the second ClientHello lacks the requested group
+            raise AlertIllegalParameter("No supported key share")
+
+        group = negotiate(
+            [g for g in self._supported_groups if g in KEY_EXCHANGES],
+            peer_hello.supported_groups,
+            AlertHandshakeFailure("No supported group"),
+        )
+
+        buf = Buffer(capacity=96 + len(peer_hello.legacy_session_id))
+        buf.push_uint8(HandshakeType.SERVER_HELLO)
+        with push_block(buf, 3):
+            buf.push_uint16(TLS_VERSION_1_2)
+            buf.push_bytes(HELLO_RETRY_REQUEST_RANDOM)
+            push_opaque(buf, 1, peer_hello.legacy_session_id)
+            buf.push_uint16(cipher_suite)
+            buf.push_uint8(CompressionMethod.NULL)
+            with push_block(buf, 2):
+                with push_extension(buf, ExtensionType.SUPPORTED_VERSIONS):
+                    buf.push_uint16(supported_version)
+                with push_extension(buf, ExtensionType.KEY_SHARE):
+                    buf.push_uint16(group)
+        output_buf.push_bytes(buf.data)
+
+        # the first ClientHello is replaced by its hash (RFC 8446 4.4.1)
+        key_schedule = KeySchedule(cipher_suite)
+        key_schedule.update_hash(input_buf.data)
+        client_hello_hash = key_schedule.transcript()
+        self._hello_retry_cipher_suite = cipher_suite
+        self._hello_retry_client_hello = peer_hello
+        self._hello_retry_group = group
+        self._hello_retry_transcript = (
+            bytes([HandshakeType.MESSAGE_HASH, 0, 0, len(client_hello_hash)])
+            + client_hello_hash
+            + buf.data
+        )
+
     def _server_handle_finished(self, input_buf: Buffer, output_buf: Buffer) -> None:
         finished = pull_finished(input_buf)
 
@@ -60,13 +60,20 @@ pub struct X25519ML768KeyExchange {
 #[pymethods]
 impl X25519ML768KeyExchange {
     #[new]
-    pub fn py_new() -> PyResult<Self> {
-        let x25519_pk = match agreement::PrivateKey::generate(&agreement::X25519) {
+    pub fn py_new(py: Python<'_>) -> PyResult<Self> {
+        let (x25519_pk, ml768_dk) = py.detach(|| {
+            (
+                agreement::PrivateKey::generate(&agreement::X25519),
+                kem::DecapsulationKey::generate(&ML_KEM_768),
+            )
+        });
+
+        let x25519_pk = match x25519_pk {
             Ok(key) => key,
             Err(_) => return Err(CryptoError::new_err("Unable to generate X25519 key")),
         };
 
-        let ml768_dk = match kem::DecapsulationKey::generate(&ML_KEM_768) {
+        let ml768_dk = match ml768_dk {
             Ok(key) => key,
             Err(_) => {
                 return Err(CryptoError::new_err(
@@ -234,8 +241,8 @@ impl X25519ML768KeyExchange {
 #[pymethods]
 impl X25519KeyExchange {
     #[new]
-    pub fn py_new() -> PyResult<Self> {
-        let x25519_pk = match agreement::PrivateKey::generate(&agreement::X25519) {
+    pub fn py_new(py: Python<'_>) -> PyResult<Self> {
+        let x25519_pk = match py.detach(|| agreement::PrivateKey::generate(&agreement::X25519)) {
             Ok(key) => key,
             Err(_) => return Err(CryptoError::new_err("Unable to generate X25519 key")),
         };
@@ -281,8 +288,8 @@ impl X25519KeyExchange {
 #[pymethods]
 impl ECDHP256KeyExchange {
     #[new]
-    pub fn py_new() -> PyResult<Self> {
-        let ecdh_key = match agreement::PrivateKey::generate(&agreement::ECDH_P256) {
+    pub fn py_new(py: Python<'_>) -> PyResult<Self> {
+        let ecdh_key = match py.detach(|| agreement::PrivateKey::generate(&agreement::ECDH_P256)) {
             Ok(key) => key,
             Err(_) => return Err(CryptoError::new_err("Unable to generate ECDH p256 key")),
         };
@@ -328,8 +335,8 @@ impl ECDHP256KeyExchange {
 #[pymethods]
 impl ECDHP384KeyExchange {
     #[new]
-    pub fn py_new() -> PyResult<Self> {
-        let ecdh_key = match agreement::PrivateKey::generate(&agreement::ECDH_P384) {
+    pub fn py_new(py: Python<'_>) -> PyResult<Self> {
+        let ecdh_key = match py.detach(|| agreement::PrivateKey::generate(&agreement::ECDH_P384)) {
             Ok(key) => key,
             Err(_) => return Err(CryptoError::new_err("Unable to generate ECDH p384 key")),
         };
@@ -375,8 +382,8 @@ impl ECDHP384KeyExchange {
 #[pymethods]
 impl ECDHP521KeyExchange {
     #[new]
-    pub fn py_new() -> PyResult<Self> {
-        let ecdh_pk = match agreement::PrivateKey::generate(&agreement::ECDH_P521) {
+    pub fn py_new(py: Python<'_>) -> PyResult<Self> {
+        let ecdh_pk = match py.detach(|| agreement::PrivateKey::generate(&agreement::ECDH_P521)) {
             Ok(key) => key,
             Err(_) => return Err(CryptoError::new_err("Unable to generate ECDH p521 key")),
         };
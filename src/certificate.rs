@@ -448,7 +448,8 @@ impl ServerVerifier {
 
     #[allow(unreachable_code)]
     pub fn verify<'a>(
-        &mut self,
+        &self,
+        py: Python<'_>,
         peer: Bound<'a, PyBytes>,
         intermediaries: Vec<Bound<'a, PyBytes>>,
         server_name: String,
@@ -465,13 +466,16 @@ impl ServerVerifier {
 
         match parsed_name_res {
             Ok(parsed_name) => {
-                let res = self.inner.verify_server_cert(
-                    &peer_der,
-                    &intermediaries_der,
-                    &parsed_name,
-                    ocsp_response.as_bytes(),
-                    UnixTime::now(),
-                );
+                let ocsp_response = ocsp_response.as_bytes();
+                let res = py.detach(|| {
+                    self.inner.verify_server_cert(
+                        &peer_der,
+                        &intermediaries_der,
+                        &parsed_name,
+                        ocsp_response,
+                        UnixTime::now(),
+                    )
+                });
 
                 match res {
                     Ok(_) => Ok(()),
@@ -3,8 +3,9 @@ use crate::{CryptoError, ReasonFlags};
 use bincode::{deserialize, serialize};
 use pyo3::prelude::PyBytesMethods;
 use pyo3::types::{PyBytes, PyType};
-use pyo3::{pyclass, pymethods, Bound, PyResult, Python};
+use pyo3::{pyclass, pymethods, Bound, FromPyObject, PyResult, Python};
 use serde::{Deserialize, Serialize};
+use std::collections::HashMap;
 use x509_parser::certificate::X509Certificate;
 use x509_parser::prelude::FromDer;
 use x509_parser::prelude::ReasonCode as InternalCode;
@@ -15,6 +16,10 @@ use x509_parser::time::ASN1Time;
 #[derive(Clone, Serialize, Deserialize)]
 pub struct RevokedCertificate {
     serial_number: String,
+    /// Not serialized, so that the format stays readable by, and can read
+    /// the lists of, releases without it. Recomputed from `serial_number`.
+    #[serde(skip)]
+    raw_serial_number: Vec<u8>,
     reason: ReasonFlags,
     expired_at: i64,
 }
@@ -26,6 +31,11 @@ impl RevokedCertificate {
         &self.serial_number
     }
 
+    #[getter]
+    pub fn raw_serial_number<'py>(&self, py: Python<'py>) -> Bound<'py, PyBytes> {
+        PyBytes::new(py, &self.raw_serial_number)
+    }
+
     #[getter]
     pub fn reason(&self) -> ReasonFlags {
         self.reason
@@ -48,6 +58,8 @@ impl RevokedCertificate {
 #[derive(Clone, Serialize, Deserialize)]
 pub struct CertificateRevocationList {
     container: Vec<RevokedCertificate>,
+    #[serde(skip)]
+    index: HashMap<Vec<u8>, usize>,
     issuer: String,
     last_updated_at: i64,
     next_update_at: i64,
@@ -69,6 +81,7 @@ impl CertificateRevocationList {
 
                     revoked_list.push(RevokedCertificate {
                         serial_number: revoked.raw_serial_as_string(),
+                        raw_serial_number: revoked.raw_serial().to_vec(),
                         reason: match reason {
                             InternalCode::Unspecified => ReasonFlags::unspecified,
                             InternalCode::AACompromise => ReasonFlags::aa_compromise,
@@ -89,6 +102,7 @@ impl CertificateRevocationList {
                 }
 
                 Ok(CertificateRevocationList {
+                    index: index_serial_numbers(&revoked_list),
                     container: revoked_list,
                     issuer: format!("{}", crl.issuer()),
                     last_updated_at: crl.last_update().timestamp(),
@@ -124,14 +138,19 @@ impl CertificateRevocationList {
         }
     }
 
-    pub fn is_revoked(&self, serial_number: String) -> Option<RevokedCertificate> {
-        for revoked in &self.container {
-            if revoked.serial_number == serial_number {
-                return Some(revoked.clone());
-            }
-        }
+    pub fn is_revoked(&self, serial_number: SerialNumber<'_>) -> Option<RevokedCertificate> {
+        let raw_serial_number = match serial_number {
+            SerialNumber::Raw(raw) => raw.as_bytes().to_vec(),
+            SerialNumber::Text(text) => parse_serial_number(&text)?,
+        };
+
+        self.index
+            .get(&raw_serial_number)
+            .map(|&position| self.container[position].clone())
+    }
 
-        None
+    pub fn revoked_certificates(&self) -> Vec<RevokedCertificate> {
+        self.container.clone()
     }
 
     #[getter]
@@ -154,11 +173,49 @@ impl CertificateRevocationList {
     }
 
     pub fn serialize<'py>(&self, py: Python<'py>) -> PyResult<Bound<'py, PyBytes>> {
-        Ok(PyBytes::new(py, &serialize(&self).unwrap()))
+        match serialize(&self) {
+            Ok(encoded) => Ok(PyBytes::new(py, &encoded)),
+            Err(_) => Err(CryptoError::new_err("unable to serialize crl")),
+        }
     }
 
     #[classmethod]
     pub fn deserialize(_cls: Bound<'_, PyType>, encoded: Bound<'_, PyBytes>) -> PyResult<Self> {
-        Ok(deserialize(encoded.as_bytes()).unwrap())
+        let mut crl: CertificateRevocationList = match deserialize(encoded.as_bytes()) {
+            Ok(crl) => crl,
+            Err(_) => return Err(CryptoError::new_err("unable to deserialize crl")),
+        };
+        for revoked in crl.container.iter_mut() {
+            if revoked.serial_number.is_empty() {
+                continue;
+            }
+            revoked.raw_serial_number = match parse_serial_number(&revoked.serial_number) {
+                Some(raw_serial_number) => raw_serial_number,
+                None => return Err(CryptoError::new_err("unable to deserialize crl")),
+            };
+        }
+        crl.index = index_serial_numbers(&crl.container);
+        Ok(crl)
     }
 }
+
+/// A serial number, either raw or formatted as colon separated hex bytes.
+#[derive(FromPyObject)]
+pub enum SerialNumber<'py> {
+    Raw(Bound<'py, PyBytes>),
+    Text(String),
+}
+
+fn parse_serial_number(text: &str) -> Option<Vec<u8>> {
+    text.split(':')
+        .map(|byte| u8::from_str_radix(byte, 16).ok())
+        .collect()
+}
+
+fn index_serial_numbers(container: &[RevokedCertificate]) -> HashMap<Vec<u8>, usize> {
+    container
+        .iter()
+        .enumerate()
+        .map(|(position, revoked)| (revoked.raw_serial_number.clone(), position))
+        .collect()
+}
@@ -6,7 +6,7 @@ use aws_lc_rs::aead::{
 use pyo3::pymethods;
 use pyo3::types::PyBytes;
 use pyo3::types::PyBytesMethods;
-use pyo3::{pyclass, Bound, Py};
+use pyo3::{pyclass, Bound, Py, PyRef};
 use pyo3::{PyResult, Python};
 
 use crate::utils::write_uint_var;
@@ -19,6 +19,16 @@ use crate::CryptoError;
 const PACKET_NUMBER_LENGTH_MAX: usize = 4;
 const SAMPLE_LENGTH: usize = 16;
 
+/// A packet opened by open_batch: (plain_header, payload, packet_number).
+type OpenedPacket = (Vec<u8>, Vec<u8>, u64);
+type OpenBatchResult<'a> = Vec<Option<(Bound<'a, PyBytes>, Bound<'a, PyBytes>, u64)>>;
+
+enum OpenOutcome {
+    Opened(OpenedPacket),
+    Failed,
+    KeyUpdate,
+}
+
 /// Identifies which AEAD algorithm is in use, so we can recreate keys
 /// during key phase updates.
 #[derive(Clone, Copy)]
@@ -239,6 +249,60 @@ impl CryptoContext {
         }
     }
 
+    /// Decrypt a burst of short header packets, each spanning a whole
+    /// datagram, in a single call with the GIL released.
+    ///
+    /// Returns one (plain_header, payload, packet_number) entry per packet,
+    /// or None for packets which could not be decrypted. Packets using the
+    /// other key phase are first tried with the `previous` context. If that
+    /// fails the peer initiated a key update: decoding stops and the returned
+    /// list is shorter than `packets`, the caller must rotate keys and
+    /// resume from the first packet which was not returned.
+    #[pyo3(signature = (packets, encrypted_offset, expected_packet_number, previous=None))]
+    pub fn open_batch<'a>(
+        &self,
+        py: Python<'a>,
+        packets: Vec<Bound<'a, PyBytes>>,
+        encrypted_offset: usize,
+        expected_packet_number: u64,
+        previous: Option<PyRef<'a, CryptoContext>>,
+    ) -> PyResult<OpenBatchResult<'a>> {
+        let datagrams: Vec<&[u8]> = packets.iter().map(|p| p.as_bytes()).collect();
+        let previous = previous.as_deref();
+
+        let opened = py.detach(|| {
+            let mut expected = expected_packet_number;
+            let mut opened: Vec<Option<OpenedPacket>> = Vec::with_capacity(datagrams.len());
+            for packet in datagrams {
+                let result = match self.open_short(packet, encrypted_offset, expected, previous) {
+                    OpenOutcome::Opened(result) => Some(result),
+                    OpenOutcome::Failed => None,
+                    OpenOutcome::KeyUpdate => break,
+                };
+                if let Some((_, _, packet_number)) = &result {
+                    if *packet_number > expected {
+                        expected = packet_number + 1;
+                    }
+                }
+                opened.push(result);
+            }
+            opened
+        });
+
+        Ok(opened
+            .into_iter()
+            .map(|result| {
+                result.map(|(header, payload, packet_number)| {
+                    (
+                        PyBytes::new(py, &header),
+                        PyBytes::new(py, &payload),
+                        packet_number,
+                    )
+                })
+            })
+            .collect())
+    }
+
     /// Decrypt only the payload (AEAD) without HP removal.
     /// Used for key phase change fallback where HP was already removed.
     pub fn decrypt_payload<'a>(
@@ -358,12 +422,14 @@ impl CryptoContext {
     ///   peer_token: Token bytes (INITIAL packets only)
     ///   spin_bit: Spin bit value (short headers only)
     ///   packet_number: Packet number
+    ///   seal: Whether to encrypt and apply HP, when false the packet must
+    ///         later be passed to seal_batch
     ///
     /// Returns: sent_bytes (total size of the finalized encrypted packet)
     #[allow(clippy::too_many_arguments)]
     #[pyo3(signature = (buffer, packet_start, packet_size, padding_size, header_size,
                         is_long_header, version, packet_type, peer_cid, host_cid,
-                        peer_token, spin_bit, packet_number))]
+                        peer_token, spin_bit, packet_number, seal=true))]
     pub fn finalize_packet(
         &self,
         py: Python<'_>,
@@ -380,6 +446,7 @@ impl CryptoContext {
         peer_token: &[u8],
         spin_bit: u8,
         packet_number: u64,
+        seal: bool,
     ) -> PyResult<usize> {
         let mut buf_ref = buffer.borrow_mut(py);
         let buf_data = buf_ref.data_mut()?;
@@ -461,57 +528,201 @@ impl CryptoContext {
             buf_data[pos..pos + 2].copy_from_slice(&(packet_number as u16).to_be_bytes());
         }
 
-        // 3. AEAD encrypt payload in-place
+        // 3. AEAD encrypt payload in-place and apply header protection,
+        // unless the caller seals the packet later with seal_batch.
         let payload_len = payload_end - payload_start;
+        if seal {
+            let packet_end = payload_end + tag_len;
+            let packet = &mut buf_data[packet_start..packet_end];
+            py.detach(|| self.seal_in_place(packet, header_size, payload_len, packet_number))
+                .map_err(CryptoError::new_err)?;
+        }
+
+        // 4. Update buffer position
+        let sent_bytes = header_size + payload_len + tag_len;
+        buf_ref.set_pos(packet_start + sent_bytes);
+
+        Ok(sent_bytes)
+    }
+
+    /// Encrypt and apply header protection to packets whose header and
+    /// payload were laid out by finalize_packet(seal=False).
+    ///
+    /// Arguments:
+    ///   buffer: The packet builder's write buffer (must be Owned/mutable)
+    ///   packets: (packet_start, header_size, payload_size, packet_number)
+    ///            for each packet, the packets must not overlap
+    ///
+    /// The GIL is released while sealing.
+    pub fn seal_batch(
+        &self,
+        py: Python<'_>,
+        buffer: Py<Buffer>,
+        mut packets: Vec<(usize, usize, usize, u64)>,
+    ) -> PyResult<()> {
+        let mut buf_ref = buffer.borrow_mut(py);
+        let buf_data = buf_ref.data_mut()?;
+        let tag_len = self.key.algorithm().tag_len();
+
+        // Carve disjoint mutable slices, one per packet.
+        packets.sort_unstable_by_key(|p| p.0);
+        let mut jobs: Vec<(&mut [u8], usize, usize, u64)> = Vec::with_capacity(packets.len());
+        let mut rest: &mut [u8] = buf_data;
+        let mut consumed = 0;
+        for (packet_start, header_size, payload_len, packet_number) in packets {
+            let packet_len = header_size + payload_len + tag_len;
+            if packet_start < consumed || packet_start + packet_len > consumed + rest.len() {
+                return Err(CryptoError::new_err("Invalid packet bounds"));
+            }
+            let (_, tail) = std::mem::take(&mut rest).split_at_mut(packet_start - consumed);
+            let (packet, tail) = tail.split_at_mut(packet_len);
+            jobs.push((packet, header_size, payload_len, packet_number));
+            rest = tail;
+            consumed = packet_start + packet_len;
+        }
+
+        py.detach(|| self.seal_jobs(&mut jobs))
+            .map_err(CryptoError::new_err)
+    }
+}
+
+impl CryptoContext {
+    /// Remove header protection from a short header packet and decrypt it,
+    /// using the `previous` context for packets from the other key phase.
+    fn open_short(
+        &self,
+        packet: &[u8],
+        encrypted_offset: usize,
+        expected_packet_number: u64,
+        previous: Option<&CryptoContext>,
+    ) -> OpenOutcome {
+        let sample_offset = encrypted_offset + PACKET_NUMBER_LENGTH_MAX;
+        if packet.len() < sample_offset + SAMPLE_LENGTH || packet[0] & 0x80 != 0 {
+            return OpenOutcome::Failed;
+        }
+
+        let mask = match self
+            .hpk
+            .new_mask(&packet[sample_offset..sample_offset + SAMPLE_LENGTH])
+        {
+            Ok(mask) => mask,
+            Err(_) => return OpenOutcome::Failed,
+        };
+
+        let pn_offset = encrypted_offset;
+        let mut header = packet[..pn_offset].to_vec();
+        header[0] ^= mask[0] & 0x1F;
+        let pn_length = (header[0] & 0x03) as usize + 1;
+        let mut pn_truncated: u64 = 0;
+        for i in 0..pn_length {
+            let byte = packet[pn_offset + i] ^ mask[1 + i];
+            header.push(byte);
+            pn_truncated = (pn_truncated << 8) | byte as u64;
+        }
+        let packet_number = decode_packet_number_internal(
+            pn_truncated,
+            (pn_length * 8) as u8,
+            expected_packet_number,
+        );
+
+        let ciphertext = &packet[pn_offset + pn_length..];
+        let key_phase = (header[0] & 4) >> 2;
+        let payload = if key_phase == self.key_phase {
+            // Reordered packets may still use the previous key phase.
+            match self.open_payload(ciphertext, &header, packet_number) {
+                Some(payload) => Some(payload),
+                None => previous.and_then(|p| p.open_payload(ciphertext, &header, packet_number)),
+            }
+        } else {
+            match previous.and_then(|p| p.open_payload(ciphertext, &header, packet_number)) {
+                Some(payload) => Some(payload),
+                None => return OpenOutcome::KeyUpdate,
+            }
+        };
+
+        match payload {
+            Some(payload) => OpenOutcome::Opened((header, payload, packet_number)),
+            None => OpenOutcome::Failed,
+        }
+    }
+
+    fn open_payload(
+        &self,
+        ciphertext: &[u8],
+        header: &[u8],
+        packet_number: u64,
+    ) -> Option<Vec<u8>> {
         let nonce = QuicNonce::new(&self.iv, packet_number);
+        let mut in_out_buffer = ciphertext.to_vec();
+        let plaintext_len = self
+            .key
+            .open_in_place(
+                Nonce::assume_unique_for_key(nonce.0),
+                Aad::from(header),
+                &mut in_out_buffer,
+            )
+            .ok()?
+            .len();
+        in_out_buffer.truncate(plaintext_len);
+        Some(in_out_buffer)
+    }
 
-        // Build AAD from the header we just wrote
-        let (header_slice, payload_slice) = buf_data[packet_start..].split_at_mut(header_size);
-        let aad = Aad::from(&*header_slice);
-        let res = py.detach(|| {
-            self.key.seal_in_place_separate_tag(
+    fn seal_jobs(&self, jobs: &mut [(&mut [u8], usize, usize, u64)]) -> Result<(), &'static str> {
+        for (packet, header_size, payload_len, packet_number) in jobs.iter_mut() {
+            self.seal_in_place(packet, *header_size, *payload_len, *packet_number)?;
+        }
+        Ok(())
+    }
+
+    /// AEAD encrypt the payload of a packet laid out in `packet`
+    /// (header, payload, room for the tag) and apply header protection.
+    fn seal_in_place(
+        &self,
+        packet: &mut [u8],
+        header_size: usize,
+        payload_len: usize,
+        packet_number: u64,
+    ) -> Result<(), &'static str> {
+        let tag_len = self.key.algorithm().tag_len();
+        if header_size == 0 || packet.len() < header_size + payload_len + tag_len {
+            return Err("Invalid packet bounds");
+        }
+        let nonce = QuicNonce::new(&self.iv, packet_number);
+
+        let (header_slice, payload_slice) = packet.split_at_mut(header_size);
+        let tag = self
+            .key
+            .seal_in_place_separate_tag(
                 Nonce::assume_unique_for_key(nonce.0),
-                aad,
+                Aad::from(&*header_slice),
                 &mut payload_slice[..payload_len],
             )
-        });
-        match res {
-            Ok(tag) => {
-                payload_slice[payload_len..payload_len + tag_len].copy_from_slice(tag.as_ref());
-            }
-            Err(_) => return Err(CryptoError::new_err("Encryption failed")),
-        }
+            .map_err(|_| "Encryption failed")?;
+        payload_slice[payload_len..payload_len + tag_len].copy_from_slice(tag.as_ref());
 
-        // 4. Apply Header Protection
-        let pn_length = PN_SEND_SIZE;
-        let pn_offset = header_size - pn_length;
+        // Header protection, the sample is taken as if the packet number
+        // was PACKET_NUMBER_LENGTH_MAX bytes long.
+        let pn_length = (header_slice[0] & 0x03) as usize + 1;
         let sample_offset = PACKET_NUMBER_LENGTH_MAX - pn_length;
-
-        // Recompute header/payload split for HP (need fresh references)
-        let buf_slice = &mut buf_data[packet_start..];
-        let encrypted_payload = &buf_slice[header_size..];
+        if pn_length > header_size || payload_slice.len() < sample_offset + SAMPLE_LENGTH {
+            return Err("Invalid packet bounds");
+        }
+        let pn_offset = header_size - pn_length;
         let mask = self
             .hpk
-            .new_mask(&encrypted_payload[sample_offset..sample_offset + SAMPLE_LENGTH])
-            .map_err(|_| CryptoError::new_err("HP mask computation failed"))?;
+            .new_mask(&payload_slice[sample_offset..sample_offset + SAMPLE_LENGTH])
+            .map_err(|_| "HP mask computation failed")?;
 
-        // Apply mask to first byte
-        if buf_slice[0] & 0x80 != 0 {
-            buf_slice[0] ^= mask[0] & 0x0F;
+        if header_slice[0] & 0x80 != 0 {
+            header_slice[0] ^= mask[0] & 0x0F;
         } else {
-            buf_slice[0] ^= mask[0] & 0x1F;
+            header_slice[0] ^= mask[0] & 0x1F;
         }
-
-        // Apply mask to PN bytes
         for i in 0..pn_length {
-            buf_slice[pn_offset + i] ^= mask[1 + i];
+            header_slice[pn_offset + i] ^= mask[1 + i];
         }
 
-        // 5. Update buffer position
-        let sent_bytes = header_size + payload_len + tag_len;
-        buf_ref.set_pos(packet_start + sent_bytes);
-
-        Ok(sent_bytes)
+        Ok(())
     }
 }
 
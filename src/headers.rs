@@ -104,6 +104,100 @@ impl QpackEncoder {
     }
 }
 
+/// Kinds of header lists validated by `QpackDecoder.feed_header`.
+const KIND_REQUEST: u8 = 1;
+const KIND_RESPONSE: u8 = 2;
+const KIND_PUSH_PROMISE: u8 = 3;
+const KIND_TRAILERS: u8 = 4;
+
+/// Pseudo-headers extracted from a valid header list: (method, path, status).
+type PseudoHeaders<'a> = (Option<&'a str>, Option<&'a str>, Option<u16>);
+
+/// Validate a decoded header list the way `qh3.h3.connection.validate_headers`
+/// does (RFC 9114 4.3), returning its pseudo-headers.
+///
+/// `None` is returned for an invalid list, the caller then validates it
+/// again in Python to report the exact error.
+fn validate_headers<'a>(
+    headers: impl Iterator<Item = (&'a str, &'a str)>,
+    kind: u8,
+) -> Option<PseudoHeaders<'a>> {
+    let (allowed, required): (&[&str], &[&str]) = match kind {
+        KIND_REQUEST => (
+            &[":method", ":scheme", ":authority", ":path", ":protocol"],
+            &[":method", ":authority"],
+        ),
+        KIND_RESPONSE => (&[":status"], &[":status"]),
+        KIND_PUSH_PROMISE => (
+            &[":method", ":scheme", ":authority", ":path"],
+            &[":method", ":scheme", ":authority", ":path"],
+        ),
+        KIND_TRAILERS => (&[], &[]),
+        _ => return None,
+    };
+
+    let mut seen = [false; 5];
+    let mut after_pseudo_headers = false;
+    let mut authority = None;
+    let mut method = None;
+    let mut path = None;
+    let mut scheme = None;
+    let mut status = None;
+
+    for (name, value) in headers {
+        if name.bytes().any(|b| b.is_ascii_uppercase()) {
+            return None;
+        }
+        if !name.starts_with(':') {
+            after_pseudo_headers = true;
+            continue;
+        }
+        if after_pseudo_headers {
+            return None;
+        }
+        let index = allowed.iter().position(|allowed| *allowed == name)?;
+        if seen[index] {
+            return None;
+        }
+        seen[index] = true;
+        match name {
+            ":authority" => authority = Some(value),
+            ":method" => method = Some(value),
+            ":path" => path = Some(value),
+            ":scheme" => scheme = Some(value),
+            ":status" => status = Some(value),
+            _ => {}
+        }
+    }
+
+    for name in required {
+        if !allowed
+            .iter()
+            .position(|allowed| allowed == name)
+            .is_some_and(|index| seen[index])
+        {
+            return None;
+        }
+    }
+
+    if matches!(scheme, Some("http") | Some("https"))
+        && (authority.map_or(true, str::is_empty) || path.map_or(true, str::is_empty))
+    {
+        return None;
+    }
+
+    let status = match status {
+        // leave the lenient parsing of int() to Python
+        Some(value) if !value.is_empty() && value.bytes().all(|b| b.is_ascii_digit()) => {
+            Some(value.parse::<u16>().ok()?)
+        }
+        Some(_) => return None,
+        None => None,
+    };
+
+    Some((method, path, status))
+}
+
 #[pymethods]
 impl QpackDecoder {
     #[new]
@@ -126,11 +220,16 @@ impl QpackDecoder {
         }
     }
 
+    /// Decode a header block, returning the decoder stream instructions, the
+    /// header list and, when `kind` asks for it to be validated and it is
+    /// valid, its (method, path, status) pseudo-headers.
+    #[pyo3(signature = (stream_id, data, kind=0))]
     pub fn feed_header<'a>(
         &mut self,
         py: Python<'a>,
         stream_id: u64,
         data: Bound<'_, PyBytes>,
+        kind: u8,
     ) -> PyResult<Bound<'a, PyTuple>> {
         let input_data = data.as_bytes();
 
@@ -157,6 +256,25 @@ impl QpackDecoder {
                     );
                 }
 
+                let pseudo_headers = if kind != 0 {
+                    validate_headers(
+                        buffer
+                            .headers()
+                            .iter()
+                            .map(|header| (header.name(), header.value())),
+                        kind,
+                    )
+                    .map(|(method, path, status)| {
+                        (
+                            method.map(|value| PyBytes::new(py, value.as_bytes())),
+                            path.map(|value| PyBytes::new(py, value.as_bytes())),
+                            status,
+                        )
+                    })
+                } else {
+                    None
+                };
+
                 Ok(PyTuple::new(
                     py,
                     [
@@ -164,6 +282,7 @@ impl QpackDecoder {
                             .into_pyobject(py)?
                             .into_any(),
                         decoded_headers.into_pyobject(py)?.into_any(),
+                        pseudo_headers.into_pyobject(py)?.into_any(),
                     ],
                 )
                 .unwrap())
@@ -0,0 +1,294 @@
+use aws_lc_rs::{digest, hmac};
+
+use pyo3::exceptions::PyValueError;
+use pyo3::types::PyBytes;
+use pyo3::{pyclass, pyfunction, pymethods, Bound};
+use pyo3::{PyResult, Python};
+
+/// Hash function driving HKDF and the transcript, selected by its
+/// output size in bits (256, 384 or 512) as in qh3.tls.CIPHER_SUITES.
+#[derive(Clone, Copy)]
+struct HashAlgorithm {
+    digest: &'static digest::Algorithm,
+    hmac: hmac::Algorithm,
+}
+
+impl HashAlgorithm {
+    #[inline]
+    fn output_len(&self) -> usize {
+        self.digest.output_len()
+    }
+}
+
+#[inline]
+fn resolve_hash_algorithm(algorithm: u16) -> PyResult<HashAlgorithm> {
+    match algorithm {
+        256 => Ok(HashAlgorithm {
+            digest: &digest::SHA256,
+            hmac: hmac::HMAC_SHA256,
+        }),
+        384 => Ok(HashAlgorithm {
+            digest: &digest::SHA384,
+            hmac: hmac::HMAC_SHA384,
+        }),
+        512 => Ok(HashAlgorithm {
+            digest: &digest::SHA512,
+            hmac: hmac::HMAC_SHA512,
+        }),
+        _ => Err(PyValueError::new_err(format!(
+            "Unsupported hash algorithm sha{algorithm}"
+        ))),
+    }
+}
+
+#[inline]
+fn hkdf_extract_internal(alg: HashAlgorithm, salt: &[u8], key_material: &[u8]) -> hmac::Tag {
+    hmac::sign(&hmac::Key::new(alg.hmac, salt), key_material)
+}
+
+/// HKDF-Expand-Label (RFC 8446 7.1) writing `out.len()` bytes into `out`.
+fn hkdf_expand_label_into(
+    alg: HashAlgorithm,
+    secret: &[u8],
+    label: &[u8],
+    hash_value: &[u8],
+    out: &mut [u8],
+) -> PyResult<()> {
+    let max_length = 255 * alg.output_len();
+    if out.len() > max_length {
+        return Err(PyValueError::new_err(format!(
+            "Cannot derive keys larger than {max_length} octets."
+        )));
+    }
+    if label.len() > 255 - 6 || hash_value.len() > 255 {
+        return Err(PyValueError::new_err("HKDF label too long"));
+    }
+
+    // struct HkdfLabel { uint16 length; opaque label<7..255>; opaque context<0..255>; }
+    let mut info = Vec::with_capacity(4 + 6 + label.len() + hash_value.len());
+    info.extend_from_slice(&(out.len() as u16).to_be_bytes());
+    info.push((6 + label.len()) as u8);
+    info.extend_from_slice(b"tls13 ");
+    info.extend_from_slice(label);
+    info.push(hash_value.len() as u8);
+    info.extend_from_slice(hash_value);
+
+    let key = hmac::Key::new(alg.hmac, secret);
+    let mut previous: Option<hmac::Tag> = None;
+    for (i, chunk) in out.chunks_mut(alg.output_len()).enumerate() {
+        let mut ctx = hmac::Context::with_key(&key);
+        if let Some(tag) = &previous {
+            ctx.update(tag.as_ref());
+        }
+        ctx.update(&info);
+        ctx.update(&[(i + 1) as u8]);
+        let tag = ctx.sign();
+        chunk.copy_from_slice(&tag.as_ref()[..chunk.len()]);
+        previous = Some(tag);
+    }
+
+    Ok(())
+}
+
+#[inline]
+fn hkdf_expand_label_vec(
+    alg: HashAlgorithm,
+    secret: &[u8],
+    label: &[u8],
+    hash_value: &[u8],
+    length: usize,
+) -> PyResult<Vec<u8>> {
+    let mut out = vec![0u8; length];
+    hkdf_expand_label_into(alg, secret, label, hash_value, &mut out)?;
+    Ok(out)
+}
+
+#[pyfunction]
+pub fn hkdf_extract<'a>(
+    py: Python<'a>,
+    algorithm: u16,
+    salt: &[u8],
+    key_material: &[u8],
+) -> PyResult<Bound<'a, PyBytes>> {
+    let alg = resolve_hash_algorithm(algorithm)?;
+    Ok(PyBytes::new(
+        py,
+        hkdf_extract_internal(alg, salt, key_material).as_ref(),
+    ))
+}
+
+#[pyfunction]
+pub fn hkdf_expand_label<'a>(
+    py: Python<'a>,
+    algorithm: u16,
+    secret: &[u8],
+    label: &[u8],
+    hash_value: &[u8],
+    length: usize,
+) -> PyResult<Bound<'a, PyBytes>> {
+    let alg = resolve_hash_algorithm(algorithm)?;
+    let out = hkdf_expand_label_vec(alg, secret, label, hash_value, length)?;
+    Ok(PyBytes::new(py, &out))
+}
+
+/// Derive the QUIC packet protection key, IV and header protection key
+/// from a traffic secret (RFC 9001 5.1). `prefix` is b"quic" for QUIC v1
+/// and b"quicv2" for QUIC v2.
+#[pyfunction]
+pub fn quic_derive_key_iv_hp<'a>(
+    py: Python<'a>,
+    algorithm: u16,
+    secret: &[u8],
+    key_size: usize,
+    prefix: &[u8],
+) -> PyResult<(Bound<'a, PyBytes>, Bound<'a, PyBytes>, Bound<'a, PyBytes>)> {
+    let alg = resolve_hash_algorithm(algorithm)?;
+    let mut label = Vec::with_capacity(prefix.len() + 4);
+
+    let mut derive = |suffix: &[u8], length: usize| -> PyResult<Bound<'a, PyBytes>> {
+        label.clear();
+        label.extend_from_slice(prefix);
+        label.extend_from_slice(suffix);
+        PyBytes::new_with(py, length, |out| {
+            hkdf_expand_label_into(alg, secret, &label, b"", out)
+        })
+    };
+
+    let key = derive(b" key", key_size)?;
+    let iv = derive(b" iv", 12)?;
+    let hp = derive(b" hp", key_size)?;
+    Ok((key, iv, hp))
+}
+
+/// TLS 1.3 key schedule (RFC 8446 7.1) along with the handshake
+/// transcript hash.
+#[pyclass(module = "qh3._hazmat")]
+pub struct KeySchedule {
+    alg: HashAlgorithm,
+    transcript: digest::Context,
+    secret: Vec<u8>,
+    generation: u32,
+}
+
+impl KeySchedule {
+    #[inline]
+    fn transcript_hash(&self) -> digest::Digest {
+        self.transcript.clone().finish()
+    }
+}
+
+#[pymethods]
+impl KeySchedule {
+    #[new]
+    pub fn py_new(algorithm: u16) -> PyResult<Self> {
+        let alg = resolve_hash_algorithm(algorithm)?;
+        Ok(KeySchedule {
+            alg,
+            transcript: digest::Context::new(alg.digest),
+            secret: vec![0u8; alg.output_len()],
+            generation: 0,
+        })
+    }
+
+    #[getter]
+    pub fn generation(&self) -> u32 {
+        self.generation
+    }
+
+    #[getter]
+    pub fn digest_size(&self) -> usize {
+        self.alg.output_len()
+    }
+
+    /// Current secret of the key schedule.
+    #[getter]
+    pub fn secret<'a>(&self, py: Python<'a>) -> Bound<'a, PyBytes> {
+        PyBytes::new(py, &self.secret)
+    }
+
+    /// Current transcript hash.
+    pub fn transcript<'a>(&self, py: Python<'a>) -> Bound<'a, PyBytes> {
+        PyBytes::new(py, self.transcript_hash().as_ref())
+    }
+
+    pub fn update_hash(&mut self, data: &[u8]) {
+        self.transcript.update(data);
+    }
+
+    /// Restart the transcript from `data`, e.g. with the inner
+    /// ClientHello once ECH was accepted.
+    pub fn reset_hash(&mut self, data: &[u8]) {
+        self.transcript = digest::Context::new(self.alg.digest);
+        self.transcript.update(data);
+    }
+
+    #[pyo3(signature = (key_material=None))]
+    pub fn extract(&mut self, key_material: Option<&[u8]>) -> PyResult<()> {
+        let zeros;
+        let key_material = match key_material {
+            Some(key_material) => key_material,
+            None => {
+                zeros = vec![0u8; self.alg.output_len()];
+                &zeros
+            }
+        };
+
+        if self.generation > 0 {
+            let empty_hash = digest::digest(self.alg.digest, b"");
+            self.secret = hkdf_expand_label_vec(
+                self.alg,
+                &self.secret,
+                b"derived",
+                empty_hash.as_ref(),
+                self.alg.output_len(),
+            )?;
+        }
+
+        self.generation += 1;
+        self.secret = hkdf_extract_internal(self.alg, &self.secret, key_material)
+            .as_ref()
+            .to_vec();
+        Ok(())
+    }
+
+    pub fn derive_secret<'a>(&self, py: Python<'a>, label: &[u8]) -> PyResult<Bound<'a, PyBytes>> {
+        let transcript = self.transcript_hash();
+        PyBytes::new_with(py, self.alg.output_len(), |out| {
+            hkdf_expand_label_into(self.alg, &self.secret, label, transcript.as_ref(), out)
+        })
+    }
+
+    pub fn finished_verify_data<'a>(
+        &self,
+        py: Python<'a>,
+        secret: &[u8],
+    ) -> PyResult<Bound<'a, PyBytes>> {
+        let hmac_key =
+            hkdf_expand_label_vec(self.alg, secret, b"finished", b"", self.alg.output_len())?;
+        let tag = hmac::sign(
+            &hmac::Key::new(self.alg.hmac, &hmac_key),
+            self.transcript_hash().as_ref(),
+        );
+        Ok(PyBytes::new(py, tag.as_ref()))
+    }
+
+    pub fn certificate_verify_data<'a>(
+        &self,
+        py: Python<'a>,
+        context_string: &[u8],
+    ) -> PyResult<Bound<'a, PyBytes>> {
+        let transcript = self.transcript_hash();
+        let transcript = transcript.as_ref();
+        PyBytes::new_with(
+            py,
+            64 + context_string.len() + 1 + transcript.len(),
+            |out| {
+                out[..64].fill(b' ');
+                out[64..64 + context_string.len()].copy_from_slice(context_string);
+                out[64 + context_string.len()] = 0;
+                out[65 + context_string.len()..].copy_from_slice(transcript);
+                Ok(())
+            },
+        )
+    }
+}
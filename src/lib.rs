@@ -12,6 +12,7 @@ mod headers;
 mod hpk;
 mod hpke;
 mod intldomain;
+mod key_schedule;
 mod ocsp;
 mod packet;
 mod pkcs8;
@@ -19,7 +20,9 @@ mod private_key;
 mod rangeset;
 mod recovery;
 mod rsa;
+mod stream_receiver;
 mod stream_sender;
+mod tls_codec;
 mod udp;
 mod utils;
 mod verify;
@@ -44,6 +47,7 @@ pub use self::headers::{
 pub use self::hpk::QUICHeaderProtection;
 pub use self::hpke::HpkeContext;
 pub use self::intldomain::{idna_decode, idna_encode};
+pub use self::key_schedule::{hkdf_expand_label, hkdf_extract, quic_derive_key_iv_hp, KeySchedule};
 pub use self::ocsp::{OCSPCertStatus, OCSPRequest, OCSPResponse, OCSPResponseStatus, ReasonFlags};
 pub use self::packet::pull_ack_frame;
 pub use self::packet::pull_crypto_frame;
@@ -61,7 +65,11 @@ pub use self::private_key::{
 pub use self::rangeset::RangeSet;
 pub use self::recovery::{QuicPacketPacer, QuicRttMonitor};
 pub use self::rsa::Rsa;
-pub use self::stream_sender::QuicStreamSender;
+pub use self::stream_receiver::{FinalSizeError, QuicStreamReceiver};
+pub use self::stream_sender::{fill_stream_frames, QuicStreamSender};
+pub use self::tls_codec::{
+    pull_client_hello, push_certificate, push_encrypted_extensions, push_server_hello,
+};
 pub use self::udp::PyUdpSocketState;
 pub use self::utils::decode_packet_number;
 
@@ -118,6 +126,11 @@ fn _hazmat(py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_class::<QUICHeaderProtection>()?;
     // Crypto context (HP + AEAD)
     m.add_class::<CryptoContext>()?;
+    // TLS 1.3 key schedule
+    m.add_class::<KeySchedule>()?;
+    m.add_function(wrap_pyfunction!(hkdf_extract, m)?)?;
+    m.add_function(wrap_pyfunction!(hkdf_expand_label, m)?)?;
+    m.add_function(wrap_pyfunction!(quic_derive_key_iv_hp, m)?)?;
     // Private&Public Key Mgmt
     m.add_class::<RsaPrivateKey>()?;
     m.add_class::<DsaPrivateKey>()?;
@@ -165,6 +178,15 @@ fn _hazmat(py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(push_crypto_frame_body, m)?)?;
     // Stream sender
     m.add_class::<QuicStreamSender>()?;
+    m.add_function(wrap_pyfunction!(fill_stream_frames, m)?)?;
+    // Stream receiver
+    m.add("FinalSizeError", py.get_type::<FinalSizeError>())?;
+    m.add_class::<QuicStreamReceiver>()?;
+    // TLS handshake messages (server flight)
+    m.add_function(wrap_pyfunction!(pull_client_hello, m)?)?;
+    m.add_function(wrap_pyfunction!(push_server_hello, m)?)?;
+    m.add_function(wrap_pyfunction!(push_encrypted_extensions, m)?)?;
+    m.add_function(wrap_pyfunction!(push_certificate, m)?)?;
     // UDP socket state (quinn-udp bridge for GRO/GSO)
     m.add_class::<PyUdpSocketState>()?;
     Ok(())
@@ -63,7 +63,8 @@ impl Ed25519PrivateKey {
     }
 
     pub fn sign<'a>(&self, py: Python<'a>, data: Bound<'_, PyBytes>) -> Bound<'a, PyBytes> {
-        let signature = self.inner.sign(data.as_bytes());
+        let data = data.as_bytes();
+        let signature = py.detach(|| self.inner.sign(data));
 
         PyBytes::new(py, signature.as_ref())
     }
@@ -121,8 +122,8 @@ impl EcPrivateKey {
         py: Python<'a>,
         data: Bound<'_, PyBytes>,
     ) -> PyResult<Bound<'a, PyBytes>> {
-        let rng = SystemRandom::new();
-        let signature = match self.inner.sign(&rng, data.as_bytes()) {
+        let data = data.as_bytes();
+        let signature = match py.detach(|| self.inner.sign(&SystemRandom::new(), data)) {
             Ok(signature) => signature,
             Err(_) => return Err(CryptoError::new_err("Ec signature could not be issued")),
         };
@@ -153,9 +154,10 @@ impl DsaPrivateKey {
     }
 
     pub fn sign<'a>(&self, py: Python<'a>, data: Bound<'_, PyBytes>) -> Bound<'a, PyBytes> {
-        let signature = self.inner.sign(data.as_bytes());
+        let data = data.as_bytes();
+        let signature = py.detach(|| self.inner.sign(data).to_bytes());
 
-        PyBytes::new(py, &signature.to_bytes())
+        PyBytes::new(py, &signature)
     }
 
     pub fn public_key<'a>(&self, py: Python<'a>) -> Bound<'a, PyBytes> {
@@ -189,44 +191,39 @@ impl RsaPrivateKey {
         is_pss_padding: bool,
         hash_size: u32,
     ) -> PyResult<Bound<'a, PyBytes>> {
-        let private_key = self.inner.clone();
-
-        match is_pss_padding {
-            true => match hash_size {
-                256 => {
-                    let signer = InternalRsaPssSigningKey::<Sha256>::new(private_key);
-                    Ok(PyBytes::new(py, &signer.sign(data.as_bytes()).to_vec()))
-                }
-                384 => {
-                    let signer = InternalRsaPssSigningKey::<Sha384>::new(private_key);
-                    Ok(PyBytes::new(py, &signer.sign(data.as_bytes()).to_vec()))
-                }
-                512 => {
-                    let signer = InternalRsaPssSigningKey::<Sha512>::new(private_key);
-                    Ok(PyBytes::new(py, &signer.sign(data.as_bytes()).to_vec()))
-                }
-                _ => Err(CryptoError::new_err(
-                    "unsupported hash size for RSA signing",
-                )),
-            },
-            false => match hash_size {
-                256 => {
-                    let signer = InternalRsaPkcsSigningKey::<Sha256>::new(private_key);
-                    Ok(PyBytes::new(py, &signer.sign(data.as_bytes()).to_vec()))
-                }
-                384 => {
-                    let signer = InternalRsaPkcsSigningKey::<Sha384>::new(private_key);
-                    Ok(PyBytes::new(py, &signer.sign(data.as_bytes()).to_vec()))
+        let data = data.as_bytes();
+
+        // RSA private key operations take about a millisecond, let other
+        // threads run meanwhile.
+        let signature = py
+            .detach(|| {
+                let private_key = self.inner.clone();
+
+                match (is_pss_padding, hash_size) {
+                    (true, 256) => Ok(InternalRsaPssSigningKey::<Sha256>::new(private_key)
+                        .sign(data)
+                        .to_vec()),
+                    (true, 384) => Ok(InternalRsaPssSigningKey::<Sha384>::new(private_key)
+                        .sign(data)
+                        .to_vec()),
+                    (true, 512) => Ok(InternalRsaPssSigningKey::<Sha512>::new(private_key)
+                        .sign(data)
+                        .to_vec()),
+                    (false, 256) => Ok(InternalRsaPkcsSigningKey::<Sha256>::new(private_key)
+                        .sign(data)
+                        .to_vec()),
+                    (false, 384) => Ok(InternalRsaPkcsSigningKey::<Sha384>::new(private_key)
+                        .sign(data)
+                        .to_vec()),
+                    (false, 512) => Ok(InternalRsaPkcsSigningKey::<Sha512>::new(private_key)
+                        .sign(data)
+                        .to_vec()),
+                    _ => Err("unsupported hash size for RSA signing"),
                 }
-                512 => {
-                    let signer = InternalRsaPkcsSigningKey::<Sha512>::new(private_key);
-                    Ok(PyBytes::new(py, &signer.sign(data.as_bytes()).to_vec()))
-                }
-                _ => Err(CryptoError::new_err(
-                    "unsupported hash size for RSA signing",
-                )),
-            },
-        }
+            })
+            .map_err(CryptoError::new_err)?;
+
+        Ok(PyBytes::new(py, &signature))
     }
 
     pub fn public_key<'a>(&self, py: Python<'a>) -> Bound<'a, PyBytes> {
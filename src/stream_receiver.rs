@@ -0,0 +1,437 @@
+use std::collections::BTreeMap;
+
+use pyo3::exceptions::PyException;
+use pyo3::prelude::*;
+use pyo3::types::PyBytes;
+
+const DELIVERY_ACKED: u8 = 0;
+
+pyo3::create_exception!(_hazmat, FinalSizeError, PyException);
+
+/// A piece of a received frame, held until the data preceding it arrives.
+///
+/// It references the frame's `bytes` object instead of copying it, unless
+/// the piece is less than half of the frame, see `QuicStreamReceiver::insert`.
+struct Chunk {
+    data: Py<PyBytes>,
+    /// Where the piece starts within `data`.
+    start: usize,
+    len: usize,
+}
+
+impl Chunk {
+    /// The piece's data, `data` itself when the piece spans all of it.
+    fn to_bytes<'py>(&self, py: Python<'py>) -> Bound<'py, PyBytes> {
+        let data = self.data.bind(py);
+        if self.start == 0 && self.len == data.as_bytes().len() {
+            return data.clone();
+        }
+        PyBytes::new(py, &data.as_bytes()[self.start..self.start + self.len])
+    }
+}
+
+/// The receive part of a QUIC stream, implemented in Rust for performance.
+///
+/// Data received out of order is kept as a list of chunks keyed by stream
+/// offset, so neither gaps nor delivered data cause copies.
+///
+/// In unordered mode, data is delivered as soon as it arrives along with
+/// its offset, and only the ranges received are remembered.
+///
+/// It finishes:
+/// - immediately for a send-only stream
+/// - upon reception of a STREAM_RESET frame
+/// - upon reception of a data frame with the FIN bit set
+#[pyclass(module = "qh3._hazmat")]
+pub struct QuicStreamReceiver {
+    /// The highest offset ever seen.
+    #[pyo3(get)]
+    pub highest_offset: i64,
+    #[pyo3(get)]
+    pub is_finished: bool,
+    #[pyo3(get)]
+    pub stop_pending: bool,
+    #[pyo3(get)]
+    pub unordered: bool,
+
+    /// Chunks past `buffer_start`, never overlapping.
+    chunks: BTreeMap<i64, Chunk>,
+    /// The offset of the next data to deliver.
+    buffer_start: i64,
+    /// In unordered mode, the ranges received, merged and keyed by start.
+    received: BTreeMap<i64, i64>,
+    final_size: Option<i64>,
+    stop_error_code: Option<i64>,
+    stream_id: Option<i64>,
+}
+
+/// Internal (non-pymethod) helpers.
+impl QuicStreamReceiver {
+    /// Keep the parts of `[start, end)` not held yet, `data` starting at
+    /// stream offset `data_offset`.
+    ///
+    /// Pieces less than half of `data` are copied, a peer filling small gaps
+    /// with large overlapping frames would otherwise have each of them pin a
+    /// whole frame. The memory held thus stays below twice the data held,
+    /// which the flow control bounds.
+    fn insert(&mut self, data: &Bound<'_, PyBytes>, data_offset: i64, start: i64, end: i64) {
+        let mut pos = start;
+        if let Some((&chunk_start, chunk)) = self.chunks.range(..=pos).next_back() {
+            pos = std::cmp::max(pos, chunk_start + chunk.len as i64);
+        }
+
+        while pos < end {
+            let next = self
+                .chunks
+                .range(pos..)
+                .next()
+                .map(|(&chunk_start, chunk)| (chunk_start, chunk_start + chunk.len as i64))
+                .filter(|&(chunk_start, _)| chunk_start < end);
+            let gap_end = next.map_or(end, |(chunk_start, _)| chunk_start);
+            if gap_end > pos {
+                let piece_start = (pos - data_offset) as usize;
+                let len = (gap_end - pos) as usize;
+                let chunk = if len * 2 < data.as_bytes().len() {
+                    Chunk {
+                        data: PyBytes::new(
+                            data.py(),
+                            &data.as_bytes()[piece_start..piece_start + len],
+                        )
+                        .unbind(),
+                        start: 0,
+                        len,
+                    }
+                } else {
+                    Chunk {
+                        data: data.clone().unbind(),
+                        start: piece_start,
+                        len,
+                    }
+                };
+                self.chunks.insert(pos, chunk);
+            }
+            match next {
+                Some((_, chunk_end)) => pos = chunk_end,
+                None => break,
+            }
+        }
+    }
+
+    /// Remove the contiguous data at `buffer_start` from the chunks.
+    ///
+    /// A chunk spanning a whole frame is handed out as is, several
+    /// chunks are joined in a single copy.
+    fn pull<'py>(&mut self, py: Python<'py>) -> PyResult<Option<Bound<'py, PyBytes>>> {
+        let mut end = self.buffer_start;
+        let mut count = 0;
+        for (&chunk_start, chunk) in self.chunks.iter() {
+            if chunk_start != end {
+                break;
+            }
+            end += chunk.len as i64;
+            count += 1;
+        }
+        if count == 0 {
+            return Ok(None);
+        }
+
+        let size = (end - self.buffer_start) as usize;
+        self.buffer_start = end;
+
+        if count == 1 {
+            let (_, chunk) = self.chunks.pop_first().unwrap();
+            return Ok(Some(chunk.to_bytes(py)));
+        }
+
+        let chunks = &mut self.chunks;
+        let data = PyBytes::new_with(py, size, |buffer| {
+            let mut pos = 0;
+            for _ in 0..count {
+                let (_, chunk) = chunks.pop_first().unwrap();
+                buffer[pos..pos + chunk.len].copy_from_slice(
+                    &chunk.data.bind(py).as_bytes()[chunk.start..chunk.start + chunk.len],
+                );
+                pos += chunk.len;
+            }
+            Ok(())
+        })?;
+        Ok(Some(data))
+    }
+
+    /// Remember that `[start, end)` was received, in unordered mode.
+    fn mark_received(&mut self, start: i64, end: i64) {
+        let (mut start, mut end) = (start, end);
+        if let Some((&range_start, &range_end)) = self.received.range(..=start).next_back() {
+            if range_end >= start {
+                start = range_start;
+                end = std::cmp::max(end, range_end);
+            }
+        }
+        let merged: Vec<i64> = self
+            .received
+            .range(start..=end)
+            .map(|(&range_start, _)| range_start)
+            .collect();
+        for range_start in merged {
+            end = std::cmp::max(end, self.received.remove(&range_start).unwrap());
+        }
+        self.received.insert(start, end);
+    }
+
+    /// Whether all the data up to the final size was received, in
+    /// unordered mode.
+    fn all_received(&self) -> bool {
+        match self.final_size {
+            Some(final_size) => final_size == 0 || self.received.get(&0) == Some(&final_size),
+            None => false,
+        }
+    }
+
+    /// Deliver the data of a frame not received yet, in unordered mode.
+    ///
+    /// The frame is trimmed to the bounds of that data, parts of it in
+    /// between which were already received are delivered again.
+    fn handle_frame_unordered<'py>(
+        &mut self,
+        py: Python<'py>,
+        frame_offset: i64,
+        frame_data: Bound<'py, PyBytes>,
+    ) -> Option<(Bound<'py, PyBytes>, bool, i64)> {
+        let frame_end = frame_offset + frame_data.as_bytes().len() as i64;
+
+        // find the bounds of the data not received yet
+        let mut bounds: Option<(i64, i64)> = None;
+        let mut pos = frame_offset;
+        if let Some((_, &range_end)) = self.received.range(..=pos).next_back() {
+            pos = std::cmp::max(pos, range_end);
+        }
+        while pos < frame_end {
+            let next = self
+                .received
+                .range(pos..)
+                .next()
+                .map(|(&range_start, &range_end)| (range_start, range_end))
+                .filter(|&(range_start, _)| range_start < frame_end);
+            let gap_end = next.map_or(frame_end, |(range_start, _)| range_start);
+            if gap_end > pos {
+                bounds = Some((bounds.map_or(pos, |(start, _)| start), gap_end));
+            }
+            match next {
+                Some((_, range_end)) => pos = range_end,
+                None => break,
+            }
+        }
+        if frame_end > frame_offset {
+            self.mark_received(frame_offset, frame_end);
+        }
+
+        let end_stream = !self.is_finished && self.all_received();
+        if end_stream {
+            // all data up to the FIN has been received, we're done receiving
+            self.is_finished = true;
+        }
+        match bounds {
+            Some((start, end)) if start == frame_offset && end == frame_end => {
+                Some((frame_data, end_stream, frame_offset))
+            }
+            Some((start, end)) => Some((
+                PyBytes::new(
+                    py,
+                    &frame_data.as_bytes()
+                        [(start - frame_offset) as usize..(end - frame_offset) as usize],
+                ),
+                end_stream,
+                start,
+            )),
+            None if end_stream => Some((PyBytes::new(py, b""), true, frame_end)),
+            None => None,
+        }
+    }
+}
+
+#[pymethods]
+impl QuicStreamReceiver {
+    #[new]
+    #[pyo3(signature = (stream_id=None, readable=true))]
+    pub fn new(stream_id: Option<i64>, readable: bool) -> Self {
+        QuicStreamReceiver {
+            highest_offset: 0,
+            // RFC 9000 3.2: a send-only (outgoing unidirectional) stream has
+            // no receive part, so the receiver is "finished" at construction.
+            is_finished: !readable,
+            stop_pending: false,
+            unordered: false,
+            chunks: BTreeMap::new(),
+            buffer_start: 0,
+            received: BTreeMap::new(),
+            final_size: None,
+            stop_error_code: None,
+            stream_id,
+        }
+    }
+
+    /// Expose _buffer_start for test introspection.
+    #[getter(_buffer_start)]
+    pub fn get_buffer_start(&self) -> i64 {
+        self.buffer_start
+    }
+
+    /// Expose _final_size for test introspection.
+    #[getter(_final_size)]
+    pub fn get_final_size(&self) -> Option<i64> {
+        self.final_size
+    }
+
+    /// Expose the ranges held for test introspection. Returns a list of
+    /// (start, stop) tuples, adjacent chunks being merged.
+    #[getter(_ranges)]
+    pub fn get_ranges(&self) -> Vec<(i64, i64)> {
+        let mut result: Vec<(i64, i64)> = Vec::new();
+        for (&chunk_start, chunk) in self.chunks.iter() {
+            let chunk_end = chunk_start + chunk.len as i64;
+            match result.last_mut() {
+                Some(last) if last.1 == chunk_start => last.1 = chunk_end,
+                _ => result.push((chunk_start, chunk_end)),
+            }
+        }
+        result
+    }
+
+    /// The offset of the next data to deliver.
+    pub fn starting_offset(&self) -> i64 {
+        self.buffer_start
+    }
+
+    /// Deliver data as soon as it is received, whatever its offset.
+    ///
+    /// Returns the data held until now as (data, offset) tuples.
+    pub fn set_unordered<'py>(&mut self, py: Python<'py>) -> Vec<(Bound<'py, PyBytes>, i64)> {
+        let mut held = Vec::new();
+        if self.unordered {
+            return held;
+        }
+        self.unordered = true;
+        if self.buffer_start > 0 {
+            self.received.insert(0, self.buffer_start);
+        }
+        while let Some((chunk_start, chunk)) = self.chunks.pop_first() {
+            self.mark_received(chunk_start, chunk_start + chunk.len as i64);
+            held.push((chunk.to_bytes(py), chunk_start));
+        }
+        held
+    }
+
+    /// Handle a frame of received data.
+    ///
+    /// Returns (data, end_stream, offset) if data can be delivered or the
+    /// stream ended, None otherwise.
+    #[pyo3(signature = (frame_offset, frame_data, frame_fin=false))]
+    pub fn handle_frame<'py>(
+        &mut self,
+        py: Python<'py>,
+        frame_offset: i64,
+        frame_data: Bound<'py, PyBytes>,
+        frame_fin: bool,
+    ) -> PyResult<Option<(Bound<'py, PyBytes>, bool, i64)>> {
+        let count = frame_data.as_bytes().len() as i64;
+        let frame_end = frame_offset + count;
+
+        // we should receive no more data beyond FIN!
+        if let Some(final_size) = self.final_size {
+            if frame_end > final_size {
+                return Err(FinalSizeError::new_err("Data received beyond final size"));
+            } else if frame_fin && frame_end != final_size {
+                return Err(FinalSizeError::new_err("Cannot change final size"));
+            }
+        }
+        if frame_fin {
+            self.final_size = Some(frame_end);
+        }
+        if frame_end > self.highest_offset {
+            self.highest_offset = frame_end;
+        }
+        if self.unordered {
+            return Ok(self.handle_frame_unordered(py, frame_offset, frame_data));
+        }
+
+        // fast path: new in-order chunk
+        if frame_offset == self.buffer_start && count > 0 && self.chunks.is_empty() {
+            self.buffer_start = frame_end;
+            if frame_fin {
+                // all data up to the FIN has been received, we're done receiving
+                self.is_finished = true;
+            }
+            return Ok(Some((frame_data, frame_fin, frame_offset)));
+        }
+
+        // keep the data not delivered yet
+        let start = std::cmp::max(frame_offset, self.buffer_start);
+        if frame_end > start {
+            self.insert(&frame_data, frame_offset, start, frame_end);
+        }
+
+        // return data from the front of the buffer
+        let offset = self.buffer_start;
+        let data = self.pull(py)?;
+        let end_stream = self.final_size == Some(self.buffer_start);
+        if end_stream {
+            // all data up to the FIN has been received, we're done receiving
+            self.is_finished = true;
+        }
+        match data {
+            Some(data) => Ok(Some((data, end_stream, offset))),
+            None if end_stream => Ok(Some((PyBytes::new(py, b""), true, offset))),
+            None => Ok(None),
+        }
+    }
+
+    /// Handle an abrupt termination of the receiving part of the QUIC stream.
+    ///
+    /// The data held is dropped, it will never be delivered.
+    #[pyo3(signature = (*, final_size))]
+    pub fn handle_reset(&mut self, final_size: i64) -> PyResult<()> {
+        if self.final_size.is_some_and(|size| size != final_size) {
+            return Err(FinalSizeError::new_err("Cannot change final size"));
+        }
+
+        // RFC 9000 4.5: a RESET_STREAM whose Final Size is smaller than
+        // what has already been received on the stream is a
+        // FINAL_SIZE_ERROR.
+        if final_size < self.highest_offset {
+            return Err(FinalSizeError::new_err(
+                "RESET_STREAM final size below already-received data",
+            ));
+        }
+
+        // we are done receiving
+        self.final_size = Some(final_size);
+        self.highest_offset = final_size;
+        self.is_finished = true;
+        self.chunks.clear();
+        self.received.clear();
+        Ok(())
+    }
+
+    /// Get the stop frame data. Returns (error_code, stream_id).
+    pub fn get_stop_frame(&mut self) -> (i64, i64) {
+        self.stop_pending = false;
+        (
+            self.stop_error_code.unwrap_or(0),
+            self.stream_id.unwrap_or(0),
+        )
+    }
+
+    /// Callback when a STOP_SENDING is ACK'd or lost.
+    pub fn on_stop_sending_delivery(&mut self, delivery: u8) {
+        if delivery != DELIVERY_ACKED {
+            self.stop_pending = true;
+        }
+    }
+
+    /// Request the peer stop sending data on the QUIC stream.
+    #[pyo3(signature = (error_code=0))]
+    pub fn stop(&mut self, error_code: i64) {
+        self.stop_error_code = Some(error_code);
+        self.stop_pending = true;
+    }
+}
@@ -1,10 +1,19 @@
 use pyo3::prelude::*;
-use pyo3::types::PyBytes;
+use pyo3::types::{PyByteArray, PyBytes};
 
+use crate::buffer::Buffer;
 use crate::rangeset::RangeSet;
+use crate::utils::write_uint_var;
 
 const DELIVERY_ACKED: u8 = 0;
 
+/// Below this many bytes of flight space no STREAM frame header fits.
+const STREAM_FRAME_MIN_SPACE: usize = 20;
+
+/// One STREAM frame written by `fill_stream_frames`:
+///   (sender_index, frame_type, offset, stop_offset, used)
+type StreamFrameRecord = (usize, u8, i64, i64, i64);
+
 /// Internal helper: compute size_uint_var without PyResult overhead.
 #[inline(always)]
 fn size_uint_var_fast(value: u64) -> usize {
@@ -119,6 +128,35 @@ impl QuicStreamSender {
 
         Some((s, e, fin, start))
     }
+
+    /// Append `data` to the send buffer, see `write`.
+    fn write_slice(&mut self, data: &[u8], end_stream: bool) -> PyResult<()> {
+        if self.buffer_fin.is_some() {
+            return Err(pyo3::exceptions::PyAssertionError::new_err(
+                "cannot call write() after FIN",
+            ));
+        }
+        if self.reset_error_code.is_some() {
+            return Err(pyo3::exceptions::PyAssertionError::new_err(
+                "cannot call write() after reset()",
+            ));
+        }
+        let size = data.len();
+
+        if size > 0 {
+            self.buffer_is_empty = false;
+            self.pending
+                .add(self.buffer_stop, Some(self.buffer_stop + size as i64));
+            self.buffer.extend_from_slice(data);
+            self.buffer_stop += size as i64;
+        }
+        if end_stream {
+            self.buffer_is_empty = false;
+            self.buffer_fin = Some(self.buffer_stop);
+            self.pending_eof = true;
+        }
+        Ok(())
+    }
 }
 
 #[pymethods]
@@ -319,32 +357,112 @@ impl QuicStreamSender {
     }
 
     /// Write some data bytes to the QUIC stream.
+    ///
+    /// `bytes` and `bytearray` are copied straight into the send buffer.
+    /// Other buffer-protocol objects are converted to `bytes` first, the
+    /// limited API targeted (Python 3.7) not exposing the buffer protocol.
     #[pyo3(signature = (data, end_stream=false))]
-    pub fn write(&mut self, data: &[u8], end_stream: bool) -> PyResult<()> {
-        if self.buffer_fin.is_some() {
-            return Err(pyo3::exceptions::PyAssertionError::new_err(
-                "cannot call write() after FIN",
-            ));
+    pub fn write(&mut self, data: &Bound<'_, PyAny>, end_stream: bool) -> PyResult<()> {
+        if let Ok(bytes) = data.cast::<PyBytes>() {
+            self.write_slice(bytes.as_bytes(), end_stream)
+        } else if let Ok(bytearray) = data.cast::<PyByteArray>() {
+            // SAFETY: no Python code runs, which could resize the bytearray,
+            // while its contents are copied.
+            self.write_slice(unsafe { bytearray.as_bytes() }, end_stream)
+        } else {
+            let bytes = data.py().get_type::<PyBytes>().call1((data,))?;
+            self.write_slice(bytes.cast::<PyBytes>()?.as_bytes(), end_stream)
         }
-        if self.reset_error_code.is_some() {
-            return Err(pyo3::exceptions::PyAssertionError::new_err(
-                "cannot call write() after reset()",
-            ));
+    }
+}
+
+/// Pack as many STREAM frames as fit into the packet being built.
+///
+/// `senders` and `max_stream_data` are parallel lists (one entry per stream
+/// with pending data, in round-robin order). Frames are written back to
+/// back into `buffer` starting at its current position, without exceeding
+/// `flight_end`, and the connection-level credit `remote_data_remaining`
+/// is shared among all streams.
+///
+/// Returns (records, used) where each record is
+/// (sender_index, frame_type, offset, stop_offset, used) and `used` is the
+/// total amount of new connection-level credit consumed.
+/// The caller is responsible for registering delivery handlers.
+#[pyfunction]
+pub fn fill_stream_frames(
+    py: Python<'_>,
+    buffer: Py<Buffer>,
+    senders: Vec<Py<QuicStreamSender>>,
+    max_stream_data: Vec<i64>,
+    flight_end: usize,
+    remote_data_remaining: i64,
+) -> PyResult<(Vec<StreamFrameRecord>, i64)> {
+    let mut buf = buffer.borrow_mut(py);
+    let mut pos = buf.get_pos();
+    let flight_end = std::cmp::min(flight_end, buf.get_capacity());
+    let buf_data = buf.data_mut()?;
+
+    let mut records: Vec<StreamFrameRecord> = Vec::new();
+    let mut remaining = remote_data_remaining;
+    let mut total_used: i64 = 0;
+
+    for (index, (sender, stream_limit)) in senders.iter().zip(max_stream_data).enumerate() {
+        if pos + STREAM_FRAME_MIN_SPACE > flight_end {
+            break;
         }
-        let size = data.len();
+        let flight_space = (flight_end - pos) as i64;
 
-        if size > 0 {
-            self.buffer_is_empty = false;
-            self.pending
-                .add(self.buffer_stop, Some(self.buffer_stop + size as i64));
-            self.buffer.extend_from_slice(data);
-            self.buffer_stop += size as i64;
+        let mut sender = sender.borrow_mut(py);
+        if sender.buffer_is_empty || sender.reset_pending {
+            continue;
         }
-        if end_stream {
-            self.buffer_is_empty = false;
-            self.buffer_fin = Some(self.buffer_stop);
-            self.pending_eof = true;
+
+        let max_offset = std::cmp::min(sender.highest_offset + remaining, stream_limit);
+
+        let next_off = sender.next_offset_internal();
+        let next_off_size = if next_off != 0 {
+            size_uint_var_fast(next_off as u64)
+        } else {
+            0
+        };
+        let frame_overhead = 3 + sender.stream_id_size + next_off_size;
+        let max_size = flight_space - frame_overhead as i64;
+
+        let previous_highest = sender.highest_offset;
+        let (s, e, fin, offset) = match sender.get_frame_internal(max_size, Some(max_offset)) {
+            Some(frame) => frame,
+            None => continue,
+        };
+
+        // STREAM_BASE | LEN, plus OFF and FIN bits
+        let mut frame_type: u8 = 0x08 | 0x02;
+        if offset != 0 {
+            frame_type |= 0x04;
         }
-        Ok(())
+        if fin {
+            frame_type |= 0x01;
+        }
+
+        let length = e - s;
+        buf_data[pos] = frame_type;
+        pos += 1;
+        pos += write_uint_var(&mut buf_data[pos..], sender.stream_id.unwrap_or(0) as u64);
+        if offset != 0 {
+            pos += write_uint_var(&mut buf_data[pos..], offset as u64);
+        }
+        buf_data[pos..pos + 2].copy_from_slice(&((length as u16) | 0x4000).to_be_bytes());
+        pos += 2;
+        buf_data[pos..pos + length].copy_from_slice(&sender.buffer[s..e]);
+        pos += length;
+
+        let used = sender.highest_offset - previous_highest;
+        remaining -= used;
+        total_used += used;
+
+        records.push((index, frame_type, offset, offset + length as i64, used));
     }
+
+    buf.set_pos(pos);
+
+    Ok((records, total_used))
 }
@@ -0,0 +1,474 @@
+use pyo3::exceptions::{PyAssertionError, PyOverflowError};
+use pyo3::types::{PyBytes, PyBytesMethods};
+use pyo3::{pyfunction, Bound, Py, PyResult, Python};
+
+use crate::buffer::Buffer;
+use crate::{BufferReadError, BufferWriteError};
+
+// Constants matching Python's tls.py
+const TLS_VERSION_1_2: u16 = 0x0303;
+
+const HANDSHAKE_CLIENT_HELLO: u8 = 1;
+const HANDSHAKE_SERVER_HELLO: u8 = 2;
+const HANDSHAKE_ENCRYPTED_EXTENSIONS: u8 = 8;
+const HANDSHAKE_CERTIFICATE: u8 = 11;
+
+const EXTENSION_SERVER_NAME: u16 = 0;
+const EXTENSION_STATUS_REQUEST: u16 = 5;
+const EXTENSION_SUPPORTED_GROUPS: u16 = 10;
+const EXTENSION_SIGNATURE_ALGORITHMS: u16 = 13;
+const EXTENSION_ALPN: u16 = 16;
+const EXTENSION_PRE_SHARED_KEY: u16 = 41;
+const EXTENSION_EARLY_DATA: u16 = 42;
+const EXTENSION_SUPPORTED_VERSIONS: u16 = 43;
+const EXTENSION_PSK_KEY_EXCHANGE_MODES: u16 = 45;
+const EXTENSION_KEY_SHARE: u16 = 51;
+
+type KeyShareEntry<'a> = (u16, Bound<'a, PyBytes>);
+type Extension<'a> = (u16, Bound<'a, PyBytes>);
+
+/// Extensions of a ClientHello:
+///   (alpn_protocols, early_data, key_share, pre_shared_key,
+///    psk_key_exchange_modes, server_name, signature_algorithms,
+///    supported_groups, supported_versions, status_request, other_extensions)
+type ClientHelloExtensions<'a> = (
+    Option<Vec<Bound<'a, PyBytes>>>,
+    bool,
+    Option<Vec<KeyShareEntry<'a>>>,
+    Option<(Vec<(Bound<'a, PyBytes>, u32)>, Vec<Bound<'a, PyBytes>>)>,
+    Option<Vec<u8>>,
+    Option<Bound<'a, PyBytes>>,
+    Option<Vec<u16>>,
+    Option<Vec<u16>>,
+    Option<Vec<u16>>,
+    bool,
+    Vec<Extension<'a>>,
+);
+
+/// Return type for `pull_client_hello`:
+///   (random, legacy_session_id, cipher_suites,
+///    legacy_compression_methods, extensions)
+type ClientHelloTuple<'a> = (
+    Bound<'a, PyBytes>,
+    Bound<'a, PyBytes>,
+    Vec<u16>,
+    Vec<u8>,
+    ClientHelloExtensions<'a>,
+);
+
+/// GREASE values (RFC 8701) are of the form 0xNaNa.
+#[inline]
+fn is_grease_value(v: u16) -> bool {
+    (v >> 8) == (v & 0xFF) && (v & 0x0F) == 0x0A
+}
+
+#[inline]
+fn read_error() -> pyo3::PyErr {
+    BufferReadError::new_err("Read out of bounds")
+}
+
+#[inline]
+fn write_error() -> pyo3::PyErr {
+    BufferWriteError::new_err("Write out of bounds")
+}
+
+/// Cursor over the readable part of a Buffer, mirroring the semantics of
+/// pull_block / pull_list / pull_opaque: running past the buffer raises
+/// BufferReadError, a block whose content does not end where announced
+/// raises AssertionError.
+struct Reader<'a> {
+    data: &'a [u8],
+    pos: usize,
+}
+
+impl<'a> Reader<'a> {
+    #[inline]
+    fn take(&mut self, length: usize) -> PyResult<&'a [u8]> {
+        if self.data.len() - self.pos < length {
+            return Err(read_error());
+        }
+        let slice = &self.data[self.pos..self.pos + length];
+        self.pos += length;
+        Ok(slice)
+    }
+
+    #[inline]
+    fn uint8(&mut self) -> PyResult<u8> {
+        Ok(self.take(1)?[0])
+    }
+
+    #[inline]
+    fn uint16(&mut self) -> PyResult<u16> {
+        Ok(u16::from_be_bytes(self.take(2)?.try_into()?))
+    }
+
+    #[inline]
+    fn uint32(&mut self) -> PyResult<u32> {
+        Ok(u32::from_be_bytes(self.take(4)?.try_into()?))
+    }
+
+    /// Read a `capacity` bytes length prefix and return where the block ends.
+    #[inline]
+    fn block(&mut self, capacity: usize) -> PyResult<usize> {
+        let length = self
+            .take(capacity)?
+            .iter()
+            .fold(0usize, |acc, b| (acc << 8) | *b as usize);
+        Ok(self.pos + length)
+    }
+
+    #[inline]
+    fn end_block(&self, end: usize) -> PyResult<()> {
+        if self.pos != end {
+            return Err(PyAssertionError::new_err("Block length mismatch"));
+        }
+        Ok(())
+    }
+
+    #[inline]
+    fn opaque(&mut self, capacity: usize) -> PyResult<&'a [u8]> {
+        let end = self.block(capacity)?;
+        self.take(end - self.pos)
+    }
+
+    fn list<T>(
+        &mut self,
+        capacity: usize,
+        mut item: impl FnMut(&mut Self) -> PyResult<T>,
+    ) -> PyResult<Vec<T>> {
+        let end = self.block(capacity)?;
+        let mut items = Vec::new();
+        while self.pos < end {
+            items.push(item(self)?);
+        }
+        self.end_block(end)?;
+        Ok(items)
+    }
+}
+
+/// Cursor over the writable part of a Buffer, mirroring push_block /
+/// push_opaque: running past the capacity raises BufferWriteError.
+struct Writer<'a> {
+    data: &'a mut [u8],
+    pos: usize,
+}
+
+impl Writer<'_> {
+    #[inline]
+    fn bytes(&mut self, value: &[u8]) -> PyResult<()> {
+        if self.data.len() - self.pos < value.len() {
+            return Err(write_error());
+        }
+        self.data[self.pos..self.pos + value.len()].copy_from_slice(value);
+        self.pos += value.len();
+        Ok(())
+    }
+
+    #[inline]
+    fn uint8(&mut self, value: u8) -> PyResult<()> {
+        self.bytes(&[value])
+    }
+
+    #[inline]
+    fn uint16(&mut self, value: u16) -> PyResult<()> {
+        self.bytes(&value.to_be_bytes())
+    }
+
+    /// Reserve room for a `capacity` bytes length prefix.
+    #[inline]
+    fn begin_block(&mut self, capacity: usize) -> PyResult<usize> {
+        if self.data.len() - self.pos < capacity {
+            return Err(write_error());
+        }
+        self.pos += capacity;
+        Ok(self.pos)
+    }
+
+    /// Fill in the length prefix of the block started at `start`.
+    #[inline]
+    fn end_block(&mut self, start: usize, capacity: usize) -> PyResult<()> {
+        let length = self.pos - start;
+        if capacity < 8 && length >> (8 * capacity) != 0 {
+            return Err(PyOverflowError::new_err("int too big to convert"));
+        }
+        let prefix = (length as u64).to_be_bytes();
+        self.data[start - capacity..start].copy_from_slice(&prefix[8 - capacity..]);
+        Ok(())
+    }
+
+    #[inline]
+    fn opaque(&mut self, capacity: usize, value: &[u8]) -> PyResult<()> {
+        let start = self.begin_block(capacity)?;
+        self.bytes(value)?;
+        self.end_block(start, capacity)
+    }
+
+    #[inline]
+    fn extension(&mut self, extension_type: u16, value: &[u8]) -> PyResult<()> {
+        self.uint16(extension_type)?;
+        self.opaque(2, value)
+    }
+}
+
+/// Run `encode` against the Buffer at its current position, committing
+/// the new position only if the whole message could be written.
+#[inline]
+fn with_writer(
+    py: Python<'_>,
+    buffer: Py<Buffer>,
+    encode: impl FnOnce(&mut Writer<'_>) -> PyResult<()>,
+) -> PyResult<()> {
+    let mut buf = buffer.borrow_mut(py);
+    let pos = buf.get_pos();
+    let capacity = buf.get_capacity();
+    let mut writer = Writer {
+        data: &mut buf.data_mut()?[..capacity],
+        pos,
+    };
+    encode(&mut writer)?;
+    let pos = writer.pos;
+    buf.set_pos(pos);
+    Ok(())
+}
+
+/// Parse a ClientHello handshake message from the current buffer position.
+///
+/// ALPN protocols and the server name are returned as raw bytes, decoding
+/// is left to the caller. GREASE and status_request extensions are skipped.
+#[pyfunction]
+pub fn pull_client_hello<'a>(py: Python<'a>, buffer: Py<Buffer>) -> PyResult<ClientHelloTuple<'a>> {
+    let mut buf = buffer.borrow_mut(py);
+    let capacity = buf.get_capacity();
+    let mut r = Reader {
+        data: &buf.data_ref()[..capacity],
+        pos: buf.get_pos(),
+    };
+
+    if r.uint8()? != HANDSHAKE_CLIENT_HELLO {
+        return Err(PyAssertionError::new_err("Expected a ClientHello"));
+    }
+    let message_end = r.block(3)?;
+    if r.uint16()? != TLS_VERSION_1_2 {
+        return Err(PyAssertionError::new_err("Unexpected legacy_version"));
+    }
+
+    let random = PyBytes::new(py, r.take(32)?);
+    let legacy_session_id = PyBytes::new(py, r.opaque(1)?);
+    let cipher_suites = r.list(2, |r| r.uint16())?;
+    let legacy_compression_methods = r.list(1, |r| r.uint8())?;
+
+    let mut alpn_protocols = None;
+    let mut early_data = false;
+    let mut key_share = None;
+    let mut pre_shared_key = None;
+    let mut psk_key_exchange_modes = None;
+    let mut server_name = None;
+    let mut signature_algorithms = None;
+    let mut supported_groups = None;
+    let mut supported_versions = None;
+    let mut status_request = false;
+    let mut other_extensions = Vec::new();
+    let mut after_psk = false;
+
+    r.list(2, |r| {
+        // pre_shared_key MUST be last
+        if after_psk {
+            return Err(PyAssertionError::new_err(
+                "pre_shared_key must be the last extension",
+            ));
+        }
+
+        let extension_type = r.uint16()?;
+        let extension_length = r.uint16()? as usize;
+        match extension_type {
+            EXTENSION_KEY_SHARE => {
+                key_share = Some(r.list(2, |r| {
+                    let group = r.uint16()?;
+                    Ok((group, PyBytes::new(py, r.opaque(2)?)))
+                })?);
+            }
+            EXTENSION_SUPPORTED_VERSIONS => {
+                supported_versions = Some(r.list(1, |r| r.uint16())?);
+            }
+            EXTENSION_SIGNATURE_ALGORITHMS => {
+                signature_algorithms = Some(r.list(2, |r| r.uint16())?);
+            }
+            EXTENSION_SUPPORTED_GROUPS => {
+                supported_groups = Some(r.list(2, |r| r.uint16())?);
+            }
+            EXTENSION_PSK_KEY_EXCHANGE_MODES => {
+                psk_key_exchange_modes = Some(r.list(1, |r| r.uint8())?);
+            }
+            EXTENSION_SERVER_NAME => {
+                let end = r.block(2)?;
+                if r.uint8()? != 0 {
+                    return Err(PyAssertionError::new_err("Unexpected server name type"));
+                }
+                server_name = Some(PyBytes::new(py, r.opaque(2)?));
+                r.end_block(end)?;
+            }
+            EXTENSION_ALPN => {
+                alpn_protocols = Some(r.list(2, |r| Ok(PyBytes::new(py, r.opaque(1)?)))?);
+            }
+            EXTENSION_EARLY_DATA => {
+                early_data = true;
+            }
+            EXTENSION_PRE_SHARED_KEY => {
+                let identities = r.list(2, |r| {
+                    let identity = PyBytes::new(py, r.opaque(2)?);
+                    Ok((identity, r.uint32()?))
+                })?;
+                let binders = r.list(2, |r| Ok(PyBytes::new(py, r.opaque(1)?)))?;
+                pre_shared_key = Some((identities, binders));
+                after_psk = true;
+            }
+            EXTENSION_STATUS_REQUEST => {
+                // only the OCSP status type is supported (RFC 6066 8)
+                let body = r.take(extension_length)?;
+                status_request = body.first() == Some(&1);
+            }
+            // GREASE is skipped
+            t if is_grease_value(t) => {
+                r.take(extension_length)?;
+            }
+            t => {
+                other_extensions.push((t, PyBytes::new(py, r.take(extension_length)?)));
+            }
+        }
+        Ok(())
+    })?;
+
+    r.end_block(message_end)?;
+
+    let pos = r.pos;
+    buf.set_pos(pos);
+
+    Ok((
+        random,
+        legacy_session_id,
+        cipher_suites,
+        legacy_compression_methods,
+        (
+            alpn_protocols,
+            early_data,
+            key_share,
+            pre_shared_key,
+            psk_key_exchange_modes,
+            server_name,
+            signature_algorithms,
+            supported_groups,
+            supported_versions,
+            status_request,
+            other_extensions,
+        ),
+    ))
+}
+
+/// Serialize a ServerHello handshake message at the current buffer position.
+#[pyfunction]
+#[allow(clippy::too_many_arguments)]
+#[pyo3(signature = (buffer, random, legacy_session_id, cipher_suite, compression_method, key_share=None, pre_shared_key=None, supported_version=None, other_extensions=Vec::new()))]
+pub fn push_server_hello(
+    py: Python<'_>,
+    buffer: Py<Buffer>,
+    random: &[u8],
+    legacy_session_id: &[u8],
+    cipher_suite: u16,
+    compression_method: u8,
+    key_share: Option<KeyShareEntry<'_>>,
+    pre_shared_key: Option<u16>,
+    supported_version: Option<u16>,
+    other_extensions: Vec<Extension<'_>>,
+) -> PyResult<()> {
+    with_writer(py, buffer, |w| {
+        w.uint8(HANDSHAKE_SERVER_HELLO)?;
+        let message = w.begin_block(3)?;
+        w.uint16(TLS_VERSION_1_2)?;
+        w.bytes(random)?;
+        w.opaque(1, legacy_session_id)?;
+        w.uint16(cipher_suite)?;
+        w.uint8(compression_method)?;
+
+        let extensions = w.begin_block(2)?;
+        if let Some(version) = supported_version {
+            w.extension(EXTENSION_SUPPORTED_VERSIONS, &version.to_be_bytes())?;
+        }
+        if let Some((group, key_exchange)) = &key_share {
+            w.uint16(EXTENSION_KEY_SHARE)?;
+            let start = w.begin_block(2)?;
+            w.uint16(*group)?;
+            w.opaque(2, key_exchange.as_bytes())?;
+            w.end_block(start, 2)?;
+        }
+        if let Some(selected_identity) = pre_shared_key {
+            w.extension(EXTENSION_PRE_SHARED_KEY, &selected_identity.to_be_bytes())?;
+        }
+        for (extension_type, extension_value) in &other_extensions {
+            w.extension(*extension_type, extension_value.as_bytes())?;
+        }
+        w.end_block(extensions, 2)?;
+
+        w.end_block(message, 3)
+    })
+}
+
+/// Serialize an EncryptedExtensions handshake message at the current buffer
+/// position. `alpn_protocol` is the already encoded protocol name.
+#[pyfunction]
+#[pyo3(signature = (buffer, alpn_protocol=None, early_data=false, other_extensions=Vec::new()))]
+pub fn push_encrypted_extensions(
+    py: Python<'_>,
+    buffer: Py<Buffer>,
+    alpn_protocol: Option<&[u8]>,
+    early_data: bool,
+    other_extensions: Vec<Extension<'_>>,
+) -> PyResult<()> {
+    with_writer(py, buffer, |w| {
+        w.uint8(HANDSHAKE_ENCRYPTED_EXTENSIONS)?;
+        let message = w.begin_block(3)?;
+
+        let extensions = w.begin_block(2)?;
+        if let Some(protocol) = alpn_protocol {
+            w.uint16(EXTENSION_ALPN)?;
+            let start = w.begin_block(2)?;
+            let protocols = w.begin_block(2)?;
+            w.opaque(1, protocol)?;
+            w.end_block(protocols, 2)?;
+            w.end_block(start, 2)?;
+        }
+        if early_data {
+            w.extension(EXTENSION_EARLY_DATA, b"")?;
+        }
+        for (extension_type, extension_value) in &other_extensions {
+            w.extension(*extension_type, extension_value.as_bytes())?;
+        }
+        w.end_block(extensions, 2)?;
+
+        w.end_block(message, 3)
+    })
+}
+
+/// Serialize a Certificate handshake message at the current buffer position.
+/// Each entry is a (cert_data, extensions) pair.
+#[pyfunction]
+pub fn push_certificate(
+    py: Python<'_>,
+    buffer: Py<Buffer>,
+    request_context: &[u8],
+    certificates: Vec<(Bound<'_, PyBytes>, Bound<'_, PyBytes>)>,
+) -> PyResult<()> {
+    with_writer(py, buffer, |w| {
+        w.uint8(HANDSHAKE_CERTIFICATE)?;
+        let message = w.begin_block(3)?;
+        w.opaque(1, request_context)?;
+
+        let entries = w.begin_block(3)?;
+        for (cert_data, extensions) in &certificates {
+            w.opaque(3, cert_data.as_bytes())?;
+            w.opaque(2, extensions.as_bytes())?;
+        }
+        w.end_block(entries, 3)?;
+
+        w.end_block(message, 3)
+    })
+}
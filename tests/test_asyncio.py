@@ -6,17 +6,19 @@ import binascii
 import contextlib
 import random
 import socket
-from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
 
 from cryptography.hazmat.primitives import serialization
 
 from qh3._hazmat import Certificate as InnerCertificate
 from qh3._hazmat import EcPrivateKey, Ed25519PrivateKey
 from qh3.asyncio.client import connect
-from qh3.asyncio.protocol import QuicConnectionProtocol
+from qh3.asyncio.protocol import QuicConnectionProtocol, QuicStreamReader
 from qh3.asyncio.server import serve
 from qh3.quic.configuration import QuicConfiguration
 from qh3.quic.logger import QuicLogger
+from qh3.quic.session_cache import SessionCache
 
 from .utils import (
     SERVER_CACERTFILE,
@@ -121,6 +123,25 @@ class TestHighLevel:
             response = await self.run_client(port=server_port)
             assert response == b"gnip"
 
+    @pytest.mark.asyncio
+    async def test_connect_and_serve_with_handshake_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            server_configuration = QuicConfiguration(
+                is_client=False, handshake_executor=executor
+            )
+            server_configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+
+            async with self.run_server(
+                configuration=server_configuration
+            ) as server_port:
+                response = await self.run_client(
+                    configuration=QuicConfiguration(
+                        is_client=True, handshake_executor=executor
+                    ),
+                    port=server_port,
+                )
+                assert response == b"gnip"
+
     @pytest.mark.asyncio
     async def test_connect_and_serve_ipv4(self):
         async with self.run_server(host="0.0.0.0") as server_port:
@@ -198,6 +219,74 @@ class TestHighLevel:
             response = await self.run_client(port=server_port, request=data)
             assert response == data
 
+    @pytest.mark.asyncio
+    async def test_connect_and_serve_large_flow_control_on_consumption(self):
+        """
+        Transfer data through windows which only grow as the readers consume it.
+        """
+        data = b"Z" * 2097152
+        options = {
+            "flow_control_on_consumption": True,
+            "max_data": 65536,
+            "max_stream_data": 32768,
+        }
+        server_configuration = QuicConfiguration(is_client=False, **options)
+        server_configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        async with self.run_server(configuration=server_configuration) as server_port:
+            response = await self.run_client(
+                port=server_port,
+                configuration=QuicConfiguration(is_client=True, **options),
+                request=data,
+            )
+            assert response == data
+
+    @pytest.mark.asyncio
+    async def test_stream_reader_reports_consumption(self):
+        protocol = Mock()
+        reader = QuicStreamReader(protocol, 0)
+        reader.feed_data(b"line\n" + b"Z" * 10 + b"A" * 70000 + b"\nend")
+        reader.feed_eof()
+
+        def consumed():
+            return sum(
+                call.args[1]
+                for call in protocol._quic.stream_data_consumed.call_args_list
+            )
+
+        assert await reader.readline() == b"line\n"
+        assert consumed() == 5
+        assert await reader.readexactly(4) == b"ZZZZ"
+        assert await reader.readuntil(b"ZA") == b"ZZZZZZA"
+        assert consumed() == 16
+
+        # overlong lines are dropped, and still reported
+        with pytest.raises(ValueError):
+            await reader.readline()
+        assert await reader.read() == b"\nend"
+        assert consumed() == 70019
+        assert protocol._transmit_soon.called
+
+    @pytest.mark.asyncio
+    async def test_connect_and_serve_large_receive_window_budget(self):
+        """
+        Transfer data through auto-tuned receive windows.
+        """
+        data = b"Z" * 2097152
+        options = {
+            "max_data": 65536,
+            "max_stream_data": 32768,
+            "receive_window_budget": 1048576,
+        }
+        server_configuration = QuicConfiguration(is_client=False, **options)
+        server_configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        async with self.run_server(configuration=server_configuration) as server_port:
+            response = await self.run_client(
+                port=server_port,
+                configuration=QuicConfiguration(is_client=True, **options),
+                request=data,
+            )
+            assert response == data
+
     @pytest.mark.asyncio
     async def test_connect_and_serve_without_client_configuration(self):
         async with self.run_server() as server_port:
@@ -296,6 +385,35 @@ class TestHighLevel:
             )
             assert response == b"gnip"
 
+    @pytest.mark.asyncio
+    async def test_connect_and_serve_with_session_cache(self):
+        store = SessionTicketStore()
+        session_cache = SessionCache()
+
+        async def connect_and_ping(server_port):
+            configuration = QuicConfiguration(is_client=True)
+            configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+            async with connect(
+                self.server_host,
+                server_port,
+                configuration=configuration,
+                session_cache=session_cache,
+            ) as client:
+                reader, writer = await client.create_stream()
+                writer.write(b"ping")
+                writer.write_eof()
+                assert await reader.read() == b"gnip"
+            return client._quic.tls.session_resumed
+
+        async with self.run_server(
+            session_ticket_fetcher=store.pop, session_ticket_handler=store.add
+        ) as server_port:
+            assert not await connect_and_ping(server_port)
+            assert len(session_cache) == 1
+
+            # the ticket is taken from the cache
+            assert await connect_and_ping(server_port)
+
     @pytest.mark.asyncio
     async def test_connect_and_serve_with_retry(self):
         async with self.run_server(retry=True) as server_port:
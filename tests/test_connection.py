@@ -7,6 +7,7 @@ import binascii
 import contextlib
 import io
 import time
+from concurrent.futures import Executor, Future
 from typing import List, Tuple
 
 from qh3 import tls
@@ -26,6 +27,7 @@ from qh3.quic.connection import (
     check_stream_id_for_receiving,
     check_stream_id_for_sending,
     MAX_REMOTE_CHALLENGES,
+    tune_receive_window,
 )
 from qh3.quic.crypto import CryptoPair
 from qh3.quic.logger import QuicLogger
@@ -59,7 +61,7 @@ CLIENT_ADDR = ("1.2.3.4", 1234)
 CLIENT_HANDSHAKE_DATAGRAM_SIZES = [1280]
 
 SERVER_ADDR = ("2.3.4.5", 4433)
-SERVER_INITIAL_DATAGRAM_SIZES = [1280, 1280, 890]
+SERVER_INITIAL_DATAGRAM_SIZES = [1280, 1280, 653]
 
 HANDSHAKE_COMPLETED_EVENTS = [
     events.HandshakeCompleted,
@@ -424,6 +426,34 @@ class TestQuicConnection:
             # check handshake completed
             self.check_handshake(client=client, server=server)
 
+            # the Certificate message comes from the shared configuration
+            credentials = server._configuration.server_credentials()
+            assert server.tls.server_credentials is credentials
+            certificate = tls.pull_certificate(
+                Buffer(data=credentials.certificate_message)
+            )
+            assert certificate.certificates == [
+                (cert.public_bytes(), b"")
+                for cert in [server._configuration.certificate]
+                + server._configuration.certificate_chain
+            ]
+            assert len(certificate.certificates) > 1
+
+    def test_server_credentials_reload(self):
+        configuration = QuicConfiguration(is_client=False)
+        assert configuration.server_credentials() is None
+
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        credentials = configuration.server_credentials()
+        assert configuration.server_credentials() is credentials
+        assert credentials.signature_algorithms
+
+        # loading a new chain invalidates the cached credentials
+        configuration.load_cert_chain(SERVER_CERTFILE_WITH_CHAIN, SERVER_KEYFILE)
+        reloaded = configuration.server_credentials()
+        assert reloaded is not credentials
+        assert len(reloaded.certificate_message) > len(credentials.certificate_message)
+
     def test_connect_with_cipher_suite_aes128(self):
         with client_and_server(
             client_options={"cipher_suites": [tls.CipherSuite.AES_128_GCM_SHA256]}
@@ -641,7 +671,7 @@ class TestQuicConnection:
             server.receive_datagram(items[0][0], CLIENT_ADDR, now=now)
             server.receive_datagram(items[1][0], CLIENT_ADDR, now=now)
             items = server.datagrams_to_send(now=now)
-            assert datagram_sizes(items) == [1280, 1280, 890]
+            assert datagram_sizes(items) == [1280, 1280, 653]
             # self.assertAlmostEqual(server.get_timer(), 0.35)
             self.assertSentPackets(server, [1, 2, 0])
             self.assertEvents(server, [])
@@ -812,7 +842,7 @@ class TestQuicConnection:
             now = server.get_timer()
             server.handle_timer(now=now)
             items = server.datagrams_to_send(now=now)
-            assert datagram_sizes(items) == [1280, 890]
+            assert datagram_sizes(items) == [1280, 653]
             assert server.get_timer() == pytest.approx(2.048)
             self.assertSentPackets(server, [0, 3, 0])
             self.assertEvents(server, [])
@@ -1057,6 +1087,81 @@ class TestQuicConnection:
             assert type(event) == events.StreamDataReceived
             assert event.data == b"hello"
 
+    def test_connect_with_0rtt_key_ring(self):
+        client_ticket = None
+        key_ring = tls.SessionTicketKeyRing()
+
+        def save_session_ticket(ticket):
+            nonlocal client_ticket
+            client_ticket = ticket
+
+        with client_and_server(
+            client_kwargs={"session_ticket_handler": save_session_ticket},
+            server_options={"session_ticket_key_ring": key_ring},
+        ) as (client, server):
+            pass
+
+        # another server holding the same keys, without any ticket store
+        with client_and_server(
+            client_options={"session_ticket": client_ticket},
+            server_options={"session_ticket_key_ring": key_ring},
+            handshake=False,
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+
+            assert roundtrip(client, server) == (2, 2)
+            assert server.tls.session_resumed
+
+            event = server.next_event()
+            assert type(event) == events.ProtocolNegotiated
+
+            event = server.next_event()
+            assert type(event) == events.StreamDataReceived
+            assert event.data == b"hello"
+
+    def test_connect_with_failing_handshake_executor(self):
+        class FailingExecutor(Executor):
+            def submit(self, fn, *args, **kwargs):
+                future = Future()
+                future.set_exception(RuntimeError("signing failed"))
+                return future
+
+        with client_and_server(
+            handshake=False,
+            server_options={"handshake_executor": FailingExecutor()},
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            transfer(client, server)
+            assert server.handshake_operation is not None
+
+            # the failure closes the connection instead of leaving it hanging
+            server.resume_handshake()
+            assert server._close_event == events.ConnectionTerminated(
+                error_code=QuicErrorCode.CRYPTO_ERROR
+                + tls.AlertDescription.internal_error,
+                frame_type=QuicFrameType.CRYPTO,
+                reason_phrase="Handshake operation failed: "
+                "RuntimeError('signing failed')",
+            )
+
+    def test_resume_handshake_unexpected_error(self):
+        with client_and_server(handshake=False) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+
+            def resume_handshake(output_buf):
+                raise ValueError("boom")
+
+            client.tls._pending_operation = (Future(), None)
+            client.tls.resume_handshake = resume_handshake
+            client.resume_handshake()
+            assert client._close_event == events.ConnectionTerminated(
+                error_code=QuicErrorCode.INTERNAL_ERROR,
+                frame_type=QuicFrameType.CRYPTO,
+                reason_phrase="boom",
+            )
+
     def test_connect_with_0rtt_bad_max_early_data(self):
         client_ticket = None
         ticket_store = SessionTicketStore()
@@ -1257,6 +1362,38 @@ class TestQuicConnection:
         finally:
             QuicConnection._initialize = real_initialize
 
+    def test_receive_datagrams(self):
+        with client_and_server() as (client, server):
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, bytes(8000), end_stream=True)
+            datagrams = [
+                data for data, addr in client.datagrams_to_send(now=time.time())
+            ]
+            assert len(datagrams) > 1
+
+            def received_data():
+                data = b""
+                while True:
+                    event = server.next_event()
+                    if event is None:
+                        return data
+                    if isinstance(event, events.StreamDataReceived):
+                        data += event.data
+
+            # a corrupted datagram in the burst is dropped
+            corrupted = datagrams[1][:-1] + bytes([datagrams[1][-1] ^ 0xFF])
+            server.receive_datagrams(
+                datagrams[:1] + [corrupted] + datagrams[2:],
+                CLIENT_ADDR,
+                now=time.time(),
+            )
+            received = received_data()
+            assert len(received) < 8000
+
+            # the retransmission completes the stream
+            server.receive_datagram(datagrams[1], CLIENT_ADDR, now=time.time())
+            assert received + received_data() == bytes(8000)
+
     def test_receive_datagram_garbage(self):
         client = create_standalone_client(self)
 
@@ -1289,7 +1426,7 @@ class TestQuicConnection:
         def corrupt_finalize(
             self, buffer, packet_start, packet_size, padding_size, header_size,
             is_long_header, version, packet_type, peer_cid, host_cid,
-            peer_token, spin_bit, packet_number,
+            peer_token, spin_bit, packet_number, seal=True,
         ):
             # Write padding
             if padding_size > 0:
@@ -2821,6 +2958,199 @@ class TestQuicConnection:
             assert stream.max_stream_data_local == 2097152
             assert stream.max_stream_data_local_sent == 2097152
 
+    def test_flow_control_on_consumption(self):
+        def received(connection):
+            total = 0
+            event = connection.next_event()
+            while event is not None:
+                if isinstance(event, events.StreamDataReceived):
+                    total += len(event.data)
+                event = connection.next_event()
+            return total
+
+        with client_and_server(
+            client_options={
+                "flow_control_on_consumption": True,
+                "max_data": 32768,
+                "max_stream_data": 16384,
+            }
+        ) as (client, server):
+            received(client)
+
+            # server fills the stream window, which does not grow on reception
+            server.send_stream_data(1, b"Z" * 65536)
+            for i in range(10):
+                roundtrip(server, client)
+            assert received(client) == 16384
+            stream = client._streams[1]
+            assert stream.max_stream_data_local == 16384
+            assert client._local_max_data.value == 32768
+
+            # STREAM_DATA_BLOCKED does not grant more credit either
+            client._handle_stream_data_blocked_frame(
+                client_receive_context(client),
+                QuicFrameType.STREAM_DATA_BLOCKED,
+                Buffer(data=encode_uint_var(1) + encode_uint_var(16384)),
+            )
+            assert stream.max_stream_data_local == 16384
+
+            # less than half the window is consumed
+            client.stream_data_consumed(1, 4096)
+            roundtrip(client, server)
+            assert stream.max_stream_data_local == 16384
+
+            # more than half the window is consumed
+            client.stream_data_consumed(1, 8192)
+            for i in range(10):
+                roundtrip(client, server)
+            assert stream.max_stream_data_local == 28672
+            assert received(client) == 12288
+
+            # the connection window follows what was consumed
+            assert client._local_max_data_consumed == 12288
+            assert client._local_max_data.value == 32768
+            client.stream_data_consumed(1, 28672)
+            assert client._local_max_data_consumed == 28672
+            for i in range(10):
+                roundtrip(client, server)
+            assert client._local_max_data.value == 61440
+            assert stream.max_stream_data_local == 45056
+            assert received(client) == 16384
+
+    def test_flow_control_on_consumption_reset_stream(self):
+        with client_and_server(
+            client_options={"flow_control_on_consumption": True}
+        ) as (client, server):
+            server.send_stream_data(1, b"Z" * 1000)
+            roundtrip(server, client)
+            client.stream_data_consumed(1, 400)
+
+            # the data left unread is accounted as consumed
+            server.reset_stream(1, QuicErrorCode.NO_ERROR)
+            roundtrip(server, client)
+            assert client._local_max_data_consumed == 1000
+            assert client._streams[1].consumed == 1000
+
+    def test_receive_window_auto_tuning(self):
+        with client_and_server(
+            client_options={"max_stream_data": 65536, "receive_window_budget": 262144}
+        ) as (client, server):
+            server._loss._cc.congestion_window = 1048576
+
+            def update(now):
+                client._loss._rtt_smoothed = 0.1
+                client._update_local_max_stream_data(stream, now=now)
+
+            # the first update starts measuring
+            server.send_stream_data(1, b"Z" * 40000)
+            transfer(server, client)
+            stream = client._streams[1]
+            update(10.0)
+            assert stream.receive_window == 65536
+            assert stream.max_stream_data_local == 105536
+
+            # 40000 bytes in one RTT
+            transfer(client, server)
+            server.send_stream_data(1, b"Z" * 40000)
+            transfer(server, client)
+            update(10.1)
+            assert stream.receive_window == 80000
+            assert stream.max_stream_data_local == 160000
+
+            # the window at most doubles, up to the budget
+            for size, window in ((60000, 160000), (100000, 262144)):
+                transfer(client, server)
+                server.send_stream_data(1, b"Z" * size)
+                transfer(server, client)
+                update(10.11)
+                assert stream.receive_window == window
+            assert stream.max_stream_data_local == 240000 + 262144
+
+    def test_tune_receive_window(self):
+        # twice the bandwidth-delay product
+        assert tune_receive_window(65536, 50000, 0.1, 0.1, 1048576) == 100000
+        # no growth at a lower rate, nor shrinking
+        assert tune_receive_window(65536, 50000, 1.0, 0.1, 1048576) == 65536
+        assert tune_receive_window(65536, 50000, 1.0, 0.1, 32768) == 65536
+        # at most doubling, within the limit
+        assert tune_receive_window(65536, 50000, 0.0, 0.1, 1048576) == 131072
+        assert tune_receive_window(65536, 50000, 0.0, 0.1, 100000) == 100000
+
+    def test_stream_data_consumed(self):
+        with client_and_server() as (client, server):
+            server.send_stream_data(1, b"Z" * 1000)
+            roundtrip(server, client)
+
+            # credit grows on reception, acknowledging data has no effect
+            client.stream_data_consumed(1, 1000)
+            assert client._local_max_data_consumed == 0
+            assert client._streams[1].consumed == 0
+
+            with pytest.raises(ValueError):
+                client.stream_data_consumed(1, -1)
+
+    def test_set_stream_unordered(self):
+        with client_and_server() as (client, server):
+            consume_events(client)
+
+            def receive(offset, data, fin=False, stream_id=1):
+                client._handle_stream_frame(
+                    client_receive_context(client),
+                    QuicFrameType.STREAM_BASE | 6 | fin,
+                    Buffer(
+                        data=encode_uint_var(stream_id)
+                        + encode_uint_var(offset)
+                        + encode_uint_var(len(data))
+                        + data
+                    ),
+                )
+                return client.next_event()
+
+            assert receive(0, b"01234567") == events.StreamDataReceived(
+                data=b"01234567", end_stream=False, stream_id=1, offset=0
+            )
+            assert receive(16, b"6789") is None
+
+            # the data held is delivered
+            client.set_stream_unordered(1)
+            assert client.next_event() == events.StreamDataReceived(
+                data=b"6789", end_stream=False, stream_id=1, offset=16
+            )
+            assert client.next_event() is None
+
+            # data is delivered as it arrives
+            assert receive(24, b"abcd", True) == events.StreamDataReceived(
+                data=b"abcd", end_stream=False, stream_id=1, offset=24
+            )
+            assert receive(4, b"456789012345") == events.StreamDataReceived(
+                data=b"89012345", end_stream=False, stream_id=1, offset=8
+            )
+            assert receive(20, b"0123") == events.StreamDataReceived(
+                data=b"0123", end_stream=True, stream_id=1, offset=20
+            )
+            assert client._local_max_data.used == 28
+
+            with pytest.raises(ValueError) as cm:
+                client.set_stream_unordered(2)
+            assert (
+                str(cm.value)
+                == "Cannot receive on a local-initiated unidirectional stream"
+            )
+
+            # a local stream is created, as when sending on it
+            client.set_stream_unordered(0)
+            assert client.get_next_available_stream_id() == 4
+            assert receive(4, b"4567", stream_id=0) == events.StreamDataReceived(
+                data=b"4567", end_stream=False, stream_id=0, offset=4
+            )
+
+            with pytest.raises(ValueError) as cm:
+                client.set_stream_unordered(5)
+            assert (
+                str(cm.value)
+                == "Cannot receive unordered on an unknown peer-initiated stream"
+            )
+
     def test_send_max_streams_retransmit(self):
         with client_and_server() as (client, server):
             # client opens 65 streams
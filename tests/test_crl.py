@@ -1,7 +1,44 @@
+from __future__ import annotations
+
 from .utils import CRL_DUMMY
-from qh3._hazmat import CertificateRevocationList, ReasonFlags
+from qh3._hazmat import CertificateRevocationList, CryptoError, ReasonFlags
+from qh3.tls import RevocationListStore
+import datetime
+import os
 import ssl
 
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+
+def generate_crl(
+    common_name: str, serial_numbers: list[int], next_update_days: int = 7
+) -> CertificateRevocationList:
+    key = ec.generate_private_key(ec.SECP256R1())
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = (
+        x509.CertificateRevocationListBuilder()
+        .issuer_name(
+            x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, common_name)])
+        )
+        .last_update(now - datetime.timedelta(days=1))
+        .next_update(now + datetime.timedelta(days=next_update_days))
+    )
+    for serial_number in serial_numbers:
+        builder = builder.add_revoked_certificate(
+            x509.RevokedCertificateBuilder()
+            .serial_number(serial_number)
+            .revocation_date(now - datetime.timedelta(days=1))
+            .add_extension(x509.CRLReason(x509.ReasonFlags.key_compromise), False)
+            .build()
+        )
+    crl = builder.sign(key, hashes.SHA256())
+    return CertificateRevocationList(
+        crl.public_bytes(serialization.Encoding.DER)
+    )
+
 
 def test_parse_crl_entries() -> None:
 
@@ -22,6 +59,22 @@ def test_parse_crl_entries() -> None:
 
     assert revocation is None
 
+    # raw serial numbers are looked up as is
+    revocation = crl.is_revoked(bytes.fromhex(revoked_cert.replace(":", "")))
+    assert revocation is not None
+    assert revocation.serial_number == revoked_cert
+    assert revocation.raw_serial_number == bytes.fromhex(revoked_cert.replace(":", ""))
+    assert crl.is_revoked(b"\x05") is None
+    assert crl.is_revoked("not a serial number") is None
+    assert len(crl.revoked_certificates()) == 1825
+
+    # the index survives serialization
+    restored = CertificateRevocationList.deserialize(crl.serialize())
+    assert restored.is_revoked(revoked_cert) is not None
+
+    with pytest.raises(CryptoError):
+        CertificateRevocationList.deserialize(b"not a serialized crl")
+
     assert crl.issuer == "C=US, O=Let's Encrypt, CN=E5"
 
     assert crl.authenticate_for(
@@ -81,3 +134,44 @@ KPpdzvvtTnOPlC7SQZSYmdunr3Bf9b77AiC/ZidstK36dRILKz7OA54=
 """
             )
         )
+
+
+def test_revocation_list_store(tmp_path) -> None:
+    serial_numbers = [i * 7919 for i in range(1, 1001)] + [2**158 + 1]
+    crl = generate_crl("CRL issuer", serial_numbers)
+
+    store = RevocationListStore(tmp_path / "crls")
+    assert store.get(crl.issuer) is None
+    store.add(crl)
+
+    # another process maps the same index
+    index = RevocationListStore(tmp_path / "crls").get(crl.issuer)
+    assert index is not None
+    assert len(index) == 1001
+    for serial_number in (7919, 7919 * 1000, 2**158 + 1):
+        raw = serial_number.to_bytes(
+            (serial_number.bit_length() + 8) // 8, "big", signed=True
+        )
+        assert index.is_revoked(raw) == ReasonFlags.key_compromise
+    assert index.is_revoked(b"\x01") is None
+    assert index.is_revoked(bytes(32)) is None
+    assert RevocationListStore(tmp_path / "crls").get("CN=other") is None
+
+    # a newer CRL of the same issuer replaces the index
+    newer = generate_crl("CRL issuer", [1], next_update_days=14)
+    store.add(newer)
+    assert len(os.listdir(tmp_path / "crls")) == 1
+    index = store.get(crl.issuer)
+    assert len(index) == 1
+    assert index.is_revoked(b"\x01") == ReasonFlags.key_compromise
+
+
+def test_revocation_list_store_expired(tmp_path) -> None:
+    with open(CRL_DUMMY, "rb") as fp:
+        crl = CertificateRevocationList(fp.read())
+
+    # past its nextUpdate, the CRL no longer tells anything
+    store = RevocationListStore(tmp_path)
+    store.add(crl)
+    assert len(os.listdir(tmp_path)) == 1
+    assert store.get(crl.issuer) is None
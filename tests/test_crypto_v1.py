@@ -502,3 +502,96 @@ class TestCrypto:
         truncated = SHORT_SERVER_ENCRYPTED_PACKET[:27]
         with pytest.raises(CryptoError):
             pair.decrypt_packet(truncated, 9, 0)
+
+    def test_seal_batch(self):
+        pair1 = self.create_crypto(is_client=True)
+        pair2 = self.create_crypto(is_client=False)
+        peer_cid = binascii.unhexlify("8394c8f03e515708")
+        header_size = 1 + len(peer_cid) + 2
+        packet_size = header_size + 32
+
+        def layout(buf, packet_start, packet_number, seal):
+            buf.seek(packet_start + header_size)
+            buf.push_bytes(bytes([packet_number]) * (packet_size - header_size))
+            return pair1.finalize_packet(
+                buf,
+                packet_start,
+                packet_size,
+                0,
+                header_size,
+                False,
+                PROTOCOL_VERSION,
+                0,
+                peer_cid,
+                b"",
+                b"",
+                0,
+                packet_number,
+                seal,
+            )
+
+        # enough packets to be sealed on several threads
+        count = 40
+        expected = Buffer(capacity=count * 100)
+        batched = Buffer(capacity=count * 100)
+        packets = []
+        for packet_number in range(count):
+            sent_bytes = layout(expected, expected.tell(), packet_number, True)
+            packet_start = batched.tell()
+            assert layout(batched, packet_start, packet_number, False) == sent_bytes
+            packets.append(
+                (packet_start, header_size, packet_size - header_size, packet_number)
+            )
+
+        pair1.seal_batch(batched, packets)
+        assert batched.data == expected.data
+
+        plain_header, payload, packet_number = pair2.decrypt_packet(
+            batched.data_slice(0, packets[1][0]), header_size - 2, 0
+        )
+        assert plain_header[1:] == peer_cid + b"\x00\x00"
+        assert payload == bytes(packet_size - header_size)
+        assert packet_number == 0
+
+        # packets must lie within the buffer
+        with pytest.raises(CryptoError):
+            pair1.seal_batch(batched, [(batched.capacity - 10, header_size, 32, 0)])
+
+    def test_open_batch(self):
+        pair1 = self.create_crypto(is_client=True)
+        pair2 = self.create_crypto(is_client=False)
+        peer_cid = binascii.unhexlify("8394c8f03e515708")
+
+        def encrypt(packet_number):
+            buf = Buffer(capacity=100)
+            buf.push_uint8(PACKET_FIXED_BIT | pair1.key_phase << 2 | 1)
+            buf.push_bytes(peer_cid)
+            buf.push_uint16(packet_number)
+            return pair1.encrypt_packet(
+                buf.data, bytes([packet_number]) * 4, packet_number
+            )
+
+        packet0 = encrypt(0)
+        packet1 = encrypt(1)
+        pair1.update_key()
+        packet2 = encrypt(2)
+        packet3 = encrypt(3)
+
+        results = pair2.open_batch(
+            [packet0, packet2, packet1, b"\x40" + bytes(40), packet3], 9, 0
+        )
+        assert [r[2] if r is not None else None for r in results] == [
+            0,
+            2,
+            1,
+            None,
+            3,
+        ]
+        assert results[1][0][0] & 4
+        assert results[2][1] == b"\x01" * 4
+        assert results[4][1] == b"\x03" * 4
+        assert pair2.key_phase == 1
+
+        # no keys
+        with pytest.raises(CryptoError):
+            CryptoPair().open_batch([packet0], 9, 0)
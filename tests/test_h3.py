@@ -1,17 +1,21 @@
 from __future__ import annotations
 
 import pytest
+import array
 import binascii
 import contextlib
 import copy
 
-from qh3._hazmat import Buffer, encode_uint_var
+import qh3.h3.connection
+
+from qh3._hazmat import Buffer, QpackDecoder, QpackEncoder, encode_uint_var
 from qh3.h3.connection import (
     H3_ALPN,
     ErrorCode,
     FrameType,
     FrameUnexpected,
     H3Connection,
+    HeaderTemplate,
     MessageError,
     Setting,
     SettingsError,
@@ -26,6 +30,7 @@ from qh3.h3.connection import (
 )
 from qh3.h3.events import DataReceived, HeadersReceived, PushPromiseReceived, InformationalHeadersReceived, StreamReset as H3StreamReset, StopSending as H3StopSending
 from qh3.h3.exceptions import NoAvailablePushIDError
+from qh3.h3.qpack import QpackTableSizer, count_table_hits
 from qh3.quic.configuration import QuicConfiguration
 from qh3.quic.events import StreamDataReceived, StreamReset as QuicStreamReset, StopSendingReceived
 from qh3.quic.logger import QuicLogger
@@ -727,6 +732,241 @@ class TestH3Connection:
             # make third request -> dynamic table
             self._make_request(h3_client, h3_server)
 
+    def test_qpack_settings(self):
+        options = dict(
+            QUIC_CONFIGURATION_OPTIONS,
+            qpack_max_table_capacity=16384,
+            qpack_blocked_streams=32,
+        )
+        with h3_client_and_server(options) as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+            assert h3_client.sent_settings[Setting.QPACK_MAX_TABLE_CAPACITY] == 16384
+            assert h3_client.sent_settings[Setting.QPACK_BLOCKED_STREAMS] == 32
+
+            for _ in range(3):
+                self._make_request(h3_client, h3_server)
+            assert h3_server.received_settings[Setting.QPACK_MAX_TABLE_CAPACITY] == (
+                16384
+            )
+
+    def test_qpack_encoder_stats(self):
+        options = dict(QUIC_CONFIGURATION_OPTIONS, qpack_encoder_stats=True)
+        with h3_client_and_server(options) as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            self._make_request(h3_client, h3_server)
+            stats = h3_server.qpack_encoder_stats
+            assert stats.header_blocks == 1
+            assert stats.field_lines == 3
+            assert stats.uncompressed_bytes == 57
+            assert stats.static_table_hits == 2
+
+            # later responses reference the dynamic table
+            self._make_request(h3_client, h3_server)
+            self._make_request(h3_client, h3_server)
+            assert stats.header_blocks == 3
+            assert stats.field_lines == 9
+            assert stats.dynamic_table_hits > 0
+            assert stats.dynamic_table_hit_ratio == stats.dynamic_table_hits / 9
+            assert stats.dynamic_header_blocks > 0
+            assert stats.bytes_saved == (
+                stats.uncompressed_bytes
+                - stats.header_block_bytes
+                - stats.encoder_stream_bytes
+            )
+
+    def test_qpack_encoder_stats_disabled(self):
+        with h3_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            self._make_request(h3_client, h3_server)
+            assert h3_client.qpack_encoder_stats is None
+            assert h3_server.qpack_encoder_stats is None
+
+    def test_qpack_table_sizer(self):
+        sizer = QpackTableSizer(min_capacity=64, max_capacity=4096)
+        options = dict(QUIC_CONFIGURATION_OPTIONS, qpack_table_sizer=sizer)
+        with h3_client_and_server(options) as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+            assert h3_client.sent_settings[Setting.QPACK_MAX_TABLE_CAPACITY] == 64
+
+            for _ in range(3):
+                self._make_request(h3_client, h3_server)
+
+        # the repeated fields, as seen from both ends, outgrow the minimum
+        assert sizer.capacity > 64
+        with h3_client_and_server(options) as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            assert (
+                h3_client.sent_settings[Setting.QPACK_MAX_TABLE_CAPACITY]
+                == sizer.capacity
+            )
+
+    def test_send_headers_with_template(self):
+        template = HeaderTemplate(
+            [
+                (b":status", b"200"),
+                (b"content-type", b"text/html; charset=utf-8"),
+                (b"x-frame-options", b"DENY"),
+            ]
+        )
+        options = dict(QUIC_CONFIGURATION_OPTIONS, qpack_encoder_stats=True)
+        with h3_client_and_server(options) as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            for length in (b"5", b"12", b"5"):
+                stream_id = quic_client.get_next_available_stream_id()
+                h3_client.send_headers(
+                    stream_id=stream_id,
+                    headers=[
+                        (b":method", b"GET"),
+                        (b":scheme", b"https"),
+                        (b":authority", b"localhost"),
+                        (b":path", b"/"),
+                    ],
+                    end_stream=True,
+                )
+                h3_transfer(quic_client, h3_server)
+
+                # the varying fields sit between the template's pseudo-headers
+                # and regular headers
+                h3_server.send_headers(
+                    stream_id=stream_id,
+                    headers=[(b"content-length", length), (b"x-foo", b"server")],
+                    end_stream=True,
+                    template=template,
+                )
+                events = h3_transfer(quic_server, h3_client)
+                assert events == [
+                    HeadersReceived(
+                        headers=[
+                            (b":status", b"200"),
+                            (b"content-length", length),
+                            (b"x-foo", b"server"),
+                            (b"content-type", b"text/html; charset=utf-8"),
+                            (b"x-frame-options", b"DENY"),
+                        ],
+                        stream_id=stream_id,
+                        stream_ended=True,
+                    )
+                ]
+
+            stats = h3_server.qpack_encoder_stats
+            assert stats is not None
+            assert stats.header_blocks == 3
+            assert stats.field_lines == 15
+            assert stats.dynamic_table_hits > 0
+
+            # a template alone
+            stream_id = quic_client.get_next_available_stream_id()
+            h3_client.send_headers(
+                stream_id=stream_id,
+                headers=[
+                    (b":method", b"GET"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+                end_stream=True,
+            )
+            h3_transfer(quic_client, h3_server)
+            h3_server.send_headers(
+                stream_id=stream_id, headers=[], end_stream=True, template=template
+            )
+            events = h3_transfer(quic_server, h3_client)
+            assert events == [
+                HeadersReceived(
+                    headers=template.expand([]), stream_id=stream_id, stream_ended=True
+                )
+            ]
+
+    def test_send_headers_with_informational_template(self):
+        with h3_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            stream_id = quic_client.get_next_available_stream_id()
+            h3_client.send_headers(
+                stream_id=stream_id,
+                headers=[
+                    (b":method", b"GET"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+                end_stream=True,
+            )
+            h3_transfer(quic_client, h3_server)
+
+            # a 103 Early Hints template does not count as the response
+            h3_server.send_headers(
+                stream_id=stream_id,
+                headers=[(b"link", b"</style.css>; rel=preload")],
+                template=HeaderTemplate([(b":status", b"103")]),
+            )
+            h3_server.send_headers(
+                stream_id=stream_id,
+                headers=[],
+                template=HeaderTemplate([(b":status", b"200")]),
+            )
+            h3_server.send_data(stream_id=stream_id, data=b"", end_stream=True)
+            events = h3_transfer(quic_server, h3_client)
+            assert events == [
+                InformationalHeadersReceived(
+                    headers=[
+                        (b":status", b"103"),
+                        (b"link", b"</style.css>; rel=preload"),
+                    ],
+                    stream_id=stream_id,
+                ),
+                HeadersReceived(
+                    headers=[(b":status", b"200")],
+                    stream_id=stream_id,
+                    stream_ended=False,
+                ),
+                DataReceived(data=b"", stream_id=stream_id, stream_ended=True),
+            ]
+
+    def test_header_template_invalid(self):
+        with pytest.raises(MessageError) as cm:
+            HeaderTemplate([(b"X-Foo", b"bar")])
+        assert cm.value.reason_phrase == "Header b'X-Foo' contains uppercase letters"
+
+        with pytest.raises(MessageError) as cm:
+            HeaderTemplate([(b"x-foo", b"bar"), (b":status", b"200")])
+        assert cm.value.reason_phrase == (
+            "Pseudo-header b':status' is not allowed after regular headers"
+        )
+
+        with pytest.raises(MessageError) as cm:
+            HeaderTemplate([(b":status", b"200"), (b":status", b"204")])
+        assert cm.value.reason_phrase == "Pseudo-header b':status' is included twice"
+
+        with pytest.raises(MessageError):
+            HeaderTemplate([(b"x-foo", b"\xff")])
+
+    def test_request_validated_by_decoder(self, monkeypatch):
+        # valid header lists do not go through a second pass in Python
+        def validate(headers):
+            raise AssertionError("validated twice")
+
+        for name in (
+            "validate_request_headers",
+            "validate_response_headers",
+            "validate_trailers",
+        ):
+            monkeypatch.setattr(qh3.h3.connection, name, validate)
+
+        with h3_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+            self._make_request(h3_client, h3_server)
+
     def test_request_headers_only(self):
         with h3_client_and_server() as (quic_client, quic_server):
             h3_client = H3Connection(quic_client)
@@ -1552,6 +1792,90 @@ class TestH3Connection:
                 ),
             ]
 
+    def test_send_data_buffer_protocol(self):
+        with h3_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            stream_id = quic_client.get_next_available_stream_id()
+            h3_client.send_headers(
+                stream_id=stream_id,
+                headers=[
+                    (b":method", b"POST"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+            )
+            body = bytearray(b"0123456789")
+            h3_client.send_data(stream_id=stream_id, data=body, end_stream=False)
+            body[:] = b"xxxxxxxxxx"
+            h3_client.send_data(
+                stream_id=stream_id,
+                data=memoryview(b"--abcdef--")[2:8],
+                end_stream=False,
+            )
+            h3_client.send_data(
+                stream_id=stream_id,
+                data=memoryview(array.array("H", [0x4142])),
+                end_stream=True,
+            )
+
+            events = h3_transfer(quic_client, h3_server)
+            assert b"".join(
+                event.data for event in events if isinstance(event, DataReceived)
+            ) == b"0123456789abcdef" + array.array("H", [0x4142]).tobytes()
+            assert events[-1].stream_ended
+
+    def test_request_flow_control_on_consumption(self):
+        with h3_client_and_server(
+            {
+                **QUIC_CONFIGURATION_OPTIONS,
+                "flow_control_on_consumption": True,
+                "max_stream_data": 16384,
+            }
+        ) as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            def exchange():
+                events = []
+                for i in range(10):
+                    events += h3_transfer(quic_client, h3_server)
+                    transfer(quic_server, quic_client)
+                return events
+
+            stream_id = quic_client.get_next_available_stream_id()
+            h3_client.send_headers(
+                stream_id=stream_id,
+                headers=[
+                    (b":method", b"POST"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+            )
+            h3_client.send_data(stream_id=stream_id, data=b"Z" * 65536, end_stream=True)
+
+            # the frame headers and HEADERS frame are acknowledged by the
+            # connection, the body is not
+            events = exchange()
+            assert isinstance(events[0], HeadersReceived)
+            body = sum(len(e.data) for e in events if isinstance(e, DataReceived))
+            stream = quic_server._streams[stream_id]
+            assert stream.receiver.highest_offset == 16384
+            assert stream.consumed == 16384 - body
+
+            # the application reads the body
+            received = body
+            while not events[-1].stream_ended:
+                h3_server.stream_data_consumed(stream_id, body)
+                events = exchange()
+                body = sum(len(e.data) for e in events if isinstance(e, DataReceived))
+                assert 0 < body <= 16384
+                received += body
+            assert received == 65536
+
     def test_request_with_trailers(self):
         with h3_client_and_server() as (quic_client, quic_server):
             h3_client = H3Connection(quic_client)
@@ -2246,3 +2570,81 @@ class TestH3Parser:
             )
         assert cm.value.reason_phrase == \
             "Pseudo-header b':authority' is not allowed after regular headers"
+
+
+class TestQpack:
+    def test_decode_and_validate(self):
+        encoder = QpackEncoder()
+        encoder.apply_settings(0, 0, 0)
+
+        def decode(headers, kind):
+            decoder = QpackDecoder(4096, 16)
+            _, frame_data = encoder.encode(0, headers)
+            return decoder.feed_header(0, frame_data, kind)
+
+        request = [
+            (b":method", b"GET"),
+            (b":scheme", b"https"),
+            (b":authority", b"localhost"),
+            (b":path", b"/index.html"),
+            (b"x-foo", b"bar"),
+        ]
+        assert decode(request, 1) == (b"", request, (b"GET", b"/index.html", None))
+        assert decode(request, 0)[2] is None
+        assert decode(request, 2)[2] is None
+
+        response = [(b":status", b"204"), (b"x-foo", b"bar")]
+        assert decode(response, 2)[2] == (None, None, 204)
+
+        # invalid header lists are left for Python to report
+        for headers, kind in [
+            ([(b":status", b"200"), (b"X-Foo", b"bar")], 2),
+            ([(b"x-foo", b"bar"), (b":status", b"200")], 2),
+            ([(b":status", b"200"), (b":status", b"200")], 2),
+            ([(b":status", b"abc")], 2),
+            ([(b":method", b"GET"), (b":scheme", b"https")], 1),
+            ([(b":method", b"GET"), (b":authority", b""), (b":scheme", b"https")], 1),
+            ([(b":path", b"/")], 4),
+            (request[:4] + [(b":protocol", b"websocket")], 3),
+        ]:
+            assert decode(headers, kind)[2] is None
+
+    def test_count_table_hits(self):
+        # Required Insert Count 2, Delta Base 0, then an indexed static field
+        # line, an indexed dynamic field line, an indexed post-base field line,
+        # a literal with a static name reference and a literal name
+        frame_data = (
+            b"\x03\x00"
+            + b"\xd1"
+            + b"\x80"
+            + b"\x10"
+            + b"\x5f\x1d\x03foo"
+            + b"\x23bar\x03baz"
+        )
+        assert count_table_hits(frame_data) == (2, 1)
+
+        # truncated blocks are counted up to where they stop
+        assert count_table_hits(frame_data[:4]) == (1, 1)
+        assert count_table_hits(b"") == (0, 0)
+
+    def test_table_sizer(self):
+        sizer = QpackTableSizer(min_capacity=100, max_capacity=200, max_fields=2)
+        assert sizer.capacity == 100
+
+        sizer.observe([(b"a" * 40, b"1")])
+        assert sizer.capacity == 100
+
+        # repeated fields take their entry size
+        sizer.observe([(b"a" * 40, b"1"), (b"b" * 40, b"2")])
+        sizer.observe([(b"b" * 40, b"2")])
+        assert sizer.capacity == 146
+
+        # within the bounds
+        sizer.observe([(b"b" * 40, b"2"), (b"a" * 40, b"1")])
+        assert sizer.capacity == 146
+        sizer.observe([(b"c" * 200, b"3"), (b"c" * 200, b"3")])
+        assert sizer.capacity == 200
+
+        # forgotten fields no longer count
+        sizer.observe([(b"d", b"4"), (b"e", b"5")])
+        assert sizer.capacity == 100
@@ -147,8 +147,6 @@ class TestPacket:
             # This value is arbitrary, we set it to match the value in the RFC.
             unused=0xF,
         )
-        with open("bob.bin", "wb") as fp:
-            fp.write(encoded)
         assert encoded == data
 
     def test_pull_retry_v2(self):
@@ -189,8 +187,6 @@ class TestPacket:
             # This value is arbitrary, we set it to match the value in the RFC.
             unused=0xF,
         )
-        with open("bob.bin", "wb") as fp:
-            fp.write(encoded)
         assert encoded == data
 
     def test_pull_version_negotiation(self):
@@ -653,3 +653,64 @@ class TestQuicPacketBuilder:
                     sent_bytes=29,
                 ) \
             ]
+
+    def test_reset(self):
+        builder = create_builder()
+        crypto = create_crypto()
+
+        # first round is limited by the amplification budget
+        builder.max_total_bytes = 500
+        builder.start_packet(QuicPacketType.ONE_RTT, crypto)
+        builder.start_frame(QuicFrameType.PING)
+        datagrams, packets = builder.flush()
+        assert len(datagrams) == 1
+        buffer = builder._buffer
+
+        # same datagram size, the buffer is kept and limits are cleared
+        builder.reset(
+            host_cid=bytes(8),
+            peer_cid=bytes(8),
+            version=QuicProtocolVersion.VERSION_1,
+            max_datagram_size=1280,
+        )
+        assert builder._buffer is buffer
+        assert builder.max_total_bytes is None
+        assert builder.packet_numbers[Epoch.ONE_RTT] == 1
+
+        builder.start_packet(QuicPacketType.ONE_RTT, crypto)
+        assert builder.remaining_flight_space == 1253
+        builder.start_frame(QuicFrameType.PING)
+        datagrams, packets = builder.flush()
+        assert len(datagrams) == 1
+        assert packets[0].packet_number == 1
+
+        # different datagram size, a new buffer is allocated
+        builder.reset(
+            host_cid=bytes(8),
+            peer_cid=bytes(8),
+            version=QuicProtocolVersion.VERSION_1,
+            max_datagram_size=1350,
+        )
+        assert builder._buffer is not buffer
+        builder.start_packet(QuicPacketType.ONE_RTT, crypto)
+        assert builder.remaining_flight_space == 1323
+
+    def test_reset_single_datagram(self):
+        builder = create_builder()
+        crypto = create_crypto()
+
+        # a probe builder only ever holds one datagram
+        builder.reset(
+            host_cid=bytes(8),
+            peer_cid=bytes(8),
+            version=QuicProtocolVersion.VERSION_1,
+            max_datagram_size=1452,
+            max_datagrams=1,
+        )
+        assert builder._buffer.capacity == 1452
+
+        builder.start_packet(QuicPacketType.ONE_RTT, crypto)
+        buf = builder.start_frame(QuicFrameType.PADDING)
+        buf.push_bytes(bytes(builder.remaining_flight_space))
+        datagrams, packets = builder.flush()
+        assert [len(d) for d in datagrams] == [1452]
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import datetime
+import os
+import ssl
+
+from qh3.quic.configuration import QuicConfiguration
+from qh3.quic.session_cache import SessionCache
+from qh3.tls import CipherSuite, SessionTicket, utcnow
+
+from .utils import SERVER_CACERTFILE
+
+
+def create_configuration(server_name: str = "localhost", **kwargs) -> QuicConfiguration:
+    return QuicConfiguration(is_client=True, server_name=server_name, **kwargs)
+
+
+def create_ticket(ticket: bytes, lifetime: int = 3600) -> SessionTicket:
+    now = utcnow()
+    return SessionTicket(
+        age_add=1,
+        cipher_suite=CipherSuite.AES_128_GCM_SHA256,
+        not_valid_after=now + datetime.timedelta(seconds=lifetime),
+        not_valid_before=now,
+        resumption_secret=bytes(32),
+        server_name="localhost",
+        ticket=ticket,
+        max_early_data_size=0xFFFFFFFF,
+        other_extensions=[(0x39, b"transport parameters")],
+        alpn_protocol="h3",
+    )
+
+
+class TestSessionCache:
+    def test_get_and_add(self):
+        cache = SessionCache(max_tickets=2)
+        configuration = create_configuration(alpn_protocols=["h3"])
+        assert cache.get(configuration, 443) is None
+
+        cache.add(configuration, 443, create_ticket(b"1"))
+        cache.add(configuration, 443, create_ticket(b"2"))
+        cache.add(configuration, 443, create_ticket(b"3"))
+        assert len(cache) == 1
+
+        # the origin is the server name, port and ALPN protocols
+        assert cache.get(configuration, 4433) is None
+        assert cache.get(create_configuration(), 443) is None
+        assert (
+            cache.get(create_configuration("other", alpn_protocols=["h3"]), 443) is None
+        )
+
+        # tickets are handed out once, most recent first
+        assert cache.get(configuration, 443).ticket == b"3"
+        assert cache.get(configuration, 443).ticket == b"2"
+        assert cache.get(configuration, 443) is None
+        assert len(cache) == 0
+
+    def test_get_other_verification(self):
+        cache = SessionCache()
+        cache.add(
+            create_configuration(verify_mode=ssl.CERT_NONE), 443, create_ticket(b"1")
+        )
+
+        # a session established without verification is not resumed by a
+        # verifying connection, nor with other trust anchors
+        assert cache.get(create_configuration(), 443) is None
+        assert cache.get(create_configuration(cafile=SERVER_CACERTFILE), 443) is None
+        assert (
+            cache.get(create_configuration(verify_mode=ssl.CERT_NONE), 443).ticket
+            == b"1"
+        )
+
+    def test_get_early_data(self):
+        cache = SessionCache()
+        configuration = create_configuration()
+        cache.add(configuration, 443, create_ticket(b"1"))
+        assert cache.get(configuration, 443).max_early_data_size is None
+
+        cache = SessionCache(early_data=True)
+        cache.add(configuration, 443, create_ticket(b"1"))
+        assert cache.get(configuration, 443).max_early_data_size == 0xFFFFFFFF
+
+    def test_get_expired(self):
+        cache = SessionCache()
+        configuration = create_configuration()
+        cache.add(configuration, 443, create_ticket(b"1", lifetime=-1))
+        assert cache.get(configuration, 443) is None
+
+    def test_max_entries(self):
+        cache = SessionCache(max_entries=2)
+        cache.add(create_configuration("a.example"), 443, create_ticket(b"a"))
+        cache.add(create_configuration("b.example"), 443, create_ticket(b"b"))
+        cache.add(create_configuration("a.example"), 443, create_ticket(b"a2"))
+        cache.add(create_configuration("c.example"), 443, create_ticket(b"c"))
+        assert len(cache) == 2
+
+        # the least recently used origin was evicted
+        assert cache.get(create_configuration("b.example"), 443) is None
+        assert cache.get(create_configuration("a.example"), 443).ticket == b"a2"
+        assert cache.get(create_configuration("c.example"), 443).ticket == b"c"
+
+    def test_persistence(self, tmp_path):
+        path = tmp_path / "tickets.json"
+        configuration = create_configuration(alpn_protocols=["h3"])
+        ticket = create_ticket(b"1")
+
+        cache = SessionCache(path=path, early_data=True)
+        cache.add(configuration, 443, ticket)
+        cache.flush()
+        if os.name == "posix":
+            assert path.stat().st_mode & 0o777 == 0o600
+
+        cache = SessionCache(path=path, early_data=True)
+        assert cache.get(configuration, 443) == ticket
+
+        # the ticket was taken
+        cache.flush()
+        assert len(SessionCache(path=path)) == 0
+
+        cache.add(configuration, 443, ticket)
+        cache.clear()
+        cache.flush()
+        assert len(SessionCache(path=path)) == 0
+        assert os.listdir(tmp_path) == ["tickets.json"]
+
+    def test_persistence_corrupt(self, tmp_path):
+        path = tmp_path / "tickets.json"
+        path.write_text("{not json")
+
+        cache = SessionCache(path=path)
+        assert len(cache) == 0
+        cache.add(create_configuration(), 443, create_ticket(b"1"))
+        cache.flush()
+        assert len(SessionCache(path=path)) == 1
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import sys
+
 import pytest
 
-from qh3.quic.events import StreamDataReceived, StreamReset
+from qh3._hazmat import Buffer, fill_stream_frames, pull_stream_frame
 from qh3.quic.packet import QuicErrorCode
 from qh3.quic.packet_builder import QuicDeliveryState
 from qh3.quic.stream import FinalSizeError, QuicStream
@@ -11,13 +13,11 @@ from qh3.quic.stream import FinalSizeError, QuicStream
 class TestQuicStream:
     def test_receiver_empty(self):
         stream = QuicStream(stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 0
 
         # empty
         assert stream.receiver.handle_frame(0, b"") == None
-        assert bytes(stream.receiver._buffer) == b""
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 0
 
@@ -26,8 +26,7 @@ class TestQuicStream:
 
         # add data at start
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"01234567", False, 0)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 8
         assert stream.receiver.highest_offset == 8
@@ -35,8 +34,7 @@ class TestQuicStream:
 
         # add more data
         assert stream.receiver.handle_frame(8, b"89012345") == \
-            StreamDataReceived(data=b"89012345", end_stream=False, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"89012345", False, 8)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 16
         assert stream.receiver.highest_offset == 16
@@ -45,8 +43,7 @@ class TestQuicStream:
         # add data and fin
         assert stream.receiver.handle_frame(16, b"67890123", True
             ) == \
-            StreamDataReceived(data=b"67890123", end_stream=True, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"67890123", True, 16)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 24
         assert stream.receiver.highest_offset == 24
@@ -58,15 +55,13 @@ class TestQuicStream:
         # add data at offset 8
         assert stream.receiver.handle_frame(8, b"89012345") == \
             None
-        assert bytes(stream.receiver._buffer) == b"\x00\x00\x00\x00\x00\x00\x00\x0089012345"
         assert list(stream.receiver._ranges) == [(8, 16)]
         assert stream.receiver._buffer_start == 0
         assert stream.receiver.highest_offset == 16
 
         # add data at offset 0
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"0123456789012345", end_stream=False, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"0123456789012345", False, 0)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 16
         assert stream.receiver.highest_offset == 16
@@ -76,14 +71,12 @@ class TestQuicStream:
 
         # add data at offset 0
         assert stream.receiver.handle_frame(0, b"") == None
-        assert bytes(stream.receiver._buffer) == b""
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 0
         assert stream.receiver.highest_offset == 0
 
         # add data at offset 8
         assert stream.receiver.handle_frame(8, b"") == None
-        assert bytes(stream.receiver._buffer) == b"\x00\x00\x00\x00\x00\x00\x00\x00"
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 0
         assert stream.receiver.highest_offset == 8
@@ -93,21 +86,18 @@ class TestQuicStream:
 
         # add data at offset 0
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"01234567", False, 0)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 8
 
         # add data again at offset 0
         assert stream.receiver.handle_frame(0, b"01234567") == \
             None
-        assert bytes(stream.receiver._buffer) == b""
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 8
 
         # add data again at offset 0
         assert stream.receiver.handle_frame(0, b"01") == None
-        assert bytes(stream.receiver._buffer) == b""
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 8
 
@@ -115,12 +105,11 @@ class TestQuicStream:
         stream = QuicStream(stream_id=0)
 
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0)
+            (b"01234567", False, 0)
 
         assert stream.receiver.handle_frame(0, b"0123456789012345"
             ) == \
-            StreamDataReceived(data=b"89012345", end_stream=False, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"89012345", False, 8)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 16
 
@@ -128,26 +117,169 @@ class TestQuicStream:
         stream = QuicStream(stream_id=0)
 
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0)
+            (b"01234567", False, 0)
 
         assert stream.receiver.handle_frame(16, b"abcdefgh") == \
             None
 
         assert stream.receiver.handle_frame(2, b"23456789012345"
             ) == \
-            StreamDataReceived(data=b"89012345abcdefgh", end_stream=False, stream_id=0)
-        assert bytes(stream.receiver._buffer) == b""
+            (b"89012345abcdefgh", False, 8)
         assert list(stream.receiver._ranges) == []
         assert stream.receiver._buffer_start == 24
 
+    def test_receiver_overlapping(self):
+        stream = QuicStream(stream_id=0)
+
+        assert stream.receiver.handle_frame(4, b"4567") == None
+        assert stream.receiver.handle_frame(12, b"2345") == None
+        assert list(stream.receiver._ranges) == [(4, 8), (12, 16)]
+
+        # spans both chunks and the gap between them
+        assert stream.receiver.handle_frame(6, b"6789012345678") == None
+        assert list(stream.receiver._ranges) == [(4, 19)]
+
+        assert stream.receiver.handle_frame(0, b"012345") == (
+            b"0123456789012345678",
+            False,
+            0,
+        )
+        assert list(stream.receiver._ranges) == []
+        assert stream.receiver._buffer_start == 19
+        assert stream.receiver.highest_offset == 19
+
+    def test_receiver_overlapping_frames_fill_gaps(self):
+        stream = QuicStream(stream_id=0)
+        data = bytes(i % 256 for i in range(2400))
+
+        # every other byte is held, leaving 1-byte gaps
+        for offset in range(2, 1201, 2):
+            frame = data[offset : offset + 1]
+            assert stream.receiver.handle_frame(offset, frame) == None
+
+        # a piece spanning most of its frame references it
+        frame = data[1199:2399]
+        refcount = sys.getrefcount(frame)
+        assert stream.receiver.handle_frame(1199, frame) == None
+        assert sys.getrefcount(frame) == refcount + 1
+
+        # each frame fills a single gap, overlapping the data held
+        for offset in range(1197, 0, -2):
+            frame = data[offset : offset + 1200]
+            refcount = sys.getrefcount(frame)
+            assert stream.receiver.handle_frame(offset, frame) == None
+            # the byte kept is copied rather than pinning the whole frame
+            assert sys.getrefcount(frame) == refcount
+        assert list(stream.receiver._ranges) == [(1, 2399)]
+
+        assert stream.receiver.handle_frame(0, data[:1]) == (data[:2399], False, 0)
+        assert list(stream.receiver._ranges) == []
+
+    def test_receiver_hands_out_frame_data(self):
+        stream = QuicStream(stream_id=0)
+
+        # in order
+        data = b"01234567"
+        assert stream.receiver.handle_frame(0, data)[0] is data
+
+        # out of order, the frame is delivered once the gap is filled
+        data = b"abcdefgh"
+        assert stream.receiver.handle_frame(16, data) == None
+        assert stream.receiver.handle_frame(8, b"89012345") == (
+            b"89012345abcdefgh",
+            False,
+            8,
+        )
+
+        # in order while later data is held
+        assert stream.receiver.handle_frame(36, b"ijklmnop") == None
+        data = b"qrstuvwx"
+        assert stream.receiver.handle_frame(24, data)[0] is data
+        assert list(stream.receiver._ranges) == [(36, 44)]
+        assert stream.receiver._buffer_start == 32
+
+    def test_receiver_reset_drops_data(self):
+        stream = QuicStream(stream_id=0)
+
+        assert stream.receiver.handle_frame(8, b"89012345") == None
+        assert list(stream.receiver._ranges) == [(8, 16)]
+
+        stream.receiver.handle_reset(final_size=16)
+        assert list(stream.receiver._ranges) == []
+        assert stream.receiver.is_finished
+
+    def test_receiver_unordered_mode(self):
+        stream = QuicStream(stream_id=0)
+        assert stream.receiver.set_unordered() == []
+        assert stream.receiver.unordered
+
+        # data is delivered as it arrives
+        data = b"89012345"
+        assert stream.receiver.handle_frame(8, data, True) == (data, False, 8)
+        assert stream.receiver.handle_frame(8, data, True) is None
+        assert stream.receiver.highest_offset == 16
+        assert list(stream.receiver._ranges) == []
+        assert not stream.receiver.is_finished
+
+        # data already received is trimmed
+        assert stream.receiver.handle_frame(0, b"0123456789") == (
+            b"01234567",
+            True,
+            0,
+        )
+        assert stream.receiver.is_finished
+
+        # data beyond final size
+        with pytest.raises(FinalSizeError) as cm:
+            stream.receiver.handle_frame(16, b"6")
+        assert str(cm.value) == "Data received beyond final size"
+
+    def test_receiver_unordered_mode_fin_without_data(self):
+        stream = QuicStream(stream_id=0)
+        stream.receiver.set_unordered()
+
+        assert stream.receiver.handle_frame(0, b"01234567") == (
+            b"01234567",
+            False,
+            0,
+        )
+        assert stream.receiver.handle_frame(8, b"", True) == (b"", True, 8)
+        assert stream.receiver.is_finished
+
+    def test_receiver_unordered_mode_held_data(self):
+        stream = QuicStream(stream_id=0)
+
+        assert stream.receiver.handle_frame(0, b"01234567") == (
+            b"01234567",
+            False,
+            0,
+        )
+        assert stream.receiver.handle_frame(16, b"6789") == None
+        assert stream.receiver.handle_frame(24, b"45678901") == None
+
+        # the data held is handed out when switching
+        assert stream.receiver.set_unordered() == [(b"6789", 16), (b"45678901", 24)]
+        assert list(stream.receiver._ranges) == []
+        assert stream.receiver.set_unordered() == []
+
+        # only the data not received yet is delivered
+        assert stream.receiver.handle_frame(4, b"456789012345") == (
+            b"89012345",
+            False,
+            8,
+        )
+        assert stream.receiver.handle_frame(20, b"0123") == (b"0123", False, 20)
+        assert stream.receiver.handle_frame(32, b"", True) == (b"", True, 32)
+        assert stream.receiver.is_finished
+
     def test_receiver_fin(self):
         stream = QuicStream(stream_id=0)
 
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0)
+            (b"01234567", False, 0)
         assert stream.receiver.handle_frame(8, b"89012345", True
             ) == \
-            StreamDataReceived(data=b"89012345", end_stream=True, stream_id=0)
+            (b"89012345", True, 8)
 
     def test_receiver_fin_out_of_order(self):
         stream = QuicStream(stream_id=0)
@@ -161,7 +293,7 @@ class TestQuicStream:
 
         # add data at offset 0
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"0123456789012345", end_stream=True, stream_id=0)
+            (b"0123456789012345", True, 0)
         assert stream.receiver.highest_offset == 16
         assert stream.receiver.is_finished
 
@@ -182,43 +314,38 @@ class TestQuicStream:
     def test_receiver_fin_twice(self):
         stream = QuicStream(stream_id=0)
         assert stream.receiver.handle_frame(0, b"01234567") == \
-            StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0)
+            (b"01234567", False, 0)
         assert stream.receiver.handle_frame(8, b"89012345", True
             ) == \
-            StreamDataReceived(data=b"89012345", end_stream=True, stream_id=0)
+            (b"89012345", True, 8)
 
         assert stream.receiver.handle_frame(8, b"89012345", True
             ) == \
-            StreamDataReceived(data=b"", end_stream=True, stream_id=0)
+            (b"", True, 16)
 
     def test_receiver_fin_without_data(self):
         stream = QuicStream(stream_id=0)
         assert stream.receiver.handle_frame(0, b"", True) == \
-            StreamDataReceived(data=b"", end_stream=True, stream_id=0)
+            (b"", True, 0)
 
     def test_receiver_reset(self):
         stream = QuicStream(stream_id=0)
-        assert stream.receiver.handle_reset(final_size=4) == \
-            StreamReset(error_code=QuicErrorCode.NO_ERROR, stream_id=0)
+        stream.receiver.handle_reset(final_size=4)
         assert stream.receiver.is_finished
 
     def test_receiver_reset_after_fin(self):
         stream = QuicStream(stream_id=0)
         stream.receiver.handle_frame(0, b"0123", True)
-        assert stream.receiver.handle_reset(final_size=4) == \
-            StreamReset(error_code=QuicErrorCode.NO_ERROR, stream_id=0)
+        stream.receiver.handle_reset(final_size=4)
 
     def test_receiver_reset_twice(self):
         stream = QuicStream(stream_id=0)
-        assert stream.receiver.handle_reset(final_size=4) == \
-            StreamReset(error_code=QuicErrorCode.NO_ERROR, stream_id=0)
-        assert stream.receiver.handle_reset(final_size=4) == \
-            StreamReset(error_code=QuicErrorCode.NO_ERROR, stream_id=0)
+        stream.receiver.handle_reset(final_size=4)
+        stream.receiver.handle_reset(final_size=4)
 
     def test_receiver_reset_twice_final_size_error(self):
         stream = QuicStream(stream_id=0)
-        assert stream.receiver.handle_reset(final_size=4) == \
-            StreamReset(error_code=QuicErrorCode.NO_ERROR, stream_id=0)
+        stream.receiver.handle_reset(final_size=4)
 
         with pytest.raises(FinalSizeError) as cm:
             stream.receiver.handle_reset(final_size=5)
@@ -247,8 +374,8 @@ class TestQuicStream:
         assert stream.receiver.stop_pending
 
         # stop is sent
-        frame = stream.receiver.get_stop_frame()
-        assert frame.error_code == QuicErrorCode.NO_ERROR
+        error_code, stream_id = stream.receiver.get_stop_frame()
+        assert error_code == QuicErrorCode.NO_ERROR
         assert not stream.receiver.stop_pending
 
         # stop is acklowledged
@@ -263,8 +390,8 @@ class TestQuicStream:
         assert stream.receiver.stop_pending
 
         # stop is sent
-        frame = stream.receiver.get_stop_frame()
-        assert frame.error_code == QuicErrorCode.NO_ERROR
+        error_code, stream_id = stream.receiver.get_stop_frame()
+        assert error_code == QuicErrorCode.NO_ERROR
         assert not stream.receiver.stop_pending
 
         # stop is lost
@@ -272,8 +399,8 @@ class TestQuicStream:
         assert stream.receiver.stop_pending
 
         # stop is sent again
-        frame = stream.receiver.get_stop_frame()
-        assert frame.error_code == QuicErrorCode.NO_ERROR
+        error_code, stream_id = stream.receiver.get_stop_frame()
+        assert error_code == QuicErrorCode.NO_ERROR
         assert not stream.receiver.stop_pending
 
         # stop is acklowledged
@@ -323,6 +450,17 @@ class TestQuicStream:
         stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 8, 16)
         assert not stream.sender.is_finished
 
+    def test_sender_data_buffer_protocol(self):
+        stream = QuicStream()
+        stream.sender.write(bytearray(b"0123"))
+        stream.sender.write(memoryview(b"xx4567xx")[2:6])
+        stream.sender.write(memoryview(bytearray(b"89")), end_stream=True)
+
+        f_data, f_fin, f_offset = stream.sender.get_frame(16)
+        assert f_data == b"0123456789"
+        assert f_fin
+        assert f_offset == 0
+
     def test_sender_data_and_fin(self):
         stream = QuicStream()
 
@@ -640,3 +778,44 @@ class TestQuicStream:
         stream.sender.on_reset_delivery(QuicDeliveryState.ACKED)
         assert not stream.sender.reset_pending
         assert stream.sender.is_finished
+
+    def test_fill_stream_frames(self):
+        stream_a = QuicStream(stream_id=0)
+        stream_b = QuicStream(stream_id=4)
+        stream_c = QuicStream(stream_id=8)
+        stream_a.sender.write(b"0123456789")
+        stream_b.sender.write(b"abcdefghij", end_stream=True)
+        stream_c.sender.write(b"ABCDEFGHIJ")
+
+        # stream A is flow-control limited, stream C does not fit
+        buf = Buffer(capacity=100)
+        records, used = fill_stream_frames(
+            buf,
+            [stream_a.sender, stream_b.sender, stream_c.sender],
+            [4, 100, 100],
+            34,
+            1000,
+        )
+        assert records == [(0, 0x0A, 0, 4, 4), (1, 0x0B, 0, 10, 10)]
+        assert used == 14
+        assert buf.tell() == 22
+        assert stream_c.sender.next_offset == 0
+
+        # frames are laid out back to back
+        buf.seek(0)
+        assert buf.pull_uint_var() == 0x0A
+        assert pull_stream_frame(buf, 0x0A) == (0, 0, b"0123", False)
+        assert buf.pull_uint_var() == 0x0B
+        assert pull_stream_frame(buf, 0x0B) == (4, 0, b"abcdefghij", True)
+
+        # connection-level credit is shared among streams
+        buf = Buffer(capacity=100)
+        records, used = fill_stream_frames(
+            buf,
+            [stream_a.sender, stream_c.sender],
+            [100, 100],
+            100,
+            8,
+        )
+        assert records == [(0, 0x0E, 4, 10, 6), (1, 0x0A, 0, 2, 2)]
+        assert used == 8
@@ -2,14 +2,26 @@ from __future__ import annotations
 
 import pytest
 import binascii
+import datetime
+import gc
+import hashlib
+import hmac
+import os
 import ssl
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
+from cryptography import x509 as cx509
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509 import ocsp as cocsp
 
 from qh3 import tls
 from qh3._hazmat import Certificate as InnerCertificate
-from qh3._hazmat import CryptoError, EcPrivateKey, Ed25519PrivateKey
+from qh3._hazmat import CryptoError, EcPrivateKey, Ed25519PrivateKey, X25519KeyExchange
 from qh3._hazmat import Buffer, BufferReadError
 from qh3.quic.configuration import QuicConfiguration
 from qh3.tls import (
@@ -115,6 +127,75 @@ def reset_buffers(buffers):
         buffers[k].seek(0)
 
 
+def generate_ocsp_chain():
+    """
+    Return a CA, a certificate it issued for "localhost" naming an OCSP
+    responder, the certificate's key and a function signing OCSP responses.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_name = cx509.Name([cx509.NameAttribute(cx509.NameOID.COMMON_NAME, "OCSP CA")])
+    ca = (
+        cx509.CertificateBuilder()
+        .subject_name(ca_name)
+        .issuer_name(ca_name)
+        .public_key(ca_key.public_key())
+        .serial_number(cx509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=10))
+        .add_extension(cx509.BasicConstraints(ca=True, path_length=None), True)
+        .sign(ca_key, hashes.SHA256())
+    )
+    key = ec.generate_private_key(ec.SECP256R1())
+    leaf = (
+        cx509.CertificateBuilder()
+        .subject_name(
+            cx509.Name([cx509.NameAttribute(cx509.NameOID.COMMON_NAME, "localhost")])
+        )
+        .issuer_name(ca_name)
+        .public_key(key.public_key())
+        .serial_number(cx509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=10))
+        .add_extension(
+            cx509.SubjectAlternativeName([cx509.DNSName("localhost")]), False
+        )
+        .add_extension(
+            cx509.AuthorityInformationAccess(
+                [
+                    cx509.AccessDescription(
+                        cx509.AuthorityInformationAccessOID.OCSP,
+                        cx509.UniformResourceIdentifier("http://ocsp.example.com"),
+                    )
+                ]
+            ),
+            False,
+        )
+        .sign(ca_key, hashes.SHA256())
+    )
+
+    def sign_response(next_update=datetime.timedelta(days=1), responder=(ca, ca_key)):
+        this_update = datetime.datetime.now(datetime.timezone.utc)
+        return (
+            cocsp.OCSPResponseBuilder()
+            .add_response(
+                cert=leaf,
+                issuer=ca,
+                algorithm=hashes.SHA1(),
+                cert_status=cocsp.OCSPCertStatus.GOOD,
+                this_update=this_update,
+                next_update=this_update + next_update,
+                revocation_time=None,
+                revocation_reason=None,
+            )
+            .responder_id(cocsp.OCSPResponderEncoding.HASH, responder[0])
+            .sign(responder[1], hashes.SHA256())
+            .public_bytes(serialization.Encoding.DER)
+        )
+
+    return ca, ca_key, leaf, key, sign_response
+
+
 class TestContext:
     def create_client(
         self, alpn_protocols=None, cadata=None, cafile=SERVER_CACERTFILE, **kwargs
@@ -391,6 +472,437 @@ class TestContext:
         assert client.alpn_negotiated == None
         assert server.alpn_negotiated == None
 
+    def _handshake_with_retry(self, client, server):
+        # Send client hello, the server answers with a hello retry request.
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        server_buf = create_buffers()
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        assert server.state == State.SERVER_EXPECT_CLIENT_HELLO
+        client_input = merge_buffers(server_buf)
+        reset_buffers(client_buf)
+        reset_buffers(server_buf)
+
+        # Send the second client hello, then complete the handshake.
+        client.handle_message(client_input, client_buf)
+        assert client.state == State.CLIENT_EXPECT_SERVER_HELLO
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        assert server.state == State.SERVER_EXPECT_FINISHED
+        reset_buffers(client_buf)
+
+        client.handle_message(merge_buffers(server_buf), client_buf)
+        assert client.state == State.CLIENT_POST_HANDSHAKE
+        reset_buffers(server_buf)
+
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        assert server.state == State.SERVER_POST_HANDSHAKE
+
+        # check keys match
+        assert client._dec_key == server._enc_key
+        assert client._enc_key == server._dec_key
+
+    def test_handshake_with_key_share_group_cache(self):
+        cache = tls.KeyShareGroupCache()
+        client = self.create_client(server_name="localhost")
+        client.key_share_group_cache = cache
+        server = self.create_server()
+        self._handshake(client, server)
+        assert cache.get("localhost") == tls.Group.X25519ML768
+
+        # the next client hello only carries the key share the server selected
+        client = self.create_client(server_name="localhost")
+        client.key_share_group_cache = cache
+        server = self.create_server()
+        self._handshake(client, server)
+        assert client._x25519_kyber_768_private_key is not None
+        assert client._x25519_private_key is None
+        assert client._ec_p256_private_key is None
+
+        # without a cache, every supported group gets a key share
+        client = self.create_client(server_name="localhost")
+        server = self.create_server()
+        self._handshake(client, server)
+        assert client._x25519_private_key is not None
+
+    def test_key_share_group_cache_lru(self):
+        cache = tls.KeyShareGroupCache(max_entries=2)
+        cache.add("a.example", tls.Group.X25519)
+        cache.add("b.example", tls.Group.X25519)
+        assert cache.get("a.example") == tls.Group.X25519
+        cache.add("c.example", tls.Group.SECP256R1)
+
+        # the least recently used server was forgotten
+        assert len(cache) == 2
+        assert cache.get("b.example") is None
+        assert cache.get("c.example") == tls.Group.SECP256R1
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_handshake_with_hello_retry_request(self):
+        cache = tls.KeyShareGroupCache()
+        cache.add("localhost", tls.Group.X25519)
+        client = self.create_client(server_name="localhost")
+        client.key_share_group_cache = cache
+        server = self.create_server()
+        server._supported_groups = [tls.Group.SECP256R1]
+        self._handshake_with_retry(client, server)
+
+        # the group selected after the retry is remembered
+        assert cache.get("localhost") == tls.Group.SECP256R1
+
+        # the key pair of the first client hello was discarded
+        assert client._x25519_private_key is None
+
+    def test_handshake_with_hello_retry_request_and_session_ticket(self):
+        client_tickets = []
+        server_tickets = []
+        client = self.create_client(server_name="localhost")
+        client.new_session_ticket_cb = client_tickets.append
+        server = self.create_server()
+        server.new_session_ticket_cb = server_tickets.append
+        self._handshake(client, server)
+
+        # resume, after a retry for the key share
+        cache = tls.KeyShareGroupCache()
+        cache.add("localhost", tls.Group.X25519)
+        client = self.create_client(server_name="localhost")
+        client.key_share_group_cache = cache
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server._supported_groups = [tls.Group.SECP256R1]
+        server.get_session_ticket_cb = lambda label: server_tickets[0]
+        self._handshake_with_retry(client, server)
+        assert client.session_resumed
+        assert server.session_resumed
+
+    def _start_hello_retry(self):
+        cache = tls.KeyShareGroupCache()
+        cache.add("localhost", tls.Group.X25519)
+        client = self.create_client(server_name="localhost")
+        client.key_share_group_cache = cache
+        server = self.create_server()
+        server._supported_groups = [tls.Group.SECP256R1]
+
+        # the server answers the first client hello with a hello retry request
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        server_buf = create_buffers()
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        reset_buffers(client_buf)
+        client.handle_message(merge_buffers(server_buf), client_buf)
+        return client, server, client_buf
+
+    def test_hello_retry_request_other_server_group(self):
+        client, server, client_buf = self._start_hello_retry()
+        server_buf = create_buffers()
+        server.handle_message(merge_buffers(client_buf), server_buf)
+
+        # the server hello uses another group than the one it asked for
+        server_hello = pull_server_hello(
+            Buffer(data=server_buf[tls.Epoch.INITIAL].data)
+        )
+        server_hello.key_share = (
+            tls.Group.X25519,
+            X25519KeyExchange().public_key(),
+        )
+        buf = Buffer(capacity=1024)
+        push_server_hello(buf, server_hello)
+        with pytest.raises(tls.AlertIllegalParameter):
+            client.handle_message(buf.data, create_buffers())
+
+    def test_hello_retry_request_other_client_hello(self):
+        # the second client hello offers another key share as well
+        client, server, client_buf = self._start_hello_retry()
+        hello = pull_client_hello(Buffer(data=client_buf[tls.Epoch.INITIAL].data))
+        hello.key_share = hello.key_share + [
+            (tls.Group.X25519, X25519KeyExchange().public_key())
+        ]
+        buf = Buffer(capacity=4096)
+        push_client_hello(buf, hello)
+        with pytest.raises(tls.AlertIllegalParameter):
+            server.handle_message(buf.data, create_buffers())
+
+        # the second client hello changes more than its key share
+        client, server, client_buf = self._start_hello_retry()
+        hello = pull_client_hello(Buffer(data=client_buf[tls.Epoch.INITIAL].data))
+        hello.server_name = "other.example"
+        buf = Buffer(capacity=4096)
+        push_client_hello(buf, hello)
+        with pytest.raises(tls.AlertIllegalParameter):
+            server.handle_message(buf.data, create_buffers())
+
+    def test_handshake_with_key_share_pool(self):
+        pool = tls.KeySharePool(groups=[tls.Group.X25519, tls.Group.SECP256R1], size=2)
+        try:
+            deadline = time.monotonic() + 5
+            while len(pool._keys[tls.Group.SECP256R1]) < 2:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+            pooled = list(pool._keys[tls.Group.X25519])
+
+            client = self.create_client()
+            client._supported_groups = [tls.Group.X25519, tls.Group.SECP256R1]
+            client.key_share_pool = pool
+            server = self.create_server()
+            server.key_share_pool = pool
+            self._handshake(client, server)
+
+            # key pairs are taken from the pool, and never handed out twice
+            assert client._x25519_private_key is pooled[0]
+            assert server._x25519_private_key is pooled[1]
+            assert pool.take(tls.Group.X25519) not in pooled
+
+            # groups which are not pooled are generated on the spot
+            assert pool.take(tls.Group.SECP384R1) is None
+        finally:
+            pool.close()
+
+        assert pool.take(tls.Group.X25519) is None
+
+    def test_key_share_pool_after_fork(self):
+        pool = tls.KeySharePool(groups=[tls.Group.X25519], size=1)
+        try:
+            deadline = time.monotonic() + 5
+            while not pool._keys[tls.Group.X25519]:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+            inherited = pool._keys[tls.Group.X25519][0]
+
+            # the background thread holds the lock as the process forks
+            condition = pool._condition
+            condition.acquire()
+            pool._after_fork()
+
+            # the child neither deadlocks nor reuses its parent's key pairs
+            assert pool.take(tls.Group.X25519) is not inherited
+            assert pool._thread.is_alive()
+        finally:
+            pool.close()
+
+        # let the thread of the "parent" pool exit
+        condition.notify()
+        condition.release()
+
+    def test_key_share_pool_collected(self):
+        pool = tls.KeySharePool(groups=[tls.Group.X25519], size=1)
+        thread = pool._thread
+        ref = weakref.ref(pool)
+
+        # the pool is dropped without being closed, its thread exits
+        del pool
+        gc.collect()
+        assert ref() is None
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    def test_handshake_with_ocsp_stapling(self):
+        ca, ca_key, leaf, key, sign_response = generate_ocsp_chain()
+        response = sign_response()
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(
+            leaf.public_bytes(serialization.Encoding.PEM)
+            + ca.public_bytes(serialization.Encoding.PEM),
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            ),
+        )
+        server_cache = tls.OcspCache(fetch=lambda url, request: response)
+        server_cache.add(
+            configuration.certificate, configuration.certificate_chain[0], response
+        )
+
+        def handshake():
+            client = self.create_client(
+                cadata=ca.public_bytes(serialization.Encoding.PEM),
+                cafile=None,
+                server_name="localhost",
+            )
+            server = self.create_server()
+            server.certificate = configuration.certificate
+            server.certificate_chain = configuration.certificate_chain
+            server.certificate_private_key = configuration.private_key
+            server.server_credentials = configuration.server_credentials()
+            server.ocsp_cache = server_cache
+            self._handshake(client, server)
+            return client
+
+        # the server staples the cached response
+        client = handshake()
+        assert client._ocsp_response == response
+
+        # the stapled messages are built once per response
+        credentials = configuration.server_credentials()
+        message = credentials.stapled_certificate_message(response)
+        assert credentials.stapled_certificate_message(response) is message
+        assert len(message) > len(credentials.certificate_message) + len(response)
+        server_cache.close()
+
+    def test_handshake_with_certificate_compression(self):
+        client = self.create_client()
+        server = self.create_server()
+
+        # server flight without compression
+        client._certificate_compression_algorithms = []
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        server_buf = create_buffers()
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        assert server._certificate_compression_algorithm is None
+        uncompressed_size = len(merge_buffers(server_buf))
+
+        client = self.create_client()
+        server = self.create_server()
+        self._handshake(client, server)
+        assert server._certificate_compression_algorithm in (
+            tls.CertificateCompressionAlgorithm.BROTLI,
+            tls.CertificateCompressionAlgorithm.ZSTD,
+            tls.CertificateCompressionAlgorithm.ZLIB,
+        )
+        assert client._peer_certificate is not None
+
+        # the compressed message is computed once per set of credentials
+        credentials = server.server_credentials
+        message = credentials.compressed_certificate_messages[
+            server._certificate_compression_algorithm
+        ]
+        assert len(message) < uncompressed_size
+        assert (
+            credentials.compressed_certificate_message(
+                server._certificate_compression_algorithm
+            )
+            is message
+        )
+
+    def test_handshake_with_certificate_compression_zlib(self):
+        client = self.create_client()
+        client._certificate_compression_algorithms = [
+            tls.CertificateCompressionAlgorithm.ZLIB
+        ]
+        server = self.create_server()
+        self._handshake(client, server)
+        assert (
+            server._certificate_compression_algorithm
+            == tls.CertificateCompressionAlgorithm.ZLIB
+        )
+
+    def test_compressed_certificate_unsupported_algorithm(self):
+        client = self.create_client()
+        client._certificate_compression_algorithms = [
+            tls.CertificateCompressionAlgorithm.ZLIB
+        ]
+        client.state = State.CLIENT_EXPECT_CERTIFICATE_REQUEST_OR_CERTIFICATE
+
+        buf = Buffer(capacity=100)
+        tls.push_compressed_certificate(
+            buf,
+            tls.CompressedCertificate(
+                algorithm=tls.CertificateCompressionAlgorithm.BROTLI,
+                uncompressed_length=4,
+                compressed_certificate_message=b"1234",
+            ),
+        )
+        with pytest.raises(tls.AlertIllegalParameter):
+            client.handle_message(buf.data, create_buffers())
+
+    def test_decompress_certificate_length_mismatch(self):
+        body = b"\x00\x00\x00\x00"
+        with pytest.raises(tls.AlertBadCertificate):
+            tls.decompress_certificate(
+                tls.CompressedCertificate(
+                    algorithm=tls.CertificateCompressionAlgorithm.ZLIB,
+                    uncompressed_length=len(body) - 1,
+                    compressed_certificate_message=zlib.compress(body),
+                )
+            )
+
+        with pytest.raises(tls.AlertBadCertificate):
+            tls.decompress_certificate(
+                tls.CompressedCertificate(
+                    algorithm=tls.CertificateCompressionAlgorithm.ZLIB,
+                    uncompressed_length=len(body),
+                    compressed_certificate_message=b"not zlib",
+                )
+            )
+
+    def test_decompressors_bound_output(self):
+        bomb = b"\x00" * 16 * 1024 * 1024
+        for algorithm, decompress in tls.CERTIFICATE_DECOMPRESSORS.items():
+            compressed = tls.CERTIFICATE_COMPRESSORS[algorithm](bomb)
+            assert len(decompress(compressed, 1024)) == 1025
+
+    def test_handshake_with_executor(self):
+        client = self.create_client()
+        server = self.create_server()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            client.handshake_executor = executor
+            server.handshake_executor = executor
+
+            # Send client hello.
+            client_buf = create_buffers()
+            client.handle_message(b"", client_buf)
+            server_input = merge_buffers(client_buf)
+            reset_buffers(client_buf)
+
+            # Server hello up to the certificate, CertificateVerify is pending.
+            server_buf = create_buffers()
+            server.handle_message(server_input, server_buf)
+            assert server.state == State.SERVER_EXPECT_CLIENT_HELLO
+            assert server.pending_operation is not None
+            client_input = merge_buffers(server_buf)
+            reset_buffers(server_buf)
+
+            # CertificateVerify and Finished follow once signed.
+            server.pending_operation.result()
+            server.resume_handshake(server_buf)
+            assert server.pending_operation is None
+            assert server.state == State.SERVER_EXPECT_FINISHED
+            client_input += merge_buffers(server_buf)
+            reset_buffers(server_buf)
+
+            # Client stops at the CertificateVerify, Finished is kept aside.
+            client.handle_message(client_input, client_buf)
+            assert client.state == State.CLIENT_EXPECT_CERTIFICATE_VERIFY
+            assert client.pending_operation is not None
+            assert merge_buffers(client_buf) == b""
+
+            # Certificate verified, the kept Finished completes the handshake.
+            client.pending_operation.result()
+            client.resume_handshake(client_buf)
+            assert client.state == State.CLIENT_POST_HANDSHAKE
+            server_input = merge_buffers(client_buf)
+            reset_buffers(client_buf)
+
+            server.handle_message(server_input, server_buf)
+            assert server.state == State.SERVER_POST_HANDSHAKE
+
+        assert client._dec_key == server._enc_key
+        assert client._enc_key == server._dec_key
+
+    def test_handshake_with_executor_bad_certificate(self):
+        client = self.create_client(cafile=None)
+        server = self.create_server()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            client.handshake_executor = executor
+
+            client_buf = create_buffers()
+            client.handle_message(b"", client_buf)
+            server_input = merge_buffers(client_buf)
+            reset_buffers(client_buf)
+
+            server_buf = create_buffers()
+            server.handle_message(server_input, server_buf)
+            client.handle_message(merge_buffers(server_buf), client_buf)
+
+            # the verification failure surfaces when resuming
+            client.pending_operation.exception()
+            with pytest.raises(tls.AlertBadCertificate):
+                client.resume_handshake(client_buf)
+
     def _test_handshake_with_certificate(self, certificate, private_key):
         server = self.create_server()
         server.certificate = InnerCertificate(
@@ -653,6 +1165,102 @@ class TestContext:
         second_handshake_bad_binder()
         second_handshake_bad_pre_shared_key()
 
+    def test_session_ticket_key_ring(self):
+        key_ring = tls.SessionTicketKeyRing()
+        client_tickets = []
+
+        # first handshake, the server seals the ticket
+        client = self.create_client()
+        client.new_session_ticket_cb = client_tickets.append
+        server = self.create_server()
+        server.session_ticket_key_ring = key_ring
+        self._handshake(client, server)
+        assert len(client_tickets) == 1
+
+        ticket = key_ring.unseal(client_tickets[0].ticket)
+        assert ticket is not None
+        assert ticket.resumption_secret == client_tickets[0].resumption_secret
+        assert ticket.cipher_suite == client_tickets[0].cipher_suite
+
+        # second handshake on another server sharing the key, after rotation
+        other_key_ring = tls.SessionTicketKeyRing(
+            keys=[bytes(32), key_ring._keys[0][1]]
+        )
+        client = self.create_client()
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server.session_ticket_key_ring = other_key_ring
+        self._handshake(client, server)
+        assert client.session_resumed
+        assert server.session_resumed
+
+        # the key has left the ring, fall back to a full handshake
+        other_key_ring.rotate()
+        other_key_ring.rotate()
+        assert other_key_ring.unseal(client_tickets[0].ticket) is None
+        client = self.create_client()
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server.session_ticket_key_ring = other_key_ring
+        self._handshake(client, server)
+        assert not client.session_resumed
+        assert not server.session_resumed
+
+    def test_session_ticket_other_server_name(self):
+        key_ring = tls.SessionTicketKeyRing()
+        client_tickets = []
+
+        client = self.create_client(server_name="localhost")
+        client.new_session_ticket_cb = client_tickets.append
+        server = self.create_server()
+        server.session_ticket_key_ring = key_ring
+        self._handshake(client, server)
+        assert key_ring.unseal(client_tickets[0].ticket).server_name == "localhost"
+
+        # the ticket does not resume a session for another name
+        client = self.create_client(server_name=None)
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server.session_ticket_key_ring = key_ring
+        self._handshake(client, server)
+        assert not client.session_resumed
+        assert not server.session_resumed
+
+    def test_session_ticket_key_ring_seal(self):
+        key_ring = tls.SessionTicketKeyRing(keys=[bytes(32)], max_keys=2)
+        session_ticket = tls.SessionTicket(
+            age_add=1234,
+            cipher_suite=tls.CipherSuite.AES_128_GCM_SHA256,
+            not_valid_after=datetime.datetime(2030, 1, 2),
+            not_valid_before=datetime.datetime(2030, 1, 1, 0, 0, 0, 123000),
+            resumption_secret=bytes(32),
+            server_name="example.com",
+            ticket=b"",
+            max_early_data_size=0xFFFFFFFF,
+            alpn_protocol="h3",
+        )
+
+        sealed = key_ring.seal(session_ticket)
+        assert key_ring.seal(session_ticket) != sealed
+        session_ticket.ticket = sealed
+        assert key_ring.unseal(sealed) == session_ticket
+
+        # older keys still open tickets, up to max_keys
+        key_ring.rotate()
+        assert len(key_ring.key_ids) == 2
+        assert key_ring.unseal(sealed) == session_ticket
+        key_ring.rotate()
+        assert key_ring.unseal(sealed) is None
+
+        # tampered or truncated tickets are rejected
+        key_ring = tls.SessionTicketKeyRing(keys=[bytes(32)])
+        assert key_ring.unseal(sealed[:-1] + bytes([sealed[-1] ^ 1])) is None
+        assert key_ring.unseal(sealed[:24]) is None
+        assert key_ring.unseal(b"") is None
+
+        with pytest.raises(ValueError):
+            key_ring.rotate(b"short")
+
 
 class TestTls:
     def test_pull_client_hello(self):
@@ -848,6 +1456,21 @@ class TestTls:
         # stripped during parsing, so re-serialized output is 4 bytes smaller.
         assert len(buf.data) == len(load("tls_client_hello_with_sni.bin")) - 4
 
+    def test_pull_client_hello_malformed(self):
+        data = load("tls_client_hello_with_sni.bin")
+
+        # truncated
+        with pytest.raises(BufferReadError):
+            pull_client_hello(Buffer(data=data[:-10]))
+
+        # message length does not match its content
+        with pytest.raises(AssertionError):
+            pull_client_hello(Buffer(data=data[:3] + b"\x00" + data[4:]))
+
+        # not a ClientHello
+        with pytest.raises(AssertionError):
+            pull_client_hello(Buffer(data=b"\x02" + data[1:]))
+
     def test_push_client_hello(self):
         hello = ClientHello(
             random=binascii.unhexlify(
@@ -1448,6 +2071,142 @@ uYkQ4omYCTX5ohy+knMjdOmdH9c7SpqEWBDC86fiNex+O0XOMEZSa8DA
         )
 
 
+def ca_certificate(ca):
+    return InnerCertificate(ca.public_bytes(serialization.Encoding.DER))
+
+
+class TestOcspCache:
+    def test_add_and_get(self):
+        ca, ca_key, leaf, key, sign_response = generate_ocsp_chain()
+        issuer = ca_certificate(ca)
+        certificate = InnerCertificate(leaf.public_bytes(serialization.Encoding.DER))
+        cache = tls.OcspCache(max_entries=1)
+        assert cache.get(certificate, issuer) is None
+
+        response = sign_response()
+        cache.add(certificate, issuer, response)
+        assert cache.get(certificate, issuer) == response
+
+        # responses must be fresh, and signed on behalf of the issuer
+        with pytest.raises(ValueError, match="expired"):
+            cache.add(
+                certificate,
+                issuer,
+                sign_response(next_update=datetime.timedelta(seconds=-60)),
+            )
+        with pytest.raises(ValueError, match="issuer"):
+            cache.add(
+                certificate,
+                issuer,
+                sign_response(responder=generate_ocsp_chain()[:2]),
+            )
+        with pytest.raises(ValueError):
+            cache.add(certificate, issuer, b"not an OCSP response")
+
+        # the least recently used response is forgotten
+        other_issuer = ca_certificate(generate_ocsp_chain()[0])
+        cache._entries[(b"other", "01")] = (response, time.time() + 60)
+        cache.add(certificate, issuer, response)
+        assert len(cache) == 1
+        assert cache.get(certificate, other_issuer) is None
+
+        # expired responses are dropped
+        cache._entries[tls._ocsp_cache_key(certificate, issuer)] = (response, 0)
+        assert cache.get(certificate, issuer) is None
+        assert len(cache) == 0
+
+    def test_staple(self):
+        ca, ca_key, leaf, key, sign_response = generate_ocsp_chain()
+        issuer = ca_certificate(ca)
+        certificate = InnerCertificate(leaf.public_bytes(serialization.Encoding.DER))
+        requests = []
+        responses = [sign_response(next_update=datetime.timedelta(minutes=30))]
+
+        fetched = threading.Event()
+
+        def fetch(url, request):
+            fetched.wait()
+            requests.append((url, request))
+            return responses.pop(0)
+
+        def wait():
+            cache._fetch_executor.submit(lambda: None).result()
+
+        # the response is fetched in the background
+        cache = tls.OcspCache(refresh_margin=3600, fetch=fetch)
+        assert cache.staple(certificate, issuer) is None
+        fetched.set()
+        wait()
+        assert requests[0][0] == "http://ocsp.example.com"
+        assert requests[0][1] == (
+            tls.OCSPRequest(
+                leaf.public_bytes(serialization.Encoding.DER),
+                ca.public_bytes(serialization.Encoding.DER),
+            ).public_bytes()
+        )
+
+        # it is refreshed ahead of its nextUpdate
+        stapled = cache.get(certificate, issuer)
+        responses.append(sign_response())
+        assert cache.staple(certificate, issuer) == stapled
+        wait()
+        assert len(requests) == 2
+        fresh = cache.get(certificate, issuer)
+        assert fresh != stapled
+
+        # and only then
+        assert cache.staple(certificate, issuer) == fresh
+        wait()
+        assert len(requests) == 2
+
+    def test_staple_failing_responder(self):
+        ca, ca_key, leaf, key, sign_response = generate_ocsp_chain()
+        issuer = ca_certificate(ca)
+        certificate = InnerCertificate(leaf.public_bytes(serialization.Encoding.DER))
+        requests = []
+
+        def fetch(url, request):
+            requests.append(url)
+            raise OSError("connection refused")
+
+        cache = tls.OcspCache(fetch=fetch)
+        assert cache.staple(certificate, issuer) is None
+        cache._fetch_executor.submit(lambda: None).result()
+
+        # a failing responder is not asked again right away
+        assert cache.staple(certificate, issuer) is None
+        cache._fetch_executor.submit(lambda: None).result()
+        assert requests == ["http://ocsp.example.com"]
+
+    def test_close(self):
+        ca, ca_key, leaf, key, sign_response = generate_ocsp_chain()
+        issuer = ca_certificate(ca)
+        certificate = InnerCertificate(leaf.public_bytes(serialization.Encoding.DER))
+        response = sign_response()
+        requests = []
+
+        def fetch(url, request):
+            requests.append(url)
+            return response
+
+        cache = tls.OcspCache(fetch=fetch)
+        assert cache.staple(certificate, issuer) is None
+        executor = cache._fetch_executor
+        executor.submit(lambda: None).result()
+        assert cache.staple(certificate, issuer) == response
+
+        # the fetching thread stops, cached responses are still stapled
+        cache.close()
+        assert executor._shutdown
+        cache._entries[tls._ocsp_cache_key(certificate, issuer)] = (
+            response,
+            time.time() + 60,
+        )
+        assert cache.staple(certificate, issuer) == response
+        assert cache._fetch_executor is None
+        assert requests == ["http://ocsp.example.com"]
+
+
 class TestHKDFExpand:
     """Tests for HKDFExpand."""
 
@@ -1470,6 +2229,79 @@ class TestHKDFExpand:
             expander.derive(b"key_material")
 
 
+class TestKeySchedule:
+    """Tests for the native key schedule against RFC 8448 and HKDFExpand."""
+
+    def test_hkdf(self):
+        # RFC 8448 section 3, early secret and derived secret
+        early_secret = tls.hkdf_extract(256, bytes(32), bytes(32))
+        assert early_secret == binascii.unhexlify(
+            "33ad0a1c607ec03b09e6cd9893680ce210adf300aa1f2660e1b22e10f170f92a"
+        )
+        empty_hash = binascii.unhexlify(
+            "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+        )
+        assert tls.hkdf_expand_label(
+            256, early_secret, b"derived", empty_hash, 32
+        ) == binascii.unhexlify(
+            "6f2615a108c702c5678f54fc9dbab69716c076189c48250cebeac3576c3611ba"
+        )
+
+        # outputs longer than the digest
+        for algorithm in (256, 384):
+            assert tls.hkdf_expand_label(
+                algorithm, b"secret", b"label", b"context", 100
+            ) == HKDFExpand(
+                algorithm=algorithm,
+                length=100,
+                info=tls.hkdf_label(b"label", b"context", 100),
+            ).derive(b"secret")
+
+        with pytest.raises(ValueError, match="Cannot derive keys larger than"):
+            tls.hkdf_expand_label(256, b"secret", b"label", b"", 8161)
+
+    def test_key_schedule(self):
+        key_schedule = tls.KeySchedule(tls.CipherSuite.AES_256_GCM_SHA384)
+        assert key_schedule.generation == 0
+        key_schedule.extract(None)
+        key_schedule.update_hash(b"client hello")
+        key_schedule.extract(b"shared key")
+        assert key_schedule.generation == 2
+
+        # reference computation
+        secret = tls.hkdf_extract(384, bytes(48), bytes(48))
+        secret = tls.hkdf_extract(
+            384,
+            tls.hkdf_expand_label(
+                384, secret, b"derived", hashlib.sha384().digest(), 48
+            ),
+            b"shared key",
+        )
+        transcript = hashlib.sha384(b"client hello").digest()
+        assert key_schedule.derive_secret(b"c hs traffic") == tls.hkdf_expand_label(
+            384, secret, b"c hs traffic", transcript, 48
+        )
+        finished_key = tls.hkdf_expand_label(384, b"traffic", b"finished", b"", 48)
+        assert (
+            key_schedule.finished_verify_data(b"traffic")
+            == hmac.new(finished_key, transcript, "sha384").digest()
+        )
+        assert key_schedule.certificate_verify_data(b"ctx") == (
+            b" " * 64 + b"ctx\x00" + transcript
+        )
+
+        # attributes of the former pure Python implementation
+        assert key_schedule.secret == secret
+        assert key_schedule.hash.digest() == transcript
+        assert key_schedule.hash.copy().hexdigest() == transcript.hex()
+        assert key_schedule.hash_empty_value == hashlib.sha384().digest()
+
+        key_schedule.reset_hash(b"inner client hello")
+        assert key_schedule.certificate_verify_data(b"ctx").endswith(
+            hashlib.sha384(b"inner client hello").digest()
+        )
+
+
 class TestNegotiate:
     """Tests for negotiate() with exclusion."""
 
@@ -1622,6 +2454,160 @@ class TestVerifyCertificate:
             assert_server_name=False,
         )
 
+    def test_trust_store_cached(self):
+        cert = load_pem_x509_certificates(load("ssl_cert.pem"))[0]
+        cadata = load("pycacert.pem")
+
+        tls.clear_trust_store_cache()
+        verify_certificate(certificate=cert, cadata=cadata, server_name="localhost")
+        store = tls._load_trust_store(cadata, None, None)
+        verifier = store.verifier
+        assert verifier is not None
+
+        verify_certificate(certificate=cert, cadata=cadata, server_name="localhost")
+        assert tls._load_trust_store(cadata, None, None).verifier is verifier
+
+        # callers get their own lists
+        trust_anchors, _, _ = tls.load_store_and_sort(cadata=cadata)
+        trust_anchors.clear()
+        assert tls.load_store_and_sort(cadata=cadata)[0]
+
+        tls.clear_trust_store_cache()
+        assert tls._load_trust_store(cadata, None, None) is not store
+
+    def test_trust_store_reloaded_on_change(self, tmp_path):
+        cert = load_pem_x509_certificates(load("ssl_cert.pem"))[0]
+        cafile = tmp_path / "ca.pem"
+        cafile.write_bytes(load("pycacert.pem"))
+        verify_certificate(
+            certificate=cert, cafile=str(cafile), server_name="localhost"
+        )
+
+        # replace the CA file, the cached store must not be used
+        other_ca, _ = generate_ec_certificate(common_name="other.example.com")
+        cafile.write_bytes(other_ca.public_bytes(serialization.Encoding.PEM))
+        st = os.stat(cafile)
+        os.utime(cafile, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        with pytest.raises(tls.AlertBadCertificate):
+            verify_certificate(
+                certificate=cert, cafile=str(cafile), server_name="localhost"
+            )
+
+    def test_verified_chain_cache(self):
+        cert = load_pem_x509_certificates(load("ssl_cert.pem"))[0]
+        cadata = load("pycacert.pem")
+        cache = tls.VerifiedChainCache()
+
+        verify_certificate(
+            certificate=cert,
+            cadata=cadata,
+            server_name="localhost",
+            verified_chain_cache=cache,
+        )
+        assert len(cache) == 1
+
+        class FailingVerifier:
+            def verify(self, *args):
+                raise tls.UnacceptableCertificateError("path validation")
+
+        store = tls._load_trust_store(cadata, None, None)
+        verifier = store.verifier
+        store.verifier = FailingVerifier()
+        try:
+            # the chain is not validated again
+            verify_certificate(
+                certificate=cert,
+                cadata=cadata,
+                server_name="localhost",
+                verified_chain_cache=cache,
+            )
+
+            # but only for the same server name and stapled OCSP response
+            with pytest.raises(tls.AlertBadCertificate, match="path validation"):
+                verify_certificate(
+                    certificate=cert,
+                    cadata=cadata,
+                    server_name="example.com",
+                    verified_chain_cache=cache,
+                )
+            with pytest.raises(tls.AlertBadCertificate, match="path validation"):
+                verify_certificate(
+                    certificate=cert,
+                    cadata=cadata,
+                    server_name="localhost",
+                    ocsp_response=b"ocsp",
+                    verified_chain_cache=cache,
+                )
+
+            # nor once the entry expired
+            cache.clear()
+            with pytest.raises(tls.AlertBadCertificate, match="path validation"):
+                verify_certificate(
+                    certificate=cert,
+                    cadata=cadata,
+                    server_name="localhost",
+                    verified_chain_cache=cache,
+                )
+        finally:
+            store.verifier = verifier
+
+    def test_verified_chain_cache_expiry(self):
+        cert = load_pem_x509_certificates(load("ssl_cert.pem"))[0]
+
+        cache = tls.VerifiedChainCache(ttl=60)
+        cache.add(("chain",), [cert])
+        assert cache.get(("chain",))
+        assert cache._entries[("chain",)] <= time.time() + 60
+
+        # never trusted past the expiry of a certificate
+        cache = tls.VerifiedChainCache(ttl=1e12)
+        cache.add(("chain",), [cert])
+        assert cache._entries[("chain",)] == cert.not_valid_after
+
+        cache = tls.VerifiedChainCache(ttl=-1)
+        cache.add(("chain",), [cert])
+        assert not cache.get(("chain",))
+        assert len(cache) == 0
+
+    def test_verified_chain_cache_lru(self):
+        cert = load_pem_x509_certificates(load("ssl_cert.pem"))[0]
+        cache = tls.VerifiedChainCache(max_entries=2)
+        cache.add(("a",), [cert])
+        cache.add(("b",), [cert])
+        assert cache.get(("a",))
+        cache.add(("c",), [cert])
+        assert len(cache) == 2
+        assert not cache.get(("b",))
+        assert cache.get(("a",))
+
+    def test_trust_store_cache_lru(self):
+        cadata = load("pycacert.pem")
+
+        tls.clear_trust_store_cache()
+        try:
+            first = tls._load_trust_store(cadata, None, None)
+            for i in range(tls._TRUST_STORE_CACHE_SIZE - 1):
+                tls._load_trust_store(cadata + b"\n" * (i + 1), None, None)
+
+            # a hit makes the store the most recently used one
+            assert tls._load_trust_store(cadata, None, None) is first
+            tls._load_trust_store(cadata + b"\n" * 100, None, None)
+            assert len(tls._TRUST_STORE_CACHE) == tls._TRUST_STORE_CACHE_SIZE
+            assert tls._load_trust_store(cadata, None, None) is first
+        finally:
+            tls.clear_trust_store_cache()
+
+    def test_trust_store_stamp_capath(self, tmp_path):
+        (tmp_path / "a.0").write_bytes(load("pycacert.pem"))
+        stamp = tls._trust_store_stamp(None, str(tmp_path))
+        assert len(stamp) == 1
+
+        # only the directory is looked at, adding a file changes its mtime
+        st = os.stat(tmp_path)
+        (tmp_path / "b.0").write_bytes(load("pycacert.pem"))
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert tls._trust_store_stamp(None, str(tmp_path)) != stamp
+
 
 class TestPullCertificateRequestUnknownExtension:
     """Test for pull_certificate_request with unknown extension."""